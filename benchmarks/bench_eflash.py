@@ -0,0 +1,259 @@
+"""
+    End-to-end benchmarks of the download pipeline against the simulated sensor (libs/sim_device.py).
+
+    Run from the repository root:
+        python -m benchmarks.bench_eflash [--quick] [--output bench_results.json] [--baseline old.json]
+
+    Results are saved as JSON. With --baseline the run is compared with a previous result file and the
+    program exits with code 1 when a throughput drops more than --tolerance.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from libs.sim_device import FakeSensor, FlashImage, PAGE_LENGTH_BYTE
+from eflash_reader import Eflash_reader_App, START_PAGE_NUM, PAGE_PER_BLOCK
+from module.records import iter_records
+
+DEFAULT_OUTPUT = 'bench_results.json'
+
+# (quick, full) sizes
+LOCATE_BLOCKS = ([0, 4], [0, 8, 32])
+DOWNLOAD_PAGES = ([20], [100])
+DECODE_PAGES = ([200], [2000])
+EXPORT_PAGES = ([100], [1000])
+FILL_LEVELS = ([10, 40], [50, 200, 500])
+BOOT_TIMES = ([0.3], [0.1, 0.3, 1.0])
+STARTUP_RUNS = (3, 10)
+
+
+class BenchResults :
+    results : dict[str, dict]
+
+    def __init__(self) :
+        self.results = {}
+
+    def add(self, name : str, value : float, unit : str, better : str = 'higher', **extra) :
+        self.results[name] = {'value': round(value, 3), 'unit': unit, 'better': better, **extra}
+        print(f'{name:<40} {value:>12.2f} {unit}')
+
+    def save(self, filename : str) :
+        data = {'meta': _meta(), 'results': self.results}
+        with open(filename, 'w') as f:
+            json.dump(data, f, indent=2)
+
+
+def _meta() -> dict:
+    try:
+        rev = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        rev = ''
+    return {
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'git': rev,
+    }
+
+# Silence the per page prints of the application
+@contextlib.contextmanager
+def _quiet():
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+# Application connected to a fake sensor, already in AT mode
+def _connect(image : FlashImage, latency : float) -> Eflash_reader_App:
+    app = Eflash_reader_App(FakeSensor(image, latency=latency))
+    app.dutDev = app.openDUT()
+    with _quiet():
+        app.dutDev.ATmode()
+    return app
+
+def _close(app : Eflash_reader_App) :
+    app.dutDev.serialP.close()
+
+# Write dump.bin/dump.txt of n_pages synthetic pages without going through the link
+def _write_dump(folder : str, n_pages : int) -> str:
+    filename = os.path.join(folder, f'dump_{n_pages}')
+    image = FlashImage.synthetic(n_pages)
+    with open(filename + '.bin', 'wb') as rawfile, open(filename + '.txt', 'w') as hexfile:
+        for page in sorted(image.pages):
+            rawfile.write(image.pages[page])
+            hexfile.write(image.pages[page].hex())
+    return filename
+
+#==================================================================
+# BENCHMARKS
+
+# Time from reset to AT prompt, compared with the simulated boot time
+def bench_bringup(res : BenchResults, boot_times : list[float], latency : float) :
+    for boot in boot_times:
+        app = Eflash_reader_App(FakeSensor(FlashImage(), latency=latency, boot_time=boot))
+        app.dutDev = app.openDUT()
+        try:
+            with _quiet():
+                measured = app.bringUpDevice()
+        finally:
+            _close(app)
+        res.add(f'bringup.boot_{boot}', measured - boot, 's', 'lower', boot_time=round(measured, 3))
+
+def bench_locate(res : BenchResults, folder : str, blocks : list[int], latency : float) :
+    for n in blocks:
+        image = FlashImage.synthetic(1, first_page=START_PAGE_NUM + n * PAGE_PER_BLOCK)
+        app = _connect(image, latency)
+        try:
+            start = time.monotonic()
+            with _quiet():
+                app.locateFirstPage(os.path.join(folder, f'locate_{n}'))
+            elapsed = time.monotonic() - start
+        finally:
+            _close(app)
+        res.add(f'locate.blank_blocks_{n}', elapsed, 's', 'lower')
+
+def bench_download(res : BenchResults, folder : str, sizes : list[int], latency : float) :
+    for n in sizes:
+        app = _connect(FlashImage.synthetic(n), latency)
+        try:
+            start = time.monotonic()
+            with _quiet():
+                first_page, page_num = app.downloadPages(os.path.join(folder, f'download_{n}'), n + 1)
+            elapsed = time.monotonic() - start
+        finally:
+            _close(app)
+        pages = page_num - first_page
+        res.add(f'download.pages_{n}', pages / elapsed, 'pages/s', bytes_per_s=round(pages * PAGE_LENGTH_BYTE / elapsed))
+
+# Decode path of the application: exportXLSX without the workbook (hex dump)
+def _decode_hex(filename : str, n_pages : int) -> int:
+    with _quiet():
+        rows, _ = Eflash_reader_App().exportXLSX(n_pages, filename + '.txt', filename + '.xlsx', raw=False)
+    return rows
+
+# Decode path of the record iterator (module/records.py) on the binary dump
+def _decode_bin(filename : str, n_pages : int) -> int:
+    n = 0
+    for _ in iter_records(filename + '.bin'):
+        n += 1
+    return n
+
+def bench_decode(res : BenchResults, folder : str, sizes : list[int]) :
+    for n in sizes:
+        filename = _write_dump(folder, n)
+        for name, fn in (('hex', _decode_hex), ('bin', _decode_bin)):
+            start = time.monotonic()
+            records = fn(filename, n)
+            res.add(f'decode.{name}.pages_{n}', records / (time.monotonic() - start), 'records/s')
+
+def bench_export(res : BenchResults, folder : str, sizes : list[int]) :
+    app = Eflash_reader_App()
+    for n in sizes:
+        filename = _write_dump(folder, n)
+        start = time.monotonic()
+        with _quiet():
+            rows, _ = app.exportXLSX(n, filename + '.txt', filename + '.xlsx')
+        res.add(f'export.xlsx.pages_{n}', rows / (time.monotonic() - start), 'records/s')
+
+def bench_pipeline(res : BenchResults, folder : str, fills : list[int], latency : float) :
+    for n in fills:
+        filename = os.path.join(folder, f'pipeline_{n}')
+        app = _connect(FlashImage.synthetic(n), latency)
+        try:
+            start = time.monotonic()
+            with _quiet():
+                first_page, page_num = app.downloadPages(filename, n + 1)
+        finally:
+            _close(app)
+        with _quiet():
+            rows, _ = app.exportXLSX(page_num - first_page - app.skip_counter, filename + '.txt', filename + '.xlsx')
+        elapsed = time.monotonic() - start
+        res.add(f'pipeline.fill_{n}', (page_num - first_page) / elapsed, 'pages/s', seconds=round(elapsed, 3), records=rows)
+
+# Startup of the CLI in a fresh interpreter (best of n runs, interpreter startup removed)
+def bench_startup(res : BenchResults, folder : str, runs : int) :
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    filename = _write_dump(folder, 10)
+
+    def best(args : list[str]) -> float:
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable] + args, cwd=root, capture_output=True, check=True)
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    interpreter = best(['-c', 'pass'])
+    res.add('startup.import', best(['-c', 'import eflash_reader']) - interpreter, 's', 'lower')
+    res.add('startup.help', best(['eflash_reader.py', '--help']) - interpreter, 's', 'lower')
+    res.add('startup.decode_only_10', best(['eflash_reader.py', '--decode-only', filename + '.txt', '--xlsx', filename + '.xlsx']) - interpreter, 's', 'lower')
+
+#==================================================================
+# REGRESSION CHECK
+
+def compare(current : dict, baseline : dict, tolerance : float) -> list[str]:
+    regressions = []
+    for name, cur in current.items():
+        old = baseline.get(name)
+        if old is None or old['value'] == 0:
+            continue
+        change = (cur['value'] - old['value']) / old['value']
+        if cur.get('better', 'higher') == 'lower':
+            change = -change
+        if change < -tolerance:
+            regressions.append(f"{name}: {old['value']} -> {cur['value']} {cur['unit']} ({change:+.1%})")
+    return regressions
+
+
+def main(argv : list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='External flash reader benchmarks')
+    parser.add_argument('--quick', action='store_true', help='small sizes, for a fast check')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='JSON result file')
+    parser.add_argument('--baseline', help='previous JSON result file to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='accepted throughput drop (0.10 = 10%%)')
+    parser.add_argument('--latency', type=float, default=0.005, help='simulated command latency [s]')
+    parser.add_argument('--only', nargs='*', choices=['startup', 'bringup', 'locate', 'download', 'decode', 'export', 'pipeline'], help='run only some benchmarks')
+    args = parser.parse_args(argv)
+
+    size = 0 if args.quick else 1
+    selected = set(args.only or ['startup', 'bringup', 'locate', 'download', 'decode', 'export', 'pipeline'])
+    res = BenchResults()
+
+    with tempfile.TemporaryDirectory() as folder:
+        if 'startup' in selected:
+            bench_startup(res, folder, STARTUP_RUNS[size])
+        if 'bringup' in selected:
+            bench_bringup(res, BOOT_TIMES[size], args.latency)
+        if 'locate' in selected:
+            bench_locate(res, folder, LOCATE_BLOCKS[size], args.latency)
+        if 'download' in selected:
+            bench_download(res, folder, DOWNLOAD_PAGES[size], args.latency)
+        if 'decode' in selected:
+            bench_decode(res, folder, DECODE_PAGES[size])
+        if 'export' in selected:
+            bench_export(res, folder, EXPORT_PAGES[size])
+        if 'pipeline' in selected:
+            bench_pipeline(res, folder, FILL_LEVELS[size], args.latency)
+
+    res.save(args.output)
+    print(f'Results saved in {args.output}')
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(res.results, baseline, args.tolerance)
+        if regressions:
+            print('PERFORMANCE REGRESSIONS:')
+            for r in regressions:
+                print(f'  {r}')
+            return 1
+        print(f'No regression against {args.baseline}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""
+    Memory of the decode and export path over synthetic dumps of increasing size, measured with tracemalloc.
+
+    Run from the repository root:
+        python -m benchmarks.bench_memory [--quick] [--output bench_memory.json] [--only export.xlsx ...]
+
+    For every stage and dump size: peak of the memory allocated by Python during the stage, peak bytes per record
+    and memory still allocated when the stage is over (caches, leaks) per record. Memory allocated by C libraries
+    (SQLite, zlib buffers) is not traced.
+
+    Budgets: a streaming stage must keep the same peak whatever the size of the dump (at most GROWTH_LIMIT times
+    the peak of the smallest dump, and below its budget in KB); a stage whose output grows with the records
+    (summary windows) has a budget for the bytes each additional record adds to the peak, between the
+    smallest and the largest dump. The program exits with code 1 when a budget is exceeded.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.bench_eflash import _meta, _quiet, _write_dump
+from eflash_reader import Eflash_reader_App
+from module.records import iter_records
+from module.chrono import iter_chronological
+
+DEFAULT_OUTPUT = 'bench_memory.json'
+
+# (quick, full) dump sizes in pages: the full run ends with a full sensor (491 - 1 blocks of 64 pages)
+MEMORY_PAGES = ([64, 256, 1024], [512, 4096, 31360])
+GROWTH_LIMIT = 1.5      # peak of the largest dump / peak of the smallest one, streaming stages
+SUMMARY_WINDOW = 86400  # s, 24 records per window with the synthetic period of 1 h
+
+#==================================================================
+# STAGES
+# fn(filename without extension, pages) -> records processed
+
+def _count(records) -> int:
+    n = 0
+    for _ in records:
+        n += 1
+    return n
+
+def stage_records(filename : str, pages : int) -> int:
+    return _count(iter_records(filename + '.bin', columns=None))
+
+def stage_chrono(filename : str, pages : int) -> int:
+    return _count(iter_chronological(filename + '.txt'))
+
+def stage_export_decode(filename : str, pages : int) -> int:
+    with _quiet():
+        rows, _ = Eflash_reader_App().exportXLSX(pages, filename + '.txt', filename + '.xlsx', raw=False)
+    return rows
+
+def stage_export_xlsx(filename : str, pages : int) -> int:
+    with _quiet():
+        rows, _ = Eflash_reader_App().exportXLSX(pages, filename + '.txt', filename + '.xlsx')
+    return rows
+
+def stage_export_chrono(filename : str, pages : int) -> int:
+    with _quiet():
+        rows, _ = Eflash_reader_App().exportXLSX(pages, filename + '.txt', filename + '.xlsx', chronological=True)
+    return rows
+
+def stage_summary(filename : str, pages : int) -> int:
+    with _quiet():
+        rows, _ = Eflash_reader_App().exportXLSX(pages, filename + '.txt', filename + '.xlsx', aggregate=SUMMARY_WINDOW, raw=False)
+    return rows
+
+# name: (fn, peak budget in KB of a streaming stage, budget in bytes per additional record of a growing stage)
+STAGES = {
+    'records.iter':       (stage_records,       128,  None),
+    'records.chrono':     (stage_chrono,        128,  None),
+    'export.decode':      (stage_export_decode, 256,  None),
+    'export.xlsx':        (stage_export_xlsx,   1024, None),
+    'export.xlsx.chrono': (stage_export_chrono, 1024, None),
+    'export.summary':     (stage_summary,       None, 256),
+}
+
+
+class MemoryStage :
+    name : str
+    runs : list[dict]       # one per dump size
+
+    def __init__(self, name : str) :
+        self.name = name
+        self.runs = []
+
+    # Run fn under tracemalloc. The memory allocated before (imports, dump) is not part of the stage
+    def measure(self, fn, filename : str, pages : int) -> dict:
+        gc.collect()
+        tracemalloc.start()
+        start = time.monotonic()
+        records = fn(filename, pages)
+        elapsed = time.monotonic() - start
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        run = {
+            'pages': pages,
+            'records': records,
+            'peak_kb': round(peak / 1024, 1),
+            'peak_bytes_per_record': round(peak / max(records, 1), 1),
+            'retained_bytes_per_record': round(current / max(records, 1), 2),
+            'seconds': round(elapsed, 2),
+        }
+        self.runs.append(run)
+        print(f"{self.name:<20} {pages:>6} pages {records:>8} records  peak {run['peak_kb']:>9.1f} KB"
+              f"  {run['peak_bytes_per_record']:>9.1f} B/record  retained {run['retained_bytes_per_record']:>7.2f} B/record")
+        return run
+
+    # Budget violations of the runs
+    def check(self, budget_kb : int | None, budget_per_record : int | None) -> list[str]:
+        issues = []
+        if not self.runs:
+            return issues
+        first, last = self.runs[0], self.runs[-1]
+        if budget_kb is not None:
+            growth = last['peak_kb'] / max(first['peak_kb'], 1)
+            if len(self.runs) > 1 and growth > GROWTH_LIMIT:
+                issues.append(f"{self.name}: peak grows with the dump ({first['peak_kb']} KB at {first['pages']} pages, "
+                              f"{last['peak_kb']} KB at {last['pages']} pages)")
+            for run in self.runs:
+                if run['peak_kb'] > budget_kb:
+                    issues.append(f"{self.name}: peak {run['peak_kb']} KB at {run['pages']} pages, budget {budget_kb} KB")
+        if budget_per_record is not None and last['records'] > first['records']:
+            marginal = (last['peak_kb'] - first['peak_kb']) * 1024 / (last['records'] - first['records'])
+            print(f"{self.name:<20} {marginal:.1f} B per additional record")
+            if marginal > budget_per_record:
+                issues.append(f"{self.name}: {marginal:.1f} B per additional record, budget {budget_per_record}")
+        return issues
+
+
+def main(argv : list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Memory of the decode and export stages')
+    parser.add_argument('--quick', action='store_true', help='small dumps, for a fast check')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='JSON result file')
+    parser.add_argument('--only', nargs='*', choices=list(STAGES), help='run only some stages')
+    args = parser.parse_args(argv)
+
+    sizes = MEMORY_PAGES[0 if args.quick else 1]
+    selected = args.only or list(STAGES)
+    stages = {name: MemoryStage(name) for name in selected}
+    issues = []
+
+    with tempfile.TemporaryDirectory() as folder:
+        dumps = {pages: _write_dump(folder, pages) for pages in sizes}
+        for name, stage in stages.items():
+            fn, budget_kb, budget_per_record = STAGES[name]
+            fn(dumps[sizes[0]], sizes[0])     # warm up: lazy imports and module caches are not part of the stage
+            for pages in sizes:
+                stage.measure(fn, dumps[pages], pages)
+            issues += stage.check(budget_kb, budget_per_record)
+
+    with open(args.output, 'w') as f:
+        json.dump({'meta': _meta(), 'growth_limit': GROWTH_LIMIT, 'stages': {name: s.runs for name, s in stages.items()}}, f, indent=2)
+    print(f'Results saved in {args.output}')
+
+    if issues:
+        print('MEMORY BUDGETS EXCEEDED:')
+        for issue in issues:
+            print(f'  {issue}')
+        return 1
+    print('All stages within their memory budget')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,13 +1,24 @@
-
-from libs.serial_handler import SerialController
-from libs.dut import DUT
-from libs.smartcable import SmartCableManager
+# Device stack (serial, HID) and xlsxwriter are imported on first use: --decode-only never loads them
+from libs.metrics import METRICS
+from libs.page_cache import PageCache
+from libs.flash_map import FlashMap, PAGE_DATA, PAGE_BLANK, PAGE_FAILED
+from libs.link_profile import LinkProfile, load_profile, save_profile, best_profile
+from libs.progress import Progress, message
+from module.archive import Archive, ArchiveWriter, ARCHIVE_EXT
+from module.aggregate import Aggregator, SummaryWorkbook, WINDOWS
+import argparse
 import os
 import time
 from termcolor import colored
 import module.read_page as rp
-import xlsxwriter
+from module.page_check import check_record, check_payload_length, is_blank_slot
 from utils import search_in, HEADER_MAP
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING :
+    from libs.dut import DUT
+    from libs.smartcable import SmartCableManager
+    from libs.sim_device import FakeSensor
 
 HEADER = colored(r"""
   __  __                  ____        _       _   _                 
@@ -30,39 +41,550 @@ PAGE_PER_BLOCK   = 64
 NUMBER_OF_BLOCKS = 512
 LAST_DATA_BLOCK  = 490
 HEX_IN_PAGE      = 4224 # 2112 * 2
+PAGE_LENGTH      = 2112
+PIPELINE_DEPTH_DEF = 2
+RECORDS_PER_PAGE = 8
+RECORD_LENGTH    = 256
+TAIL_LENGTH      = 9
+WRAP_PROBE_BLOCKS = 2   # blocks after the end of the newest records checked for older ones (ring wrapped)
+
+# Fields written by the follow mode
+FOLLOW_COLUMNS = ['time', 'ts', 'evnt_type', 'temperature', 'alpha1', 'alpha2', 'alpha3', 'axePeak', 'axeRms', 'page', 'record']
+
+# Link calibration: combinations probed at every baudrate, (bytes per AT+EFLASHRP, page requests in flight)
+CALIBRATION_READS = [(PAGE_LENGTH, 1), (PAGE_LENGTH, 2), (PAGE_LENGTH, 4), (PAGE_LENGTH // 2, 1), (PAGE_LENGTH // 4, 1)]
+CALIBRATION_PAGES = 16
 
 Eflash_reader_App_APPNAME : str = 'Eflash_reader'
 
 class Eflash_reader_App :
-    smartc : SmartCableManager | None
+    smartc : 'SmartCableManager | None'
+    sim : 'FakeSensor | None'   # simulated sensor used instead of SmartCable + sensor
     
-    dutDev : DUT
+    dutDev : 'DUT'
     db_log : dict
+    skip_counter : int          # pages skipped during the last download
+    gap_pages : int             # blank pages not read in the last download: between the newest and the oldest records (wrap)
+    trace_file : str | None     # JSON/CSV file where the statistics of the run are saved
+    record_file : str | None    # serial session recorded here (see libs/serial_trace.py)
+    sync : bool                 # differential download against the local copy of the sensor pages
+    cache : PageCache | None    # local copy of the sensor being downloaded (sync mode)
+    archive : ArchiveWriter | None  # compressed archive written during the download (<filename>.efa), the dump exported
+    raw_dump : bool             # also write <filename>.bin/.txt (always written when there is no archive)
+    flash_map : FlashMap | None     # what is known of the memory of the sensor being downloaded
+    aggregate : int | None      # window [s] of the summary export, None for no summary
+    raw_export : bool           # False: only the summary is exported
+    chronological : bool        # export the records in time order, also when the memory has wrapped
+    pipeline_depth : int | None # page requests kept in flight during the download (1 = stop-and-wait), None: from the link profile
+    use_link_profile : bool     # load the link parameters saved for the firmware of the sensor (see calibrateLink)
+    link_profile : LinkProfile | None  # link parameters in use for the connected sensor
 
     APPVERSION : str = '1.0'
     APPNAME : str = Eflash_reader_App_APPNAME
     APPLONGNAME : str = 'External flash reader'
     
-    def __init__(self) :        
+    def __init__(self, simulation : 'FakeSensor | None' = None, trace_file : str | None = None, record_file : str | None = None, sync : bool = False) :        
         self.download_log = {}
         self.smartc = None
+        self.sim = simulation
+        self.skip_counter = 0
+        self.gap_pages = 0
+        self.trace_file = trace_file
+        self.record_file = record_file
+        self.sync = sync
+        self.cache = None
+        self.archive = None
+        self.raw_dump = False
+        self.flash_map = None
+        self.aggregate = None
+        self.raw_export = True
+        self.chronological = True
+        self.pipeline_depth = None
+        self.use_link_profile = True
+        self.link_profile = None
 
     # Open conection with smartcable and turn on the USB power supply
     def initApp(self) -> bool :
         #smartc : SmartCableManager | None
 
+        if self.sim is not None :
+            return True
         if(self.smartc is None) :
+            from libs.smartcable import SmartCableManager
             self.smartc = SmartCableManager()
-        self.smartc.powerFromUSB(True)
-        
-        time.sleep(0.2)
+        self.smartc.powerFromUSB(True) # no need to wait: bringUpDevice polls the device until it answers
         return True
 
     # Reset device and turn off the USB power supply
     def endTest(self) :
-        self.smartc.activateBootloader(False)
+        if self.sim is not None :
+            self.sim.reset()
+            return
+        self.smartc.resetPulse()
         self.smartc.powerFromUSB(False)
 
+    # Reset the device (GPIO of the SmartCable or simulated reset)
+    def resetDevice(self) :
+        if self.sim is not None :
+            self.sim.reset()
+        else :
+            self.smartc.resetPulse()
+
+    # Reset the device and poll the AT prompt until it answers. Return the measured boot time
+    def bringUpDevice(self, timeout : float = 5.0) -> float :
+        self.resetDevice()
+        self.dutDev.defaultBaudrate()
+        boot_time = self.dutDev.waitATReady(timeout)
+        METRICS.observe('bringup.boot', boot_time)
+        print(f'DUT -> TST (boot {round(boot_time, 2)} s)')
+        return boot_time
+
+    # Serial connection to the device
+    def openDUT(self) -> 'DUT' :
+        import serial
+        from libs.serial_handler import SerialController
+        from libs.serial_trace import recording_factory
+        from libs.dut import DUT
+        if self.sim is not None :
+            port, factory = 'SIM', self.sim.serial_factory
+        else :
+            port, factory = self.smartc.sm.COMpath, None
+        if self.record_file is not None :
+            factory = recording_factory(self.record_file, factory) if factory else recording_factory(self.record_file)
+        dut = DUT( SerialController(port, serial_factory=factory), dutSimulation=self.sim is not None )
+        try :
+            dut.serialP.open()
+        except serial.SerialException :
+            if self.sim is not None :
+                raise
+            # cached COM port is stale (cable moved to another USB port): scan again
+            dut.serialP.port = self.smartc.refreshCOM()
+            dut.serialP.open()
+        return dut
+
+    # Read one page (from the device or, in sync mode, from the local cache when unchanged). Return True if blank
+    # prefetched/pause: answer already received by a PagePipeline (see downloadPipelined)
+    def readPage(self, page_num : int, filename : str, prefetched : tuple | None = None, pause = None) -> bool :
+        skipped = self.skip_counter
+        filename = self.rawDumpName(filename)
+        corrupt = len(self.dutDev.corrupt_pages)
+        if self.cache is not None :
+            is_blank, self.skip_counter = self.dutDev.syncPage(page_num, filename, self.skip_counter, self.cache)
+        else :
+            is_blank, self.skip_counter = self.dutDev.dumpPage(hex(page_num)[2:], filename, self.skip_counter, # convert dec page_num to hex -> 64 to '40'
+                                                               prefetched=prefetched, pause=pause)
+        if self.archive is not None and self.dutDev.last_page is not None :
+            self.archive.addPage(page_num, self.dutDev.last_page)
+        if self.flash_map is not None :
+            failed = self.skip_counter > skipped or len(self.dutDev.corrupt_pages) > corrupt
+            self.flash_map.mark(page_num, PAGE_FAILED if failed else PAGE_BLANK if is_blank else PAGE_DATA)
+        return is_blank
+
+    # <filename> of the .bin/.txt dump, None when only the archive is written
+    def rawDumpName(self, filename : str) -> str | None :
+        return filename if self.raw_dump or self.archive is None else None
+
+    # Open the local copy of the sensor pages (sync mode only)
+    def openCache(self, sn : str) :
+        if self.sync :
+            self.cache = PageCache(sn)
+            print(colored(f"Sync mode: {len(self.cache)} page(s) of {sn} in the local cache", 'blue'))
+
+    def closeCache(self) :
+        if self.cache is not None :
+            self.cache.close()
+            self.cache = None
+
+    # Start the archive of the download with the device information
+    def openArchive(self, filename : str, sn : str, fw_version : str, fw_hash : str) :
+        meta = {
+            'sn': sn,
+            'fw_version': fw_version,
+            'fw_hash': fw_hash,
+            'download_time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'app_version': self.APPVERSION,
+        }
+        self.archive = ArchiveWriter(filename + ARCHIVE_EXT, meta)
+
+    def closeArchive(self) :
+        if self.archive is not None :
+            self.archive.meta['skipped_pages'] = self.skip_counter
+            self.archive.meta['corrupt_pages'] = list(self.dutDev.corrupt_pages)
+            self.archive.meta['suspect_pages'] = list(self.dutDev.suspect_pages)
+            self.archive.close()
+            self.archive = None
+
+    # Load the flash map of the sensor saved by the previous downloads
+    def openFlashMap(self, sn : str) :
+        self.flash_map = FlashMap(sn, START_PAGE_NUM // PAGE_PER_BLOCK, LAST_DATA_BLOCK, PAGE_PER_BLOCK, NUMBER_OF_BLOCKS)
+
+    def closeFlashMap(self) :
+        if self.flash_map is not None :
+            self.flash_map.save()
+            print(colored(f"Flash map: {self.flash_map.summary()}", 'blue'))
+            self.flash_map = None
+
+    #==================================================================
+    # LINK PARAMETERS
+
+    # Page requests in flight: --pipeline, otherwise the link profile of the firmware
+    def pipelineDepth(self) -> int :
+        if self.pipeline_depth is not None :
+            return self.pipeline_depth
+        if self.link_profile is not None :
+            return self.link_profile.pipeline_depth
+        return PIPELINE_DEPTH_DEF
+
+    # Use the link parameters saved for the firmware of the connected sensor, the defaults if it has never been calibrated
+    def applyLinkProfile(self, fw_version : str, fw_hash : str) :
+        self.link_profile = load_profile(fw_version, fw_hash) if self.use_link_profile else None
+        profile = self.link_profile or LinkProfile()
+        self.dutDev.read_length = profile.read_length
+        self.dutDev.page_timeout = profile.c_timeout
+        if self.link_profile is None :
+            return
+        print(colored(f"Link profile of {fw_version}: {profile}", 'blue'))
+        if profile.baudrate != self.dutDev.serialP.baudrate and not self.dutDev.setBaudrate(profile.baudrate) :
+            print(colored(f"WARN: {profile.baudrate} baud not available, continue at the default baudrate", 'yellow'))
+            self.bringUpDevice()
+
+    # Measure every combination of baudrate, read length and pipeline depth on the first pages of the log area
+    # (blank pages are transferred as well) and save the fastest reliable one for the firmware of the sensor
+    def calibrateLink(self, pages : int = CALIBRATION_PAGES) -> LinkProfile :
+        from libs.serial_handler import BAUDRATE_SERIAL_DEF, BAUDRATE_SERIAL_FAST
+        self.initApp()
+        self.dutDev = self.openDUT()
+        try :
+            self.bringUpDevice()
+            fw_version, fw_hash = self.dutDev.getFWVERSION(), self.dutDev.getFWHASH()
+            self.dutDev.getPageCRC(hex(START_PAGE_NUM)[2:])   # probe AT+EFLASHCRC once
+            probe = [hex(START_PAGE_NUM + i)[2:] for i in range(pages)]
+            results = []
+            for baudrate in (BAUDRATE_SERIAL_DEF, BAUDRATE_SERIAL_FAST) :
+                if baudrate != BAUDRATE_SERIAL_DEF and not self.dutDev.setBaudrate(baudrate) :
+                    print(colored(f"{baudrate} baud not available on {fw_version}", 'yellow'))
+                    self.bringUpDevice()
+                    continue
+                for read_length, depth in CALIBRATION_READS :
+                    self.dutDev.read_length = read_length
+                    elapsed, errors = self.dutDev.probeRead(probe, depth)
+                    result = {'baudrate': baudrate, 'read_length': read_length, 'pipeline_depth': depth,
+                              'throughput': round(pages * PAGE_LENGTH / elapsed),
+                              'error_rate': round(errors / pages, 3), 'page_time': round(elapsed / pages, 4)}
+                    results.append(result)
+                    print(f"{baudrate:>7} baud  {read_length:>4} B/read  pipeline {depth}  "
+                          f"{result['throughput']:>6} B/s  {errors} error(s)")
+                self.bringUpDevice()    # back to the default baudrate
+            profile = best_profile(results)
+            save_profile(fw_version, fw_hash, profile)
+            print(colored(f"Link profile of {fw_version} ({fw_hash}) saved: {profile}", 'green'))
+            return profile
+        finally :
+            self.endTest()
+            self.dutDev.serialP.close()
+
+    # Find the first written block. Just have to read the first page of each block.
+    # With a flash map, the blocks known to be blank before the first data block are not scanned again,
+    # as long as the start of the log area is still blank (otherwise the log has wrapped or restarted) and the map
+    # still matches the device there. Return the first written page (already saved) or None if the memory is blank
+    def locateFirstPage(self, filename : str) -> int | None :
+        page_num = START_PAGE_NUM
+        hint = self.flash_map.firstDataBlockPage() if self.flash_map is not None else None
+        if hint is not None and hint > START_PAGE_NUM :
+            if not self.readPage(START_PAGE_NUM, filename) :
+                print(f"First written page: {START_PAGE_NUM}")
+                return START_PAGE_NUM
+            # the map is from the previous download: the memory may have been erased or wrapped since, the hint is
+            # taken only if the page holds data and the block before it is still blank
+            if self.pageWritten(hint) and (hint - PAGE_PER_BLOCK == START_PAGE_NUM or not self.pageWritten(hint - PAGE_PER_BLOCK)) :
+                print(f"Page {START_PAGE_NUM} is blank, skip to page {hint} (flash map)")
+                page_num = hint
+            else :
+                print(f"Page {START_PAGE_NUM} is blank, flash map out of date (first data block {hint // PAGE_PER_BLOCK}): scan all the blocks")
+                page_num = START_PAGE_NUM + PAGE_PER_BLOCK
+        blank_blocks = 0
+        while page_num <= (PAGE_PER_BLOCK * LAST_DATA_BLOCK) : 
+            # dump page and collect is_blank flag
+            is_blank = self.readPage(page_num, filename)
+            if is_blank:
+                blank_blocks += 1
+                page_num += 64
+            else:
+                print(f"First written page: {page_num} ({blank_blocks} blank block(s) before it)")
+                return page_num
+        print(f"No written page ({blank_blocks} blank blocks)")
+        return None
+
+    # Download the written pages in the archive (<filename>.bin/.txt when requested or without archive), up to the end of the log area (page_to_read pages at most when given).
+    # Return (first_page, page_num) -> pages [first_page, page_num)
+    def downloadPages(self, filename : str, page_to_read : int | None = None) -> tuple[int, int] :
+        # Execute an infinite loop where:
+        #   1. Read page x (starting from page 0x40, or 64 in decimal).
+        #   2. Check if the first character is 0x07 (start byte).
+        #       [Y] Append to a binary file, save metadata to a log file, and print the page number (x of max y). Go back to point 1.
+        #       [N] Download complete
+        #   3. Generate a CSV file.
+        self.skip_counter = 0
+        self.gap_pages = 0
+
+        first_page = self.locateFirstPage(filename)
+        if first_page is None :
+            return PAGE_PER_BLOCK * (LAST_DATA_BLOCK + 1), PAGE_PER_BLOCK * (LAST_DATA_BLOCK + 1)
+        page_num = first_page + 1 # the first page is already added
+
+        last_page = PAGE_PER_BLOCK * (LAST_DATA_BLOCK + 1) # diagnostic pages after the log area are never read
+        if page_to_read is not None :
+            last_page = min(last_page, first_page + page_to_read)
+
+        # One line updated a few times per second instead of a print per page
+        wrapped = None
+        with Progress(page_to_read or self.expectedPages()) as progress :
+            progress.update(first_page)
+            page_num, blank_found = self.readPageRange(filename, page_num, last_page, progress)
+            if blank_found and page_to_read is None :
+                wrapped = self.wrappedPage(page_num)
+            if wrapped is not None :
+                # the blank pages in between are saved without reading them: the dump keeps the physical page numbers
+                blank_page = page_num
+                self.gap_pages = wrapped - blank_page
+                self.dutDev.saveBlankPages(self.gap_pages, self.rawDumpName(filename))
+                page_num, blank_found = self.readPageRange(filename, wrapped, last_page, progress)
+        if wrapped is not None :
+            print(f"Memory wrapped: pages {blank_page}-{wrapped - 1} are blank, older records from page {wrapped}")
+        if blank_found :    # stop before if you find a blank
+            print(f"Page {page_num} is blank")
+        return first_page, page_num
+
+    # Pages downloaded in [first_page, page_num): the skipped ones and the blank gap of a wrapped memory don't count
+    def pagesRead(self, first_page : int, page_num : int) -> int :
+        return page_num - first_page - self.skip_counter - self.gap_pages
+
+    # Pages written at the previous download (flash map): estimate of the pages to read, None if unknown
+    def expectedPages(self) -> int | None :
+        if self.flash_map is None :
+            return None
+        return self.flash_map.dataPages() or None
+
+    # Read pages [page_num, last_page) until a blank page. Return (blank page or last_page, True if a blank page has been found)
+    def readPageRange(self, filename : str, page_num : int, last_page : int, progress : Progress) -> tuple[int, bool] :
+        blank_found = False
+        if self.pipelineDepth() > 1 and self.dutDev.read_length >= PAGE_LENGTH and self.cache is None :
+            page_num, blank_found = self.downloadPipelined(filename, page_num, last_page, progress)
+
+        # Read page of the block
+        while page_num < last_page and not blank_found:
+            # dump page and collect is_blank flag
+            blank_found = self.readPage(page_num, filename)
+            if not blank_found:
+                progress.update(page_num)
+                page_num += 1
+        return page_num, blank_found
+
+    # The flash is a ring: once full, the oldest block is erased and written again. After the blank page that ends the
+    # newest records, a written first page in one of the next WRAP_PROBE_BLOCKS blocks means that the oldest records
+    # follow, up to the end of the log area. Only the tail of the first record is read. Return that page or None
+    # With a flash map the probe starts at the next block that held data at the previous download: the blocks before
+    # it were blank and only the write position, before the blank page, writes new ones
+    def wrappedPage(self, blank_page : int) -> int | None :
+        block_page = (blank_page // PAGE_PER_BLOCK + 1) * PAGE_PER_BLOCK
+        hint = self.flash_map.firstDataBlockPage(block_page) if self.flash_map is not None else None
+        if hint is not None and hint > block_page :
+            message(f"Blocks {block_page // PAGE_PER_BLOCK}-{hint // PAGE_PER_BLOCK - 1} blank at the previous download, probe from page {hint} (flash map)")
+            block_page = hint
+        end_page = min(block_page + WRAP_PROBE_BLOCKS * PAGE_PER_BLOCK, PAGE_PER_BLOCK * (LAST_DATA_BLOCK + 1))
+        for page in range(block_page, end_page, PAGE_PER_BLOCK) :
+            if self.pageWritten(page) :
+                return page
+        return None
+
+    # True if the first record of the page is written: only its tail is read (nothing is saved)
+    def pageWritten(self, page : int) -> bool :
+        tail, _, _ = self.dutDev.readEflash(hex(page)[2:], RECORD_LENGTH - TAIL_LENGTH, TAIL_LENGTH)
+        return tail is not None and not is_blank_slot(tail)
+
+    # Read pages [page_num, last_page) keeping pipelineDepth() requests in flight, until a blank page.
+    # If the device keeps losing answers the rest is left to the stop-and-wait loop.
+    # Return (next page to read or first blank page, True if a blank page has been found)
+    def downloadPipelined(self, filename : str, page_num : int, last_page : int, progress : Progress, max_lost : int = 3) -> tuple[int, bool] :
+        from libs.dut import PagePipeline
+        depth = self.pipelineDepth()
+        pipe = PagePipeline(self.dutDev, depth, with_crc = self.dutDev.crc_supported is True, c_timeout = self.dutDev.page_timeout)
+        next_request = page_num
+        lost = 0
+        try :
+            while page_num < last_page :
+                while next_request < last_page and pipe.pagesInFlight() < depth :
+                    pipe.request(next_request)
+                    next_request += 1
+                prefetched = pipe.get(page_num)
+                if prefetched[0] is None :
+                    lost += 1
+                is_blank = self.readPage(page_num, filename, prefetched, pipe.pause)
+                if is_blank :
+                    return page_num, True
+                progress.update(page_num)
+                page_num += 1
+                if lost >= max_lost :
+                    message(colored(f"WARN: {lost} pipelined answers lost, continue one page at a time", 'yellow'))
+                    break
+        finally :
+            pipe.close()
+        return page_num, False
+
+    # (page number, page as hex) of a dump: <dump>.txt (pages from 64) or an archive <dump>.efa
+    def dumpPages(self, tot_page : int, dump : str) :
+        if dump.endswith(ARCHIVE_EXT) :
+            with Archive(dump) as archive :
+                for index_page, (page_num, page) in enumerate(archive.readPages()) :
+                    if index_page >= tot_page :
+                        break
+                    yield page_num, page.hex()
+            return
+        # Open the hex_page.txt, one page at a time in memory
+        with open(dump, 'r') as f: 
+            for index_page in range(tot_page): # cycle for the pages
+                yield index_page + START_PAGE_NUM, f.read(HEX_IN_PAGE)
+
+    # (page number, record index 0..7, record as hex) of every slot of the pages of a dump, in physical order
+    def dumpRecords(self, tot_page : int, dump : str) :
+        for page_num, hex_page in self.dumpPages(tot_page, dump): # cycle for the pages
+            # Cuts hex_page into 8 blocks of length 256 bytes (fewer when the page is truncated)
+            index = 0
+            for i in range (0, len(hex_page) - rp.SPARE_LENGTH_BYTE*2, rp.RECORD_LENGTH_BYTE*2): # *2 because we are working with hex
+                yield page_num, index, hex_page[i : i + rp.RECORD_LENGTH_BYTE*2]
+                index += 1
+
+    # Decode <dump_txt> (hex dump or archive) and generate the XLSX file. Return (records exported, records flagged)
+    # A record failing check_record/check_payload_length is exported with the issue in the Check column; it is
+    # dropped (and counted as flagged) only when it can't be decoded or, in chronological order, placed in time
+    # aggregate: window in seconds of the summary <xlsx>_summary.xlsx (statistics of the scheduled records + all the events)
+    # raw: False to write only the summary
+    # chronological: rows sorted by time also when the memory has wrapped (module/chrono.py), duplicates dropped
+    def exportXLSX(self, tot_page : int, dump_txt : str = "dump.txt", xlsx : str = "flash_content.xlsx", aggregate : int | None = None, raw : bool = True,
+                   chronological : bool = False) -> tuple[int, int] :
+        row = 0
+        agg = summary = None
+        if aggregate :
+            summary = SummaryWorkbook(os.path.splitext(xlsx)[0] + "_summary.xlsx", XLSX_HEADER, search_in)
+            agg = Aggregator(aggregate, summary.addEvent)
+
+        if raw :
+            import xlsxwriter
+            workbook  = xlsxwriter.Workbook(xlsx, {'constant_memory': True}) # rows are written in order: each one is flushed to disk when the next starts
+            worksheet = workbook.add_worksheet("eFlash") # generating the sheet
+
+            header_format = workbook.add_format({
+                "bold": True,
+                "bg_color": "#E0AF76",   
+                "font_color": "#000000",
+                "border": 1,
+                "align": "center",
+                "valign": "vcenter"
+                })
+            
+            # row format
+            fmt_even = workbook.add_format({"bg_color": "#E0DEDE", "align": "left", "border": 1, "border_color": "#838080"})
+            fmt_odd  = workbook.add_format({"bg_color": "#FFFFFF", "align": "left", "border": 1, "border_color": "#838080"})
+
+            # page separator
+            fmt_separator = workbook.add_format({"bg_color": "#E0DEDE", "align": "left", "border": 1, "border_color": "#838080", "bottom": 2, "bottom_color": "#000000"})
+
+            for col, header in enumerate(XLSX_HEADER):
+                worksheet.write(row, col, header, header_format) # row 0 -> headers
+                col_width = max(len(header) + 2, 19) # adjust column width (> 10 for Timestamp)
+                worksheet.set_column(col, col, col_width)
+
+        export_start = time.perf_counter()
+
+        rec_content = {}
+        bad_records = 0
+
+        chrono = None
+        if chronological :
+            from module.chrono import ChronoReader
+            chrono = ChronoReader(dump_txt)
+            if chrono.wrapPages() :
+                print(colored(f"Memory wrapped: older records from page(s) {chrono.wrapPages()}, exported in chronological order", 'blue'))
+            records = ((page_num, index - 1, rec.hex()) for _, page_num, index, rec in chrono.records())
+        else :
+            records = self.dumpRecords(tot_page, dump_txt)
+
+        for page_num, i, record in records: # cycle for the records
+            rec_content["Page n."] = page_num
+            rec_bytes = bytes.fromhex(record)
+            if is_blank_slot(rec_bytes): # page not completely written
+                continue
+            issue = check_record(rec_bytes) or check_payload_length(rec_bytes)
+
+            record = record[2:] # Remove start byte
+
+            rec_content["Record n."] = i + 1 # record counted from 1 to 8
+            decode_start = time.perf_counter()
+            try:
+                data = rp.tilt_record(record)
+            except (IndexError, KeyError, ValueError): # skip only the broken record, not the whole download
+                bad_records += 1
+                print(colored(f"WARN: page {page_num} record {i + 1} discarded | not decodable{f' ({issue})' if issue else ''}", 'yellow'))
+                continue
+            METRICS.observe(f"decode.{data['evnt_type']}", time.perf_counter() - decode_start)
+            rec_content.update(data)
+            rec_content["check"] = issue
+            if issue is not None:
+                bad_records += 1
+                METRICS.count('export.suspect')
+                print(colored(f"WARN: page {page_num} record {i + 1} suspect | {issue}", 'yellow'))
+
+            tail = record[-rp.TAIL_LENGTH_BYTE*2:] # 18 hex
+            len_pl = int(
+                tail[0:2], 16
+            )  # len payload record x (it consider also the start byte 0x07)
+            ts_rc = int(tail[2:10], 16)  # record timestamp
+            time_rc = rp.datetime.fromtimestamp(ts_rc).isoformat()
+
+            rec_content["Tail-Rec.Timestamp"] = time_rc # add also the tail content to the record_content
+            rec_content["Tail-Rec.Length"]    = len_pl
+
+            if agg is not None :
+                agg.add(ts_rc, data)
+
+            # add row to xlsx
+            row += 1 # move one row ahead
+            if not raw :
+                continue
+            fmt = fmt_separator if row % 8 == 0 else fmt_even if row % 2 == 0 else fmt_odd # choose the format
+            for col, header in enumerate(XLSX_HEADER):
+                value = search_in(rec_content, header)
+                worksheet.write(row, col, value, fmt) # add record columns
+
+        if chrono is not None :
+            bad_records += chrono.bad_records
+            METRICS.count('export.duplicates', chrono.duplicates)
+            chrono.close()
+
+        with METRICS.timer('export.save') :
+            if raw :
+                workbook.close() # save the file
+            if agg is not None :
+                windows = summary.close(agg)
+                METRICS.count('export.windows', windows)
+        METRICS.observe('export.xlsx', time.perf_counter() - export_start)
+        METRICS.count('export.rows', row)
+        METRICS.count('export.flagged', bad_records)
+        return row, bad_records
+
+    # Decode a dump already on disk (hex dump or archive) without SmartCable and serial port
+    def decodeOnly(self, dump : str, xlsx : str = "flash_content.xlsx") :
+        if dump.endswith(ARCHIVE_EXT) :
+            with Archive(dump) as archive :
+                tot_page = archive.pageCount()
+        else :
+            tot_page = os.path.getsize(dump) // HEX_IN_PAGE
+        start_time = time.monotonic()
+        rows, bad_records = self.exportXLSX(tot_page, dump, xlsx, self.aggregate, self.raw_export, self.chronological)
+        print(colored(f"{tot_page} pages, {rows} records decoded in {round(time.monotonic() - start_time, 2)} s", "light_blue"))
+        if bad_records > 0:
+            print(colored(f"FLAGGED RECORDS: {bad_records} (Check column of the XLSX, WARN lines above)", "yellow"))
+
     # Start external flash download
     def readExtFlash(self):
         start_time : float
@@ -76,6 +598,8 @@ class Eflash_reader_App :
             os.remove(filename + ".bin")
         if os.path.exists(filename + ".txt"):
             os.remove(filename + ".txt")
+        if os.path.exists(filename + ARCHIVE_EXT):
+            os.remove(filename + ARCHIVE_EXT)
         if os.path.exists("flash_content.xlsx"):
             os.remove("flash_content.xlsx")
 
@@ -93,67 +617,35 @@ class Eflash_reader_App :
                 print(colored('Invalid character, please enter again...', 'red'))
                 continue
             
+            METRICS.reset(trace = self.trace_file is not None)
+
             # try-finally construct to ensure the connection is closed if any problems arise
             try: 
                 # Open serial connection
-                self.dutDev = DUT( SerialController(self.smartc.sm.COMpath) )
-                self.dutDev.serialP.open()
+                self.dutDev = self.openDUT()
                 
-                # RESET DEVICE
-                self.smartc.activateBootloader(False)
-
-                # Enter test mode with AT+TST
-                time.sleep(1)
-                self.dutDev.ATmode()
-
-                # Read only page 64 (0x40), first page
-                # print(colored("\nStart reading memory content...","magenta"))
-                # page_num = 40
-                # self.dutDev.dumpPage(page_num, filename)
-
-                # Execute an infinite loop where:
-                #   1. Read page x (starting from page 0x40, or 64 in decimal).
-                #   2. Check if the first character is 0x07 (start byte).
-                #       [Y] Append to a binary file, save metadata to a log file, and print the page number (x of max y). Go back to point 1.
-                #       [N] Download complete
-                #   3. Generate a CSV file.
-
-                # (OOOOOOOOOOOOOOOOOO::::::) idea for tqdm
+                # RESET DEVICE and enter test mode with AT+TST as soon as it has booted
+                self.bringUpDevice()
+                sn = self.dutDev.getSN()
+                fw_version, fw_hash = self.dutDev.getFWVERSION(), self.dutDev.getFWHASH()
+                self.applyLinkProfile(fw_version, fw_hash)
+                self.openCache(sn)
+                self.openArchive(filename, sn, fw_version, fw_hash)
+                self.openFlashMap(sn)
 
                 # Start from first page to page x
                 print(colored("\nStart reading memory content...","magenta"))
-
-                # Initialized parameter for the cycle
-                page_num     = START_PAGE_NUM
-                first_page   = START_PAGE_NUM
-                skip_counter = 0
-                is_blank = False
                 start_time = time.monotonic() # Save download start time to get statistics
 
-                # Find written block. Just have to read the first page of each block.
-                while page_num <= (PAGE_PER_BLOCK * LAST_DATA_BLOCK) : 
-                    # dump page and collect is_blank flag
-                    is_blank, skip_counter = self.dutDev.dumpPage(hex(page_num)[2:], filename, skip_counter) # convert dec page_num to hex -> 64 to '40'
-                    if is_blank:
-                        print(f"Page {page_num} is blank")
-                        page_num += 64
-                        first_page = page_num # collect first page number
-                    else:
-                        print(f"Reading page {page_num}... ") # just to inform the user (readed in the test above)
-                        page_num += 1 # the first page is already added
-                        break
+                with METRICS.timer('download') :
+                    first_page, page_num = self.downloadPages(filename)
 
-                page_to_read = 500 # maximum number of page that you want to read
-                # Read page of the block
-                for i in range(page_to_read - 1): # The first page has already been read in the cycle above ( so - 1 is necessary )
-                    print(f"Reading page {page_num}... ")
-                    # dump page and collect is_blank flag
-                    is_blank, skip_counter = self.dutDev.dumpPage(hex(page_num)[2:], filename, skip_counter) # convert dec page_num to hex -> 64 to '40'
-                    if not is_blank:
-                        page_num += 1
-                    else:   # stop before if you find a blank
-                        print(f"Page {page_num} is blank")
-                        break
+                corrupt_pages = list(self.dutDev.corrupt_pages)
+                if corrupt_pages:
+                    print(colored(f"WARN: {len(corrupt_pages)} page(s) failed the integrity check: {corrupt_pages}", 'yellow'))
+                suspect_pages = list(self.dutDev.suspect_pages)
+                if suspect_pages:
+                    print(colored(f"WARN: {len(suspect_pages)} page(s) failed the content check: {suspect_pages}", 'yellow'))
 
                 #==================================================================
                 # CLOSING COMMUNICATION WITH DEVICE
@@ -162,6 +654,9 @@ class Eflash_reader_App :
                 print(colored(f"Time: {round((time.monotonic()-start_time), 2)}", 'blue'))
 
             finally:
+                self.closeCache()
+                self.closeArchive()
+                self.closeFlashMap()
                 # Reset DUT information (eui, passkey, etc.) - Once communication with is no more needed
                 self.endTest()
                 self.dutDev.resetInfo()
@@ -170,98 +665,242 @@ class Eflash_reader_App :
             #==================================================================
             # DECODE PAGES AND GENERATE XLSX FILE
 
-            workbook  = xlsxwriter.Workbook("flash_content.xlsx") # xlsx file name
-            worksheet = workbook.add_worksheet("eFlash") # generating the sheet
-
-            header_format = workbook.add_format({
-                "bold": True,
-                "bg_color": "#E0AF76",   
-                "font_color": "#000000",
-                "border": 1,
-                "align": "center",
-                "valign": "vcenter"
-                })
-            
-            # row format
-            fmt_even = workbook.add_format({"bg_color": "#E0DEDE", "align": "left", "border": 1, "border_color": "#838080"})
-            fmt_odd  = workbook.add_format({"bg_color": "#FFFFFF", "align": "left", "border": 1, "border_color": "#838080"})
-
-            # page separator
-            fmt_separator = workbook.add_format({"bg_color": "#E0DEDE", "align": "left", "border": 1, "border_color": "#838080", "bottom": 2, "bottom_color": "#000000"})
-
-            row = 0
-
-            for col, header in enumerate(XLSX_HEADER):
-                worksheet.write(row, col, header, header_format) # row 0 -> headers
-                col_width = max(len(header) + 2, 19) # adjust column width (> 10 for Timestamp)
-                worksheet.set_column(col, col, col_width)
-
-            if (skip_counter >= 10): # considering 10 as the max number of accettable pages skipped in the log
-                raise Exception (f"Too many pages ({skip_counter}) has been skipped!")
-            tot_page = page_num - first_page - skip_counter # remove from the count the pages that has been skipped
-
-            # Open the hex_page.txt
-            with open("dump.txt", 'r') as f: 
-                log = f.read()
-            
-            rec_content = {}
-
-            for index_page in range(tot_page): # cycle for the pages
-                hex_page = log[index_page*HEX_IN_PAGE:(index_page + 1)*HEX_IN_PAGE]
-
-                # Cuts hex_page into 8 blocks of length 256 bytes
-                index  = 0
-                record = [None] * rp.RECORDS_PER_PAGE
-                for i in range (0, len(hex_page) - rp.SPARE_LENGTH_BYTE*2, rp.RECORD_LENGTH_BYTE*2): # *2 because we are working with hex
-                    record[index] = hex_page[i : i + rp.RECORD_LENGTH_BYTE*2]
-                    index += 1
-                
-                rec_content["Page n."] = index_page + 64
-
-                # Reads data of all 8 records
-
-                for i in range(0, rp.RECORDS_PER_PAGE): # cicle for the records
-                    if (record[i] is not None and record[i][0:2] == rp.START_BYTE): # record[i] is not None to avoid error 'NoneType' object is not subscriptable
-                        record[i] = record[i][2:] # Remove start byte
-
-                        rec_content["Record n."] = i + 1 # record counted from 1 to 8
-                        rec_content.update(rp.tilt_record(record[i]))
-
-                        tail = record[i][-rp.TAIL_LENGTH_BYTE*2:] # 18 hex
-                        len_pl = int(
-                            tail[0:2], 16
-                        )  # len payload record x (it consider also the start byte 0x07)
-                        ts_rc = int(tail[2:10], 16)  # record timestamp
-                        time_rc = rp.datetime.fromtimestamp(ts_rc).isoformat()
-
-                        rec_content["Tail-Rec.Timestamp"] = time_rc # add also the tail content to the record_content
-                        rec_content["Tail-Rec.Length"]    = len_pl
-
-                        # add row to xlsx
-                        row += 1 # move one row ahead
-                        fmt = fmt_separator if row % 8 == 0 else fmt_even if row % 2 == 0 else fmt_odd # choose the format
-                        for col, header in enumerate(XLSX_HEADER):
-                            value = search_in(rec_content, header)
-                            worksheet.write(row, col, value, fmt) # add record columns
-                    else:
-                        raise Exception ("Error decoding files - try again")
-
-            workbook.close() # save the file
+            if (self.skip_counter >= 10): # considering 10 as the max number of accettable pages skipped in the log
+                raise Exception (f"Too many pages ({self.skip_counter}) has been skipped!")
+            tot_page = self.pagesRead(first_page, page_num) # remove from the count the pages that has been skipped
 
+            rows, bad_records = self.exportXLSX(tot_page, filename + ARCHIVE_EXT, aggregate=self.aggregate, raw=self.raw_export, chronological=self.chronological)
 
             break
         #endWhile
         print(colored("==============================", "magenta"))
         print(colored(f"TOTAL PAGES READ: {tot_page}", "light_blue"))
+        if bad_records > 0:
+            print(colored(f"FLAGGED RECORDS: {bad_records} (Check column of the XLSX, WARN lines above)", "yellow"))
+        METRICS.printSummary()
+        if self.trace_file is not None :
+            METRICS.save(self.trace_file)
+            print(colored(f"Statistics saved in {self.trace_file}", "light_blue"))
+
+    #==================================================================
+    # FOLLOW MODE
+
+    # Soak tests: keep the session open and append the records the sensor writes to the outputs (.csv, .db/.sqlite)
+    # every poll_time seconds, until Ctrl+C. Only the new records are read (see libs/follow.py)
+    def followSensor(self, outputs : list[str], poll_time : float = 10.0, columns : list[str] = FOLLOW_COLUMNS) :
+        from libs.follow import SensorFollower
+        from module.record_sinks import open_sink
+        self.initApp()
+        self.dutDev = self.openDUT()
+        sinks = []
+        follower = None
+        try :
+            self.bringUpDevice()
+            sn = self.dutDev.getSN()
+            self.applyLinkProfile(self.dutDev.getFWVERSION(), self.dutDev.getFWHASH())
+            sinks = [open_sink(output, columns) for output in outputs]
+            follower = SensorFollower(self.dutDev, sn, columns, START_PAGE_NUM, PAGE_PER_BLOCK * (LAST_DATA_BLOCK + 1), PAGE_PER_BLOCK)
+            follower.start()
+            print(colored(f"Following {sn}, last record read: page {follower.page} record {follower.slot} (Ctrl+C to stop)", 'magenta'))
+            total = 0
+            while True :
+                poll_start = time.monotonic()
+                records = follower.poll()
+                if records :
+                    for sink in sinks :
+                        sink.add(records)
+                        sink.flush()
+                    total += len(records)
+                    print(f"{time.strftime('%H:%M:%S')} +{len(records)} record(s), {total} in total, page {follower.page}")
+                    if len(records) >= RECORDS_PER_PAGE :
+                        continue    # catching up: no wait
+                time.sleep(max(0.0, poll_time - (time.monotonic() - poll_start)))
+        except KeyboardInterrupt :
+            print(colored(f"Follow stopped", 'magenta'))
+        finally :
+            for sink in sinks :
+                sink.close()
+            if follower is not None :
+                follower.save()
+            self.endTest()
+            self.dutDev.serialP.close()
+
+    #==================================================================
+    # STATION MODE
+
+    # True if a sensor answers to AT+TST (no reset)
+    def sensorPresent(self) -> bool :
+        try :
+            return self.dutDev.AT.sendCommand('TST', c_timeout=0.2)[0]
+        except Exception :
+            return False
+
+    # HSS_FAULT status of the SmartCable: a change is a hint that a sensor has been connected/disconnected
+    def hssFault(self) -> bool | None :
+        if self.sim is not None or not self.smartc.getGPIOStatus() :
+            return None
+        from libs.smartcable import SmartCableManager
+        return (self.smartc.gpios_status & SmartCableManager.MCP2200_HSS_FAULT_PIN) > 0
+
+    # Wait for a sensor: every poll_time (or as soon as HSS_FAULT changes) reset the device and probe the AT prompt
+    def waitSensor(self, poll_time : float) :
+        last_fault = self.hssFault()
+        next_probe = 0.0
+        while True :
+            fault = self.hssFault()
+            if fault != last_fault or time.monotonic() >= next_probe :
+                last_fault = fault
+                next_probe = time.monotonic() + poll_time
+                try :
+                    self.bringUpDevice(timeout=1.0)
+                    return
+                except RuntimeError :
+                    pass
+            time.sleep(0.05)
+
+    # Wait until the sensor doesn't answer anymore (3 probes in a row)
+    def waitSensorRemoved(self, poll_time : float) :
+        missing = 0
+        while missing < 3 :
+            missing = 0 if self.sensorPresent() else missing + 1
+            time.sleep(poll_time)
+
+    # Download one sensor already in AT mode: <output_dir>/<SN>_<date>.efa/.xlsx (and .bin/.txt with raw_dump)
+    def downloadSensor(self, output_dir : str) -> tuple[str, int, int] :
+        sn = self.dutDev.getSN()
+        fw_version, fw_hash = self.dutDev.getFWVERSION(), self.dutDev.getFWHASH()
+        filename = os.path.join(output_dir, f"{sn}_{time.strftime('%Y%m%d_%H%M%S')}")
+        start_time = time.monotonic()
+        self.applyLinkProfile(fw_version, fw_hash)
+        self.openCache(sn)
+        self.openArchive(filename, sn, fw_version, fw_hash)
+        self.openFlashMap(sn)
+        try :
+            with METRICS.timer('download') :
+                first_page, page_num = self.downloadPages(filename)
+        finally :
+            self.closeCache()
+            self.closeArchive()
+            self.closeFlashMap()
+        print(colored(f"Time: {round((time.monotonic()-start_time), 2)}", 'blue'))
+        tot_page = self.pagesRead(first_page, page_num)
+        rows = 0
+        if tot_page > 0 :
+            rows, _ = self.exportXLSX(tot_page, filename + ARCHIVE_EXT, filename + ".xlsx", self.aggregate, self.raw_export, self.chronological)
+        return sn, tot_page, rows
+
+    # Production line: download every sensor connected to the SmartCable, back to back and without operator input.
+    # HID handle and serial port stay open for the whole session
+    def runStation(self, output_dir : str = 'station_output', poll_time : float = 0.5) :
+        os.makedirs(output_dir, exist_ok=True)
+        self.initApp()
+        self.dutDev = self.openDUT()
+        sensors = 0
+        print(colored(f"Station mode: connect the sensors one after the other (Ctrl+C to stop)", 'magenta'))
+        try :
+            while True :
+                print(colored("Waiting for a sensor...", 'magenta'))
+                self.waitSensor(poll_time)
+                METRICS.reset(trace = self.trace_file is not None)
+                try :
+                    sn, tot_page, rows = self.downloadSensor(output_dir)
+                    sensors += 1
+                    print(colored(f"[{sensors}] {sn}: {tot_page} pages, {rows} records", 'green'))
+                    METRICS.printSummary()
+                except Exception as e :
+                    print(colored(f"Download failed: {e}", 'red'))
+                finally :
+                    self.dutDev.resetInfo()
+                print(colored("Disconnect the sensor", 'magenta'))
+                self.waitSensorRemoved(poll_time)
+        except KeyboardInterrupt :
+            print(colored(f"Station stopped, {sensors} sensor(s) downloaded", 'magenta'))
+        finally :
+            self.endTest()
+            self.dutDev.serialP.close()
 
 if __name__ == "__main__":
 
+    parser = argparse.ArgumentParser(description=Eflash_reader_App.APPLONGNAME)
+    parser.add_argument('--simulate', nargs='?', const='', metavar='DUMP_BIN',
+                        help='run against a simulated sensor (synthetic memory or a recorded dump.bin)')
+    parser.add_argument('--sim-pages', type=int, default=200, help='written pages of the synthetic memory')
+    parser.add_argument('--sim-baud', type=int, default=115200, help='simulated link baudrate')
+    parser.add_argument('--sim-latency', type=float, default=0.005, help='simulated command latency [s]')
+    parser.add_argument('--sim-loss', type=float, default=0.0, help='probability of losing a byte')
+    parser.add_argument('--sim-boot', type=float, default=0.3, help='simulated boot time after reset [s]')
+    parser.add_argument('--record', metavar='FILE', help='record the serial session (writes and reads with timestamps)')
+    parser.add_argument('--replay', metavar='FILE', help='replay a recorded serial session instead of using the device')
+    parser.add_argument('--replay-fast', action='store_true', help='replay as fast as possible instead of the original timing')
+    parser.add_argument('--station', nargs='?', const='station_output', metavar='DIR',
+                        help='production line mode: download every connected sensor automatically into DIR')
+    parser.add_argument('--sync', action='store_true',
+                        help='differential download: read only the pages that changed since the last download of the sensor')
+    parser.add_argument('--aggregate', choices=list(WINDOWS),
+                        help='also export <xlsx>_summary.xlsx: min/max/mean per hour/day and the threshold events')
+    parser.add_argument('--physical-order', action='store_true',
+                        help='export the records in the order of the pages instead of sorting them by time (wrapped memory)')
+    parser.add_argument('--summary-only', action='store_true', help='with --aggregate, skip the export of every record')
+    parser.add_argument('--pipeline', type=int, metavar='DEPTH',
+                        help='page requests kept in flight during the download (1 = one page at a time, default: link profile or 2)')
+    parser.add_argument('--calibrate', action='store_true',
+                        help='measure baudrate, read length and pipeline depth on the connected sensor and save the link profile of its firmware')
+    parser.add_argument('--no-link-profile', action='store_true', help='ignore the saved link profiles, use the default link parameters')
+    parser.add_argument('--follow', nargs='+', metavar='FILE',
+                        help='keep reading the records the sensor writes and append them to FILE (.csv, .db/.sqlite)')
+    parser.add_argument('--poll', type=float, default=10.0, metavar='SECONDS', help='poll time of --follow')
+    parser.add_argument('--trace', metavar='FILE', help='save statistics and event trace (.json or .csv)')
+    parser.add_argument('--raw-dump', action='store_true', help='also write the pages to dump.bin/dump.txt (the download is saved in dump.efa)')
+    parser.add_argument('--decode-only', nargs='?', const='dump.efa', metavar='DUMP',
+                        help='only decode an existing dump.txt or .efa archive to XLSX (no SmartCable, no serial port)')
+    parser.add_argument('--xlsx', default='flash_content.xlsx', help='XLSX file of --decode-only')
+    parser.add_argument('--profile', metavar='FILE', help='run under cProfile and save the stats (pstats format)')
+    args = parser.parse_args()
+
+    sim = None
+    if args.simulate is not None :
+        from libs.sim_device import FakeSensor, FlashImage
+        image = FlashImage.from_dump(args.simulate) if args.simulate else FlashImage.synthetic(args.sim_pages)
+        sim = FakeSensor(image, baudrate=args.sim_baud, latency=args.sim_latency, byte_loss=args.sim_loss, boot_time=args.sim_boot)
+    if args.replay is not None :
+        from libs.sim_device import ReplayDevice
+        sim = ReplayDevice(args.replay, realtime=not args.replay_fast)
+
     print(colored("===================================================================","magenta"))
     print(HEADER)
     print(HELP)
 
-    app = Eflash_reader_App()
-    app.initApp()
-    app.readExtFlash()
+    app = Eflash_reader_App(sim, args.trace, args.record, args.sync)
+    app.pipeline_depth = args.pipeline
+    app.use_link_profile = not args.no_link_profile
+    app.chronological = not args.physical_order
+    app.raw_dump = args.raw_dump
+    if args.aggregate is not None :
+        app.aggregate = WINDOWS[args.aggregate]
+        app.raw_export = not args.summary_only
+    run = app.readExtFlash
+    if args.decode_only is not None :
+        run = lambda : app.decodeOnly(args.decode_only, args.xlsx)
+    elif args.follow is not None :
+        run = lambda : app.followSensor(args.follow, args.poll)
+    elif args.calibrate :
+        run = app.calibrateLink
+    elif args.station is not None :
+        run = lambda : app.runStation(args.station)
+    else :
+        app.initApp()
+    if args.profile :
+        import cProfile, pstats
+        profiler = cProfile.Profile()
+        try :
+            profiler.runcall(run)
+        finally :
+            profiler.dump_stats(args.profile)
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+    else :
+        run()
+
+    if args.replay is not None and sim.divergences > 0 :
+        print(colored(f"WARN: {sim.divergences} command(s) differ from the recorded session", 'yellow'))
 
     print(colored("==============================", "magenta"))
\ No newline at end of file
@@ -1,19 +1,173 @@
-from libs.serial_handler import SerialController, ATShell
+from libs.serial_handler import SerialController, ATShell, err_pattern
+from module.page_check import check_page, page_crc, is_blank_slot, tail_timestamp
+from libs.page_cache import PageCache
+from libs.metrics import METRICS
+from libs.progress import message
 import serial.tools.list_ports
 
 import time
 
-from tqdm import trange
-from hashlib import sha256
+from collections import deque
 from typing import List, Tuple
 
 BYTES_PER_PAGE   = 2115  # Counting also O\r\n [2112+3]
 MESSAGE_START_ID = 7 # 07 in hex
+RECORD_LENGTH    = 256
+RECORDS_PER_PAGE = 8
+TAIL_LENGTH      = 9
+PAGES_PER_BLOCK  = 64
+
+MIC_DUMP_HEADER  = 12      # framing bytes before the MIC dump data
+MIC_DUMP_TRAILER = 13      # framing bytes after the MIC dump data
+CRC_MAX_SILENT   = 2       # consecutive AT+EFLASHCRC without answer before taking the form as not implemented
 
 class recordInfo:
     done: bool
     acquired: int
 
+"""
+    Pipelined page reader: up to <depth> pages are requested before the answer of the first one arrives,
+    so the device parses the next AT+EFLASHRP while the previous page is still on the wire.
+    Answers are matched to the requests through the echoed command: bytes before an expected echo are
+    dropped, an answer without the final O\r\n or missing at the timeout gives None for its page.
+    With with_crc every page is followed by its AT+EFLASHCRC, answered in the same stream.
+    The port is in binary mode from the first request to pause(): retries (and AT commands) must be done with
+    the link idle, call pause() first.
+"""
+class PagePipeline :
+    depth : int
+    with_crc : bool
+    c_timeout : float
+    pending : deque                 # (echo, page, kind) in the order they have been sent
+    replies : dict[int, list]       # page -> [data, crc] (None when lost)
+
+    def __init__(self, dut : 'DUT', depth : int = 2, with_crc : bool = False, c_timeout : float = 2) :
+        self.dut = dut
+        self.port = dut.serialP
+        self.depth = depth
+        self.with_crc = with_crc
+        self.c_timeout = c_timeout
+        self.pending = deque()
+        self.replies = {}
+        self._buf = bytearray()
+        self._deadline = 0.0
+        self._binary = False
+
+    def request(self, page_num : int) :
+        if not self._binary :   # bytes arrive while nobody is reading: the listener must not take them
+            self.port.enter_binary()
+            self._binary = True
+            self.port.reset_input()
+            self._buf = bytearray()
+        page = hex(page_num)[2:]
+        cmds = [(f"AT+EFLASHRP={page};0;840\r\n", 'data')]
+        if self.with_crc :
+            cmds.append((f"AT+EFLASHCRC={page}\r\n", 'crc'))
+        self.replies[page_num] = [None, None]
+        for cmd, kind in cmds :
+            if not self.pending :
+                self._deadline = time.monotonic() + self.c_timeout
+            self.pending.append((cmd.encode(), page_num, kind))
+            self.port.write(cmd.encode())
+
+    def pagesInFlight(self) -> int :
+        return len({page for _, page, _ in self.pending})
+
+    # Bytes still missing for the answer of the oldest request (at least 1)
+    def _missing(self) -> int :
+        echo, _, kind = self.pending[0]
+        size = len(echo) + (BYTES_PER_PAGE if kind == 'data' else 13)
+        return max(1, size - len(self._buf))
+
+    def _done(self) :
+        self.pending.popleft()
+        self._deadline = time.monotonic() + self.c_timeout
+
+    # Drop what comes before the first expected echo. Requests whose echo is missing are lost
+    def _resync(self) -> bool :
+        found = [(self._buf.find(echo), i) for i, (echo, _, _) in enumerate(self.pending)]
+        found = [f for f in found if f[0] >= 0]
+        if not found :
+            return False
+        pos, idx = min(found)
+        for _ in range(idx) :
+            METRICS.count('pipeline.lost')
+            self._done()
+        del self._buf[:pos]
+        return True
+
+    # Consume the answer of the oldest request if complete. Return False if more bytes are needed
+    def _parse(self) -> bool :
+        echo, page_num, kind = self.pending[0]
+        if not self._buf.startswith(echo) and not self._resync() :
+            return False
+        echo, page_num, kind = self.pending[0]
+        if kind == 'data' :
+            end = len(echo) + BYTES_PER_PAGE
+            if len(self._buf) < end :
+                return False
+            if self._buf[end - 3:end] == b'O\r\n' :
+                self.replies[page_num][0] = bytes(self._buf[len(echo):end - 3])
+                METRICS.count('page.bytes', end)
+                del self._buf[:end]
+            else :  # bytes lost inside the page: the next echo is somewhere in this window
+                METRICS.count('pipeline.lost')
+                del self._buf[:len(echo)]
+        else :
+            idx = self._buf.find(b'\r\n', len(echo))
+            if idx < 0 :
+                return False
+            line = bytes(self._buf[len(echo):idx])
+            if err_pattern.match(line.decode(errors='ignore')) :  # firmware without AT+EFLASHCRC
+                self.dut.crc_supported = False
+                del self._buf[:idx + 2]
+            else :
+                if len(self._buf) < idx + 5 :
+                    return False
+                try :
+                    self.replies[page_num][1] = int(line, 16)
+                except ValueError :
+                    METRICS.count('pipeline.lost')
+                del self._buf[:idx + 2]
+                if self._buf.startswith(b'O\r\n') :
+                    del self._buf[:3]
+        self._done()
+        return True
+
+    # Receive until the oldest request is answered (or timed out)
+    def _step(self) :
+        if self._parse() :
+            return
+        if time.monotonic() > self._deadline :
+            METRICS.count('page.timeouts')
+            self._done()
+            return
+        chunk = self.port.read(self._missing(), 0.5)
+        if chunk :
+            self._buf += chunk
+
+    # (data, crc) of a requested page, None for what has been lost
+    def get(self, page_num : int) -> tuple[bytes | None, int | None] :
+        start_time = time.monotonic()
+        while any(page == page_num for _, page, _ in self.pending) :
+            self._step()
+        METRICS.observe('page.transfer', time.monotonic() - start_time)
+        return tuple(self.replies.pop(page_num, (None, None)))
+
+    # Wait for all the requests in flight: the link is idle and back in line mode when it returns
+    def pause(self) :
+        try :
+            while self.pending :
+                self._step()
+        finally :
+            if self._binary :
+                self._binary = False
+                self.port.exit_binary()
+
+    def close(self) :
+        self.pause()
+        self.replies = {}
+
 # DUT control class, it perform all the communications with DUT
 class DUT :
     serialP : SerialController
@@ -27,6 +181,16 @@ class DUT :
     mic_fw : str
     DUT_SIMULATION : bool
 
+    last_ts : int | None            # timestamp of the last record downloaded (monotonic check)
+    corrupt_pages : list[int]       # pages still damaged on the link (framing, CRC) after all attempts
+    suspect_pages : list[int]       # pages received intact whose content fails check_page: saved once, not read again
+    crc_supported : bool | None     # AT+EFLASHCRC=<page>: None until the firmware has answered it (value or error code)
+    crc_range_supported : bool | None   # same for AT+EFLASHCRC=<page>;<count>, probed on its own
+    crc_silent : dict[str, int]     # consecutive timeouts of each AT+EFLASHCRC form not answered yet
+    last_page : bytes | None        # content of the last page read by dumpPage
+    read_length : int               # bytes per AT+EFLASHRP, a page is read in several commands when < 2112
+    page_timeout : float            # timeout of a page read [s]
+
 
     def __init__(self, serial_test : SerialController, dutSimulation : bool = False) :
         self.serialP = serial_test
@@ -40,6 +204,18 @@ class DUT :
         self.mic_fw = ''
         self.DUT_SIMULATION = dutSimulation
 
+        self.last_ts = None
+        self.corrupt_pages = []
+        self.suspect_pages = []
+        self.crc_supported = None
+        self.crc_range_supported = None
+        self.crc_silent = {}
+        self.last_page = None
+        self._sync_block = None
+        self._sync_block_same = False
+        self.read_length = BYTES_PER_PAGE - 3
+        self.page_timeout = 2
+
     def resetInfo(self) :
         self.dev_sn = ''
         self.deveui = ''
@@ -47,19 +223,37 @@ class DUT :
         self.appeui = ''
         self.mic_fw = ''
         self.mam_fw = ''
+        self.last_ts = None
+        self.corrupt_pages = []
+        self.suspect_pages = []
+        self.crc_supported = None
+        self.crc_range_supported = None
+        self.crc_silent = {}
+        self.last_page = None
+        self._sync_block = None
+        self._sync_block_same = False
 
     # Enter AT mode sending AT+TST
-    def ATmode(self) :
-        ok : bool = False
-        idx : int = 0
-        self.serialP.flush()
-        while idx < 5 and not ok:
-            time.sleep(0.5)
-            idx += 1
-            ok = self.AT.sendCommand('TST')[0]
-        if not ok :
-            raise RuntimeError('DUT-ATmode - FAIL')
+    def ATmode(self, timeout : float = 5.0) :
+        self.waitATReady(timeout)
         print('DUT -> TST')
+
+    # Poll AT+TST until the device answers: short probes, the probe timeout grows with backoff.
+    # Return the time needed by the device to answer (boot time when called right after a reset)
+    def waitATReady(self, timeout : float = 5.0, first_poll : float = 0.03, max_poll : float = 0.15, backoff : float = 1.5) -> float :
+        start = time.monotonic()
+        poll = first_poll
+        self.serialP.flush()
+        while True :
+            try :
+                if self.AT.sendCommand('TST', c_timeout=poll)[0] :
+                    return time.monotonic() - start
+            except Exception :  # E### while the device is booting: just try again
+                pass
+            METRICS.count('bringup.polls')
+            if time.monotonic() - start >= timeout :
+                raise RuntimeError('DUT-ATmode - FAIL')
+            poll = min(poll * backoff, max_poll)
     
     # Get ACTI from DUT
     def getACTI(self) -> bool :
@@ -128,131 +322,350 @@ class DUT :
             raise RuntimeError('DUT-getFWVERSION - FAIL')
         print(f'DUT -> FW-VERSION={ret[0]}')
         return ret[0]
+
+    # Switch the UART of the device (AT+BUART, fast UART only from t.4.11) and then the port.
+    # A reset brings the device back to 115200 (see defaultBaudrate).
+    # Return False if the firmware refuses it or the device doesn't answer at the new baudrate (reset it then)
+    def setBaudrate(self, baudrate : int) -> bool :
+        try :
+            ok, _ = self.AT.sendCommand('BUART', str(baudrate), c_timeout=1)
+        except Exception :  # E### -> not available on this firmware
+            return False
+        if not ok :
+            return False
+        self.serialP.set_baudrate(baudrate)
+        try :
+            ok = self.AT.sendCommand('TST', c_timeout=0.5)[0]
+        except Exception :
+            ok = False
+        print(f'DUT -> BUART={baudrate} {"OK" if ok else "FAIL"}')
+        return ok
+
+    # Port back to the default baudrate, the one of the device after a reset
+    def defaultBaudrate(self) :
+        if self.serialP.baudrate != self.serialP.BAUDRATE :
+            self.serialP.set_baudrate(self.serialP.BAUDRATE)
     
+    # Get the CRC32 of a page (or of count consecutive pages) computed by the firmware. Return None if not available.
+    # AT+EFLASHCRC is optional in the firmware: every caller falls back to the content checks without it.
+    # The single page and the range forms are probed on their own. A form is taken as not implemented on an error
+    # code (E###), or after CRC_MAX_SILENT consecutive timeouts if it has never answered (firmware that ignores
+    # unknown commands): each of those costs a full timeout on every page of a stop-and-wait download
+    def getPageCRC(self, page : str, count : int = 1) -> int | None :
+        attr = 'crc_supported' if count == 1 else 'crc_range_supported'
+        if getattr(self, attr) is False :
+            return None
+        try :
+            ok, ret = self.AT.sendCommand('EFLASHCRC', page if count == 1 else f'{page};{count:x}', c_timeout=0.5)
+        except Exception :  # E### -> command not implemented
+            setattr(self, attr, False)
+            return None
+        try :
+            crc = int(ret[0], 16) if ok and len(ret) > 0 else None
+        except ValueError :
+            crc = None
+        if crc is None :
+            METRICS.count('crc.timeouts')
+            self.crc_silent[attr] = self.crc_silent.get(attr, 0) + 1
+            if getattr(self, attr) is None and self.crc_silent[attr] >= CRC_MAX_SILENT :
+                message("INFO: no answer to AT+EFLASHCRC, pages checked on their content only")
+                setattr(self, attr, False)
+            return None
+        self.crc_silent[attr] = 0
+        setattr(self, attr, True)
+        return crc
+
+    # Check the page as soon as it arrives. crc: CRC already received from the device (pipelined read).
+    # Return (received, issues): received is False when the page was damaged on the link (CRC mismatch) and
+    # must be read again; issues are the content checks of check_page, the same on every read of the page
+    def verifyPage(self, page : str, cln_buff : bytes, crc : int | None = None, fetch_crc : bool = True) -> tuple[bool, str] :
+        if fetch_crc :
+            crc = self.getPageCRC(page)
+        if crc is not None and crc != page_crc(cln_buff) :
+            return False, f'CRC mismatch (device {crc:08x}, received {page_crc(cln_buff):08x})'
+        check = check_page(cln_buff, self.last_ts)
+        if check.wrapped :
+            message(f"INFO: page 0x{page} restarts from an older timestamp (memory wrap)")
+        if check.last_ts is not None :
+            self.last_ts = check.last_ts
+        return True, '; '.join(check.issues)
+
+    # Read <length> bytes of a page from <offset>. Return (data, received, expected): data is None on timeout
+    def readEflash(self, page : str, offset : int = 0, length : int = BYTES_PER_PAGE - 3, c_timeout : float = 2) -> tuple[bytes | None, int, int]:
+        cmd = f"AT+EFLASHRP={page};{offset:x};{length:x}\r\n"
+        len_cmd = len(cmd)
+        EXPECTED_RESPONSE = length + 3 + len_cmd
+
+        buffer = b""
+        echo = cmd.encode("utf-8")
+        start = 0
+        with self.serialP.binary() as port:   # the listener doesn't take bytes of the answer
+            port.reset_input()
+            start_time = time.monotonic()
+
+            # send command
+            port.write(echo)
+
+            # Read page until you have read it all or the timeout occurs.
+            # The answer starts at the echo: late answers of previous commands before it are skipped
+            while len(buffer) < start + EXPECTED_RESPONSE and (time.monotonic() - start_time) < c_timeout:
+                remaining = start + EXPECTED_RESPONSE - len(buffer)
+                chunk = port.read(remaining, 0.5)  # Short timeout for read()
+                if chunk:
+                    buffer += chunk
+                    start = max(buffer.find(echo), 0)
+
+        METRICS.observe('page.transfer', time.monotonic() - start_time)
+        METRICS.count('page.bytes', len(buffer))
+
+        if len(buffer) < start + EXPECTED_RESPONSE:
+            return None, len(buffer) - start, EXPECTED_RESPONSE
+        if buffer[start + EXPECTED_RESPONSE - 3:start + EXPECTED_RESPONSE] != b'O\r\n':  # bytes lost and the gap filled by later ones
+            METRICS.count('page.framing')
+            return None, len(buffer) - start, EXPECTED_RESPONSE
+        return buffer[start + len_cmd:start + len_cmd + length], EXPECTED_RESPONSE, EXPECTED_RESPONSE  # Remove cmd and O\r\n
+
+    # Read a whole page, read_length bytes per command. Return (data, received, expected) like readEflash
+    def readPageData(self, page : str, c_timeout : float) -> tuple[bytes | None, int, int]:
+        page_length = BYTES_PER_PAGE - 3
+        if self.read_length >= page_length :
+            return self.readEflash(page, c_timeout=c_timeout)
+        data = b""
+        for offset in range(0, page_length, self.read_length) :
+            chunk, received, expected = self.readEflash(page, offset, min(self.read_length, page_length - offset), c_timeout)
+            if chunk is None :
+                return None, len(data) + received, page_length
+            data += chunk
+        return data, page_length, page_length
+
+    # Time spent reading <pages> (hex) with <depth> requests in flight and the pages lost or garbled.
+    # Only the transfer is measured: nothing is saved. Return (seconds, errors)
+    def probeRead(self, pages : list[str], depth : int = 1) -> tuple[float, int] :
+        errors = 0
+        start_time = time.monotonic()
+        if depth > 1 :
+            pipe = PagePipeline(self, depth, with_crc = self.crc_supported is True, c_timeout = self.page_timeout)
+            try :
+                requested = 0
+                for page in pages :
+                    while requested < len(pages) and pipe.pagesInFlight() < depth :
+                        pipe.request(int(pages[requested], 16))
+                        requested += 1
+                    data, crc = pipe.get(int(page, 16))
+                    if data is None or (crc is not None and crc != page_crc(data)) :
+                        errors += 1
+            finally :
+                pipe.close()
+        else :
+            for page in pages :
+                data, _, _ = self.readPageData(page, self.page_timeout)
+                crc = self.getPageCRC(page) if data is not None else None
+                if data is None or (crc is not None and crc != page_crc(data)) :
+                    errors += 1
+        return time.monotonic() - start_time, errors
+
     # Read page content
-    def dumpPage(self, page: str, filename : str, skip_counter : int, c_timeout : float = 2, max_attempts: int = 3) -> tuple[bool, int]:
+    def dumpPage(self, page: str, filename : str | None, skip_counter : int, c_timeout : float | None = None, max_attempts: int = 3, verify : bool = True,
+                 prefetched : tuple[bytes | None, int | None] | None = None, pause = None) -> tuple[bool, int]:
         """
         Read one page of external flash memory and append the content in:
             - <filname>.bin as binary
             - <filname>.txt as hex
+        (nothing is written when filename is None: the caller keeps last_page, e.g. in the archive)
+
+        Every written page is verified before being saved. Transport failures (timeout, framing, firmware CRC
+        when available) are requested again immediately; a page that keeps failing the CRC is saved anyway and
+        listed in corrupt_pages. Content checks (tail vs payload, monotonic timestamps) don't change when the
+        page is read again: the page is saved once and listed in suspect_pages.
+        The content of the last page read is kept in last_page (None if blank or skipped).
+
+        prefetched: (data, crc) already received by a PagePipeline, used as first attempt.
+        pause: called before reading again from the device (PagePipeline.pause).
 
         Return:
             bool: True when it finds a blank page
             int:  Takes the count of the number of pages that has been skipped 'couse of multiple timeout error (skip_counter += 1)
         """
-        cmd = f"AT+EFLASHRP={page};0;840\r\n"
-        len_cmd = len(cmd)
-        EXPECTED_RESPONSE = BYTES_PER_PAGE + len_cmd
+        self.last_page = None
+        if c_timeout is None:
+            c_timeout = self.page_timeout
 
         for attempt in range(1, max_attempts + 1):
-            self.serialP.ser.flushInput()
-            self.serialP.ser.timeout = 0.5  # Short timeout for read()
-
-            buffer = b""
-            start_time = time.monotonic()
-
-            # send command
-            self.serialP.ser.write(cmd.encode("utf-8"))
-
-            # Read page until you have read it all or the timeout occurs
-            while len(buffer) < EXPECTED_RESPONSE and (time.monotonic() - start_time) < c_timeout:
-                remaining = EXPECTED_RESPONSE - len(buffer)
-                chunk = self.serialP.ser.read(remaining)
-                if chunk:
-                    buffer += chunk
-
-            if len(buffer) < EXPECTED_RESPONSE:
-                print(f"WARN: Timeout (attempt {attempt}/{max_attempts}) | Received {len(buffer)}/{EXPECTED_RESPONSE} bytes")
+            crc = None
+            if attempt == 1 and prefetched is not None:
+                cln_buff, crc = prefetched
+                received, expected = 0, BYTES_PER_PAGE
+            else:
+                if pause is not None:
+                    pause()
+                cln_buff, received, expected = self.readPageData(page, c_timeout)
+            if attempt > 1:
+                METRICS.count('page.retries')
+
+            if cln_buff is None:
+                if prefetched is None or attempt > 1:
+                    METRICS.count('page.timeouts')
+                message(f"WARN: Timeout (attempt {attempt}/{max_attempts}) | Received {received}/{expected} bytes")
                 if attempt < max_attempts:
                     time.sleep(0.1)  # short delay before retry
                     continue
                 else:
                     # last attempt failed -> increment skip_counter to see the next page
+                    METRICS.count('page.skipped')
                     skip_counter += 1
                     return False, skip_counter
 
             # if everything good
-            cln_buff = buffer[len_cmd:len_cmd + (BYTES_PER_PAGE - 3)]  # Remove cmd and O\r\n
-
-            if cln_buff and cln_buff[0] == MESSAGE_START_ID:  # check if the page is written or blank
-                # Append if is written
-                with open(filename + ".bin", 'ab') as rawfile:
-                    rawfile.write(cln_buff)
-                hex_page = cln_buff.hex()
-                with open(filename + ".txt", "a") as hexfile:
-                    hexfile.write(hex_page)
-                return False, skip_counter  # page has been read correctly
-            else:
+            if not (cln_buff and cln_buff[0] == MESSAGE_START_ID):  # check if the page is written or blank
                 # Blank page detected
+                METRICS.count('page.blank')
                 return True, skip_counter
 
+            if verify :
+                with METRICS.timer('page.verify') :
+                    valid, issue = self.verifyPage(page, cln_buff, crc, fetch_crc = prefetched is None or attempt > 1)
+                if not valid :
+                    METRICS.count('page.corrupt')
+                    message(f"WARN: Corrupted page 0x{page} (attempt {attempt}/{max_attempts}) | {issue}")
+                    if attempt < max_attempts:
+                        continue
+                    # better keep it than lose it
+                    self.corrupt_pages.append(int(page, 16))
+                elif issue :
+                    METRICS.count('page.suspect')
+                    message(f"WARN: Suspect page 0x{page} | {issue}")
+                    self.suspect_pages.append(int(page, 16))
+
+            self.savePage(cln_buff, filename)
+            self.last_page = cln_buff
+            return False, skip_counter  # page has been read correctly
+
+    # Append a written page to <filename>.bin/.txt (nothing when filename is None)
+    def savePage(self, cln_buff : bytes, filename : str | None) :
+        if filename is None :
+            return
+        with open(filename + ".bin", 'ab') as rawfile:
+            rawfile.write(cln_buff)
+        hex_page = cln_buff.hex()
+        with open(filename + ".txt", "a") as hexfile:
+            hexfile.write(hex_page)
+        METRICS.count('page.written')
+
+    # Append count blank pages to <filename>.bin/.txt (pages known to be blank, not read)
+    def saveBlankPages(self, count : int, filename : str | None) :
+        if filename is None :
+            return
+        blank = b"\xff" * (BYTES_PER_PAGE - 3) * count  # without O\r\n
+        with open(filename + ".bin", 'ab') as rawfile:
+            rawfile.write(blank)
+        with open(filename + ".txt", "a") as hexfile:
+            hexfile.write(blank.hex())
+
+    #==================================================================
+    # DIFFERENTIAL DOWNLOAD
+
+    # True if the cached copy of the page is still what the device has.
+    # Digest from the firmware when available, otherwise only the tail of the first record is read
+    # (9 bytes instead of 2112): records are only appended, so a full page whose first record
+    # still has the same tail timestamp has not been erased and rewritten
+    def pageUnchanged(self, page_num : int, cache : PageCache, count : int = 1) -> bool:
+        cached = cache.get(page_num)
+        if cached is None or is_blank_slot(cached[(RECORDS_PER_PAGE - 1) * RECORD_LENGTH:RECORDS_PER_PAGE * RECORD_LENGTH]):
+            return False    # unknown or not full: new records may have been appended
+        if count > 1:
+            ref = cache.blockCRC(page_num, count)
+            if ref is None:
+                return False
+        else:
+            ref = cache.crc(page_num)
+        crc = self.getPageCRC(hex(page_num)[2:], count)
+        if crc is not None:
+            METRICS.count('sync.digests')
+            return crc == ref
+        if count > 1:
+            # no digest: head and last page of the block
+            return self.pageUnchanged(page_num, cache) and self.pageUnchanged(page_num + count - 1, cache)
+        tail, _, _ = self.readEflash(hex(page_num)[2:], RECORD_LENGTH - TAIL_LENGTH, TAIL_LENGTH)
+        METRICS.count('sync.tails')
+        return tail is not None and tail_timestamp(tail) == tail_timestamp(cached[:RECORD_LENGTH])
+
+    # Same as dumpPage, but the page is taken from the local cache of the sensor when the device
+    # still has the same content. A whole block is checked with one digest when it is entered
+    def syncPage(self, page_num : int, filename : str | None, skip_counter : int, cache : PageCache) -> tuple[bool, int]:
+        block = page_num - page_num % PAGES_PER_BLOCK
+        if self._sync_block != block:
+            self._sync_block = block
+            self._sync_block_same = self.pageUnchanged(block, cache, PAGES_PER_BLOCK)
+
+        if self._sync_block_same or self.pageUnchanged(page_num, cache):
+            cached = cache.get(page_num)
+            check = check_page(cached, self.last_ts)
+            if check.last_ts is not None:
+                self.last_ts = check.last_ts
+            self.savePage(cached, filename)
+            self.last_page = cached
+            METRICS.count('sync.cached')
+            return False, skip_counter
+
+        is_blank, skip_counter = self.dumpPage(hex(page_num)[2:], filename, skip_counter)
+        if self.last_page is not None:
+            cache.put(page_num, self.last_page)
+        return is_blank, skip_counter
 
-    
     # read all the MIC memory to bin file (recording data)
-    # Function do not use the AT class bc it's complicated -> directly use the serial
-    def dumpMicMemory(self, filename : str) :
-
-        self.serialP.ser.flushInput()
-        self.serialP.ser.timeout = 5
-        self.serialP.ser.write(b"AT+TST:rd")
-        msg = self.serialP.ser.read_until(b"O\r\n")
-        buffer = b""
-        if b"O\r\n" in msg :
-            while True:
-                last_received_time = time.monotonic()
-                chunk = self.serialP.ser.read(512)  # Read in chunks
-                buffer += chunk
-                # No data received, check if transmission has ended
-                if (time.monotonic() - last_received_time) > 0.9:
-                    break  # Exit the loop
-        # buffer = buffer[12:-10]
-        buffer = buffer[12:-13]
-        print(f'Data recv len {len(buffer)}')
-        with open(filename, 'bw') as rawfile:
-            rawfile.write(buffer)
-
-
-    # Perform the programming of MIC mcu with the old method (flash mass erase, sending each page to MAM and the MAM perform the programming)
-    # it's more time consuming than the bridge programming style
-    def flashMICFirmwareOLD(self, fw_mic : str, mic_fw_hash : str) :
-        print('Loading Firmware MIC...')
-        with open(fw_mic, 'rb') as f:
-            data = f.read()
-        if len(data) > 0x20000:
-            raise RuntimeError("Firmware too big")
-        
-        datapadded = data + b'\xff' * (0x20000 - len(data))
-        binhash = sha256(datapadded).digest().hex().upper()
-        if mic_fw_hash != binhash : return False
-        print(f'MIC firmware sha: {binhash}')
-
-        self.enMICPS('1')
-        print("Entering Boot Mode...")
-        self.enableMICBootloader(True)
-
-        print("Doing Mass Erase... (This should take around 20 seconds)")
-        self.eraseMICMemory(0)
-        
-        print("Downloading firmware to target...")
-        SLICE = 256
-        for addr in trange(0x08000000, 0x08000000+len(data), SLICE):
-            self.writeMICFlash(addr, data[:SLICE])
-            data = data[SLICE:]
-
-
-        print("Download completed, resetting the device...")
-        self.enableMICBootloader(False)
-        self.enMICPS('0')
-        time.sleep(0.2)
-
-        self.enMICPS('1')
-        time.sleep(0.5)
-        print("Checking Hash...")
-        hash = self.getMICFWHash()
-        self.enMICPS('0')
-
-        if hash != binhash:
-            raise RuntimeError(f"Hash mismatch: {hash} != {binhash}")
-
+    # Function do not use the AT class bc it's complicated -> raw bytes in a binary session of the port
+    # Data are written to disk as they arrive (memory doesn't depend on the dump size). The transfer ends when the
+    # framing trailer (ending with end_marker) is followed by silence, or after idle_timeout without bytes.
+    # Return the number of data bytes saved
+    def dumpMicMemory(self, filename : str, idle_timeout : float = 0.9, end_grace : float = 0.05, end_marker : bytes = b"O\r\n", chunk_size : int = 4096) -> int :
+        # Binary session for the whole transfer: the listener must not take bytes of the dump
+        with self.serialP.binary() as port :
+            port.reset_input()
+            port.write(b"AT+TST:rd")
+            msg = port.read_until(b"O\r\n", 5)
+            if b"O\r\n" not in msg :
+                print('WARN: MIC dump not started')
+                return 0
+
+            header_left = MIC_DUMP_HEADER
+            tail = b""              # last MIC_DUMP_TRAILER bytes, written only when more data arrive
+            written = 0
+            received = 0
+            start_time = time.monotonic()
+            last_received_time = start_time
+
+            from tqdm import tqdm   # progress bars only when flashing/dumping the MIC
+            with open(filename, 'bw') as rawfile, tqdm(unit='B', unit_scale=True, desc='MIC dump') as progress :
+                while True:
+                    chunk = port.read(chunk_size, end_grace)  # Read in chunks, short reads: the loop must see the silence on the line
+                    now = time.monotonic()
+                    if chunk :
+                        last_received_time = now
+                        received += len(chunk)
+                        progress.update(len(chunk))
+                        if header_left > 0 :
+                            drop = min(header_left, len(chunk))
+                            chunk = chunk[drop:]
+                            header_left -= drop
+                        data = tail + chunk
+                        if len(data) > MIC_DUMP_TRAILER :
+                            rawfile.write(data[:-MIC_DUMP_TRAILER])
+                            written += len(data) - MIC_DUMP_TRAILER
+                            tail = data[-MIC_DUMP_TRAILER:]
+                        else :
+                            tail = data
+                    elif len(tail) == MIC_DUMP_TRAILER and tail.endswith(end_marker) :
+                        break  # trailer received and nothing else after it
+                    elif (now - last_received_time) > idle_timeout :
+                        # No data received, transmission has ended without the trailer: the bytes held back are data
+                        rawfile.write(tail)
+                        written += len(tail)
+                        break
+
+        elapsed = max(last_received_time - start_time, 1e-6)
+        METRICS.count('mic.dump_bytes', received)
+        METRICS.observe('mic.dump', elapsed)
+        print(f'Data recv len {written} ({round(received / elapsed / 1024, 1)} kB/s)')
+        return written
         
 
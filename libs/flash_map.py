@@ -0,0 +1,106 @@
+from libs.storage import load_json, save_json
+
+"""
+    Map of the external flash of one sensor, built while pages are read and saved per serial number
+    (<DATA_DIR>/flash_maps/<SN>.json) to plan the next download.
+
+    Every page has a state: unknown, data, blank or failed (still unreadable/corrupted after the retries).
+    Blocks outside the log area (first block and the last ones, with the diagnostic pages) are diagnostic
+    and are never read. The state of a block is derived from its pages.
+"""
+
+PAGE_UNKNOWN, PAGE_DATA, PAGE_BLANK, PAGE_FAILED, PAGE_DIAGNOSTIC = range(5)
+STATE_NAMES  = ['unknown', 'data', 'blank', 'failed', 'diagnostic']
+STATE_CHARS  = '?#.F-'     # render()
+
+FLASH_MAP_DIR = 'flash_maps'
+
+class FlashMap :
+    sn : str
+    pages_per_block : int
+    first_data_block : int
+    last_data_block : int
+    pages : bytearray       # state of every page
+
+    def __init__(self, sn : str, first_data_block : int = 1, last_data_block : int = 490, pages_per_block : int = 64, total_blocks : int = 512) :
+        self.sn = sn
+        self.pages_per_block = pages_per_block
+        self.first_data_block = first_data_block
+        self.last_data_block = last_data_block
+        self.pages = bytearray(total_blocks * pages_per_block)
+        self.pages[:self.firstDataPage()] = bytes([PAGE_DIAGNOSTIC]) * self.firstDataPage()
+        self.pages[self.endDataPage():] = bytes([PAGE_DIAGNOSTIC]) * (len(self.pages) - self.endDataPage())
+        self._load()
+
+    def _file(self) -> str:
+        return f'{FLASH_MAP_DIR}/{self.sn}.json'
+
+    # Saved as runs [first page, count, state] of the log area
+    def _load(self) :
+        data = load_json(self._file())
+        if data is None or data.get('pages_per_block') != self.pages_per_block:
+            return
+        for first, count, state in data['runs']:
+            if self.firstDataPage() <= first and first + count <= self.endDataPage():
+                self.pages[first:first + count] = bytes([state]) * count
+
+    def save(self) :
+        runs = []
+        for page in range(self.firstDataPage(), self.endDataPage()):
+            state = self.pages[page]
+            if runs and runs[-1][2] == state and runs[-1][0] + runs[-1][1] == page:
+                runs[-1][1] += 1
+            elif state != PAGE_UNKNOWN:
+                runs.append([page, 1, state])
+        save_json(self._file(), {'pages_per_block': self.pages_per_block, 'runs': runs})
+
+    def firstDataPage(self) -> int:
+        return self.first_data_block * self.pages_per_block
+
+    # First page after the log area
+    def endDataPage(self) -> int:
+        return (self.last_data_block + 1) * self.pages_per_block
+
+    def mark(self, page : int, state : int) :
+        if self.pages[page] != PAGE_DIAGNOSTIC:
+            self.pages[page] = state
+
+    def isDiagnostic(self, page : int) -> bool:
+        return page >= len(self.pages) or self.pages[page] == PAGE_DIAGNOSTIC
+
+    def blockState(self, block : int) -> int:
+        first = block * self.pages_per_block
+        states = self.pages[first:first + self.pages_per_block]
+        if PAGE_DIAGNOSTIC in states:
+            return PAGE_DIAGNOSTIC
+        if PAGE_FAILED in states:
+            return PAGE_FAILED
+        if PAGE_DATA in states:
+            return PAGE_DATA
+        if states[0] == PAGE_BLANK:     # pages are written in order: a blank first page means a blank block
+            return PAGE_BLANK
+        return PAGE_UNKNOWN
+
+    # First page of the first block known to hold data (from the block of start_page, the log area by default),
+    # None if there isn't one
+    def firstDataBlockPage(self, start_page : int | None = None) -> int | None:
+        first_block = self.first_data_block if start_page is None else max(start_page // self.pages_per_block, self.first_data_block)
+        for block in range(first_block, self.last_data_block + 1):
+            if self.blockState(block) in (PAGE_DATA, PAGE_FAILED):
+                return block * self.pages_per_block
+        return None
+
+    # Pages known to hold data (failed ones included)
+    def dataPages(self) -> int:
+        return self.pages.count(PAGE_DATA) + self.pages.count(PAGE_FAILED)
+
+    def summary(self) -> dict[str, int]:
+        counts = {name: 0 for name in STATE_NAMES}
+        for block in range(len(self.pages) // self.pages_per_block):
+            counts[STATE_NAMES[self.blockState(block)]] += 1
+        return counts
+
+    # One character per block
+    def render(self, width : int = 64) -> str:
+        chars = ''.join(STATE_CHARS[self.blockState(b)] for b in range(len(self.pages) // self.pages_per_block))
+        return '\n'.join(chars[i:i + width] for i in range(0, len(chars), width))
@@ -0,0 +1,140 @@
+from libs.storage import load_json, save_json
+from libs.metrics import METRICS
+from module.page_check import check_record, is_blank_slot, tail_timestamp
+from module.records import decode_record, check_columns
+from module.read_page import RECORD_LENGTH_BYTE, RECORDS_PER_PAGE, TAIL_LENGTH_BYTE
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING :
+    from libs.dut import DUT
+
+"""
+    Follow a sensor that keeps logging: only the records written since the previous poll are read.
+
+    The write position (page being written, records already read from it, timestamp of the last one) is found once
+    from the tails of the first record of every block and then of the pages of the newest block. A poll with nothing
+    new costs one 9 bytes read (the tail of the next slot); when it's written the rest of the page is read with a
+    single command. At the end of the log area the position goes back to the first block (ring). A page is new only
+    if its first record is not older than the last one read: on a wrapped ring the next block keeps the old records
+    until the firmware erases it.
+
+    The position is saved per serial number (<DATA_DIR>/follow/<SN>.json): after a restart the records written in
+    the meantime are read by the first poll, if the last record read is still there.
+"""
+
+FOLLOW_DIR = 'follow'
+
+class SensorFollower :
+    sn : str
+    columns : list[str] | None
+    page : int | None       # page being written
+    slot : int              # records already read from it
+    last_ts : int | None    # timestamp of the last record read
+
+    def __init__(self, dut : 'DUT', sn : str, columns : list[str] | None = None, first_page : int = 64, end_page : int = 491 * 64, pages_per_block : int = 64) :
+        check_columns(columns)
+        self.dut = dut
+        self.sn = sn
+        self.columns = columns
+        self.first_page = first_page
+        self.end_page = end_page
+        self.pages_per_block = pages_per_block
+        self.page = None
+        self.slot = 0
+        self.last_ts = None
+
+    def _file(self) -> str:
+        return f'{FOLLOW_DIR}/{self.sn}.json'
+
+    # Tail of a record slot, None if the device doesn't answer
+    def _tail(self, page : int, slot : int) -> bytes | None:
+        data, _, _ = self.dut.readEflash(hex(page)[2:], slot * RECORD_LENGTH_BYTE + RECORD_LENGTH_BYTE - TAIL_LENGTH_BYTE, TAIL_LENGTH_BYTE)
+        return data
+
+    def _firstTs(self, page : int) -> int | None:
+        tail = self._tail(page, 0)
+        if tail is None :
+            raise RuntimeError(f'page {page}: no answer from the device')
+        return None if is_blank_slot(tail) else tail_timestamp(tail)
+
+    # Resume from the saved position if the last record read is still on the device, otherwise locate it
+    def start(self) :
+        state = load_json(self._file())
+        if state is not None and state['slot'] > 0 :
+            tail = self._tail(state['page'], state['slot'] - 1)
+            if tail is not None and not is_blank_slot(tail) and tail_timestamp(tail) == state['last_ts'] :
+                self.page, self.slot, self.last_ts = state['page'], state['slot'], state['last_ts']
+                return
+            print(f'Follow: saved position of {self.sn} not valid anymore (memory erased?), locating it again')
+        self.locate()
+
+    # Newest block (greatest timestamp of its first record), then its last written page and slot
+    def locate(self) :
+        newest, newest_ts = None, None
+        for block_page in range(self.first_page, self.end_page, self.pages_per_block) :
+            ts = self._firstTs(block_page)
+            if ts is not None and (newest_ts is None or ts > newest_ts) :
+                newest, newest_ts = block_page, ts
+        if newest is None :     # blank memory: wait for the first record
+            self.page, self.slot, self.last_ts = self.first_page, 0, None
+            return
+        page = newest
+        for next_page in range(newest + 1, newest + self.pages_per_block) :
+            ts = self._firstTs(next_page)
+            if ts is None or ts < newest_ts :
+                break
+            page, newest_ts = next_page, ts
+        data, _, _ = self.dut.readPageData(hex(page)[2:], self.dut.page_timeout)
+        if data is None :
+            raise RuntimeError(f'page {page}: no answer from the device')
+        self.page, self.slot, self.last_ts = page, 0, None
+        for slot in range(RECORDS_PER_PAGE) :
+            rec = data[slot * RECORD_LENGTH_BYTE:(slot + 1) * RECORD_LENGTH_BYTE]
+            if is_blank_slot(rec) :
+                break
+            self.slot, self.last_ts = slot + 1, tail_timestamp(rec)
+
+    def save(self) :
+        if self.page is not None :
+            save_json(self._file(), {'page': self.page, 'slot': self.slot, 'last_ts': self.last_ts})
+
+    # Records written since the last poll (decoded with columns), reading at most max_pages pages
+    def poll(self, max_pages : int = 64) -> list[dict]:
+        if self.page is None :
+            self.start()
+        records = []
+        pages = 0
+        while pages < max_pages :
+            page, slot = self.page, self.slot
+            if slot >= RECORDS_PER_PAGE :   # the position moves to the next page only when it has been written
+                page, slot = page + 1 if page + 1 < self.end_page else self.first_page, 0
+            tail = self._tail(page, slot)
+            if tail is None :
+                METRICS.count('follow.timeouts')
+                break
+            if is_blank_slot(tail) :
+                break
+            if slot == 0 and self.last_ts is not None and tail_timestamp(tail) < self.last_ts :
+                break   # wrapped ring: old records of the next block, not erased yet by the firmware
+            self.page, self.slot = page, slot
+            # the rest of the page with one command
+            data, _, _ = self.dut.readEflash(hex(self.page)[2:], self.slot * RECORD_LENGTH_BYTE, (RECORDS_PER_PAGE - self.slot) * RECORD_LENGTH_BYTE)
+            if data is None :
+                METRICS.count('follow.timeouts')
+                break
+            pages += 1
+            for i in range(len(data) // RECORD_LENGTH_BYTE) :
+                rec = data[i * RECORD_LENGTH_BYTE:(i + 1) * RECORD_LENGTH_BYTE]
+                if is_blank_slot(rec) :
+                    break
+                self.slot += 1
+                if check_record(rec) is not None :
+                    METRICS.count('follow.bad_records')
+                    continue
+                self.last_ts = tail_timestamp(rec)
+                records.append(decode_record(rec, self.page, self.slot, self.columns))
+            if self.slot < RECORDS_PER_PAGE :   # page still being written
+                break
+        METRICS.count('follow.records', len(records))
+        self.save()
+        return records
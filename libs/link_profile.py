@@ -0,0 +1,66 @@
+from libs.storage import load_json, save_json
+
+"""
+    Link parameters measured for a firmware release and saved in <DATA_DIR>/link_profiles.json, keyed by
+    '<FW version>/<FW hash>'. Eflash_reader_App.calibrateLink() probes the connected sensor and saves the best
+    combination; the next downloads of a sensor with the same firmware load it automatically.
+
+        baudrate        : UART speed (AT+BUART), 115200 or the fast UART when the firmware has it
+        read_length     : bytes per AT+EFLASHRP (a page is read with several commands when < 2112)
+        pipeline_depth  : page requests kept in flight (only with whole page reads)
+        c_timeout       : timeout of a page read [s]
+        results         : what has been measured for every combination (throughput, error rate)
+"""
+
+LINK_PROFILE_FILE = 'link_profiles.json'
+
+class LinkProfile :
+    baudrate : int
+    read_length : int
+    pipeline_depth : int
+    c_timeout : float
+    results : list[dict]
+
+    def __init__(self, baudrate : int = 115200, read_length : int = 2112, pipeline_depth : int = 2, c_timeout : float = 2, results : list[dict] | None = None) :
+        self.baudrate = baudrate
+        self.read_length = read_length
+        self.pipeline_depth = pipeline_depth
+        self.c_timeout = c_timeout
+        self.results = results or []
+
+    def toDict(self) -> dict:
+        return {'baudrate': self.baudrate, 'read_length': self.read_length, 'pipeline_depth': self.pipeline_depth,
+                'c_timeout': self.c_timeout, 'results': self.results}
+
+    def __str__(self) -> str:
+        return f'{self.baudrate} baud, {self.read_length} bytes per read, pipeline {self.pipeline_depth}, timeout {self.c_timeout} s'
+
+
+def profile_key(fw_version : str, fw_hash : str) -> str:
+    return f'{fw_version}/{fw_hash}'
+
+def load_profile(fw_version : str, fw_hash : str) -> LinkProfile | None:
+    data = load_json(LINK_PROFILE_FILE, {}).get(profile_key(fw_version, fw_hash))
+    if data is None:
+        return None
+    try:
+        return LinkProfile(**data)
+    except TypeError:   # saved by another version of the tool
+        return None
+
+def save_profile(fw_version : str, fw_hash : str, profile : LinkProfile) :
+    profiles = load_json(LINK_PROFILE_FILE, {})
+    profiles[profile_key(fw_version, fw_hash)] = profile.toDict()
+    save_json(LINK_PROFILE_FILE, profiles)
+
+# Fastest combination among the measured ones, preferring the ones with an error rate <= max_error_rate.
+# Within 2% of the fastest (measurement noise) the smallest pipeline depth wins.
+# results: dicts with baudrate, read_length, pipeline_depth, throughput [B/s], error_rate, page_time [s]
+def best_profile(results : list[dict], max_error_rate : float = 0.02) -> LinkProfile:
+    reliable = [r for r in results if r['error_rate'] <= max_error_rate and r['throughput'] > 0] or results
+    score = lambda r: r['throughput'] * (1 - r['error_rate'])
+    fastest = max(score(r) for r in reliable)
+    best = min((r for r in reliable if score(r) >= 0.98 * fastest), key=lambda r: (r['pipeline_depth'], -score(r)))
+    # a page normally takes page_time: wait a few times that before calling it lost, but never more than 2 s
+    c_timeout = min(2.0, max(0.5, round(4 * best['page_time'] * best['pipeline_depth'], 2)))
+    return LinkProfile(best['baudrate'], best['read_length'], best['pipeline_depth'], c_timeout, results)
@@ -0,0 +1,173 @@
+import csv
+import json
+import threading
+import time
+
+"""
+    Lightweight instrumentation shared by the whole tool: counters and latency histograms.
+    Hooks are always active (a perf_counter and a dict update), the event trace is recorded only when enabled.
+
+    Usage:
+        METRICS.count('page.retries')
+        with METRICS.timer('page.transfer') :
+            ...
+        METRICS.printSummary()
+"""
+
+# Exponential buckets: 10 us .. ~84 s
+HISTOGRAM_BOUNDS = [1e-5 * 2**i for i in range(24)]
+
+class Histogram :
+    count : int
+    total : float
+    min : float
+    max : float
+    buckets : list[int]
+
+    def __init__(self) :
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.buckets = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+
+    def add(self, value : float) :
+        self.count += 1
+        self.total += value
+        if value < self.min : self.min = value
+        if value > self.max : self.max = value
+        idx = 0
+        while idx < len(HISTOGRAM_BOUNDS) and value > HISTOGRAM_BOUNDS[idx]:
+            idx += 1
+        self.buckets[idx] += 1
+
+    # Upper bound of the bucket that contains the given percentile
+    def percentile(self, p : float) -> float:
+        if self.count == 0:
+            return 0.0
+        target = p * self.count
+        acc = 0
+        for idx, n in enumerate(self.buckets):
+            acc += n
+            if acc >= target:
+                return min(HISTOGRAM_BOUNDS[idx] if idx < len(HISTOGRAM_BOUNDS) else self.max, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'total': round(self.total, 6),
+            'mean':  round(self.total / self.count, 6) if self.count else 0.0,
+            'min':   round(self.min, 6) if self.count else 0.0,
+            'p50':   round(self.percentile(0.50), 6),
+            'p95':   round(self.percentile(0.95), 6),
+            'max':   round(self.max, 6),
+        }
+
+
+class _Timer :
+    def __init__(self, metrics : 'Metrics', name : str) :
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self) :
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) :
+        self.elapsed = time.perf_counter() - self.start
+        self.metrics.observe(self.name, self.elapsed)
+        return False
+
+
+class Metrics :
+    counters : dict[str, int]
+    histograms : dict[str, Histogram]
+    trace : list[tuple] | None      # (time since reset, kind, name, value) when tracing is enabled
+
+    def __init__(self) :
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self, trace : bool = False) :
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+            self.trace = [] if trace else None
+            self.t0 = time.perf_counter()
+
+    def count(self, name : str, n : int = 1) :
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+            if self.trace is not None:
+                self.trace.append((time.perf_counter() - self.t0, 'count', name, n))
+
+    def observe(self, name : str, value : float) :
+        with self._lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = Histogram()
+            hist.add(value)
+            if self.trace is not None:
+                self.trace.append((time.perf_counter() - self.t0, 'time', name, value))
+
+    # Value of one counter, safe while other threads count
+    def counter(self, name : str) -> int:
+        with self._lock:
+            return self.counters.get(name, 0)
+
+    # Same without taking the lock, for a thread that polls it (progress line): it never waits for the threads that
+    # count, a dict lookup is atomic and the value is at most one update behind
+    def peek(self, name : str) -> int:
+        return self.counters.get(name, 0)
+
+    def snapshot(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
+
+    def timer(self, name : str) -> _Timer:
+        return _Timer(self, name)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                'elapsed': round(time.perf_counter() - self.t0, 3),
+                'counters': dict(sorted(self.counters.items())),
+                'timings': {name: h.summary() for name, h in sorted(self.histograms.items())},
+            }
+
+    def printSummary(self) :
+        s = self.summary()
+        print(f"---- STATISTICS ({s['elapsed']} s) ----")
+        for name, value in s['counters'].items():
+            print(f'{name:<28} {value:>10}')
+        if s['timings']:
+            print(f"{'timing [ms]':<28} {'count':>7} {'mean':>9} {'p50':>9} {'p95':>9} {'max':>9} {'total [s]':>10}")
+        for name, h in s['timings'].items():
+            print(f"{name:<28} {h['count']:>7} {h['mean']*1e3:>9.2f} {h['p50']*1e3:>9.2f} {h['p95']*1e3:>9.2f} {h['max']*1e3:>9.2f} {h['total']:>10.3f}")
+
+    # Save summary and trace: JSON (everything) or CSV (one line per value). In the CSV the summary comes first,
+    # at t = elapsed: kind 'counter' for the counters and 'timing.<stat>' for every statistic of a histogram
+    def save(self, filename : str) :
+        with self._lock:
+            events = list(self.trace or [])
+        data = self.summary()
+        if filename.lower().endswith('.csv'):
+            t_end = f"{data['elapsed']:.6f}"
+            with open(filename, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['t', 'kind', 'name', 'value'])
+                for name, value in data['counters'].items():
+                    writer.writerow([t_end, 'counter', name, value])
+                for name, stats in data['timings'].items():
+                    for stat, value in stats.items():
+                        writer.writerow([t_end, f'timing.{stat}', name, value])
+                for t, kind, name, value in events:
+                    writer.writerow([f'{t:.6f}', kind, name, value])
+        else:
+            data['trace'] = [{'t': round(t, 6), 'kind': kind, 'name': name, 'value': value} for t, kind, name, value in events]
+            with open(filename, 'w') as f:
+                json.dump(data, f, indent=1)
+
+
+METRICS = Metrics()
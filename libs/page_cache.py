@@ -0,0 +1,97 @@
+import os
+import zlib
+
+from libs.storage import data_path, load_json, save_json
+
+"""
+    Local copy of the pages downloaded from each sensor, used by the differential download (DUT.syncPage).
+
+    <DATA_DIR>/pages/<SN>.bin       pages appended as they are downloaded (a changed page is appended again)
+    <DATA_DIR>/pages/<SN>.json      index: page number -> [offset in the .bin, crc32]
+
+    The data file is compacted when less than half of it is still referenced by the index.
+"""
+
+PAGE_CACHE_DIR = 'pages'
+PAGE_SIZE      = 2112
+
+class PageCache :
+    sn : str
+    index : dict[int, tuple[int, int]]  # page -> (offset in the data file, crc32)
+
+    def __init__(self, sn : str) :
+        self.sn = sn
+        self._bin = data_path(PAGE_CACHE_DIR, f'{sn}.bin')
+        self._idx = os.path.join(PAGE_CACHE_DIR, f'{sn}.json')
+        raw = load_json(self._idx, {})
+        self.index = {int(page): (off, crc) for page, (off, crc) in raw.items()}
+        size = os.path.getsize(self._bin) if os.path.exists(self._bin) else 0
+        # index saved but data file lost/truncated: forget the pages that can't be read
+        self.index = {page: entry for page, entry in self.index.items() if entry[0] + PAGE_SIZE <= size}
+        self._f = open(self._bin, 'r+b' if size else 'w+b')
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, page : int) -> bool:
+        return page in self.index
+
+    def get(self, page : int) -> bytes | None:
+        entry = self.index.get(page)
+        if entry is None:
+            return None
+        self._f.seek(entry[0])
+        return self._f.read(PAGE_SIZE)
+
+    def crc(self, page : int) -> int | None:
+        entry = self.index.get(page)
+        return None if entry is None else entry[1]
+
+    # CRC32 of count consecutive pages, same as AT+EFLASHCRC=<page>;<count>. None if one of them is not cached
+    def blockCRC(self, page : int, count : int) -> int | None:
+        crc = 0
+        for p in range(page, page + count):
+            data = self.get(p)
+            if data is None:
+                return None
+            crc = zlib.crc32(data, crc)
+        return crc
+
+    def put(self, page : int, data : bytes) :
+        crc = zlib.crc32(data)
+        entry = self.index.get(page)
+        if entry is not None and entry[1] == crc:
+            return
+        self._f.seek(0, os.SEEK_END)
+        self.index[page] = (self._f.tell(), crc)
+        self._f.write(data)
+        self._dirty = True
+
+    def _compact(self) :
+        size = self._f.seek(0, os.SEEK_END)
+        if size <= 2 * len(self.index) * PAGE_SIZE:
+            return
+        tmp = self._bin + '.tmp'
+        index = {}
+        with open(tmp, 'wb') as out:
+            for page in sorted(self.index):
+                index[page] = (out.tell(), self.index[page][1])
+                out.write(self.get(page))
+        self._f.close()
+        os.replace(tmp, self._bin)
+        self._f = open(self._bin, 'r+b')
+        self.index = index
+
+    # Flush the data file and save the index
+    def save(self) :
+        if not self._dirty:
+            return
+        self._compact()
+        self._f.flush()
+        save_json(self._idx, {str(page): list(entry) for page, entry in sorted(self.index.items())})
+        self._dirty = False
+
+    def close(self) :
+        self.save()
+        self._f.close()
@@ -0,0 +1,130 @@
+import sys
+import threading
+import time
+
+from libs.metrics import METRICS
+
+"""
+    Progress of the download on a single line, rendered by its own thread at a fixed rate:
+    the download loop only stores the last page read (no lock, no I/O), so a slow console never
+    slows down the serial reads. Retries and skipped pages come from the METRICS counters, read without their
+    lock (METRICS.peek): the render thread never makes the download wait.
+
+        Reading page 1234 | 1170/~1400 pages (83%) | 11.2 pages/s | ETA 0:20 | retries 2 | skipped 0
+
+    The total is an estimate (the written pages of the previous download): once it is exceeded, or when there
+    is none, only the pages read and the rate are shown.
+    Messages printed during the download (WARN/INFO) go through message(), which clears the line first.
+    When the output is not a terminal (log file, CI) a full line is written every log_interval seconds instead.
+"""
+
+_active = None     # Progress being rendered, see message()
+
+# Print <text> on its own line, above the progress line when there is one
+def message(text : str) :
+    if _active is not None :
+        _active.message(text)
+    else :
+        print(text)
+
+
+class Progress :
+    total : int | None      # pages expected (estimate), None if unknown
+    done : int              # pages read so far
+    page : int | None       # last page read
+
+    def __init__(self, total : int | None = None, refresh : float = 0.25, log_interval : float = 5.0, stream = None, label : str = 'Reading page') :
+        self.total = total
+        self.done = 0
+        self.page = None
+        self.label = label
+        self.stream = stream if stream is not None else sys.stdout
+        self.inline = hasattr(self.stream, 'isatty') and self.stream.isatty()
+        self.refresh = refresh if self.inline else log_interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._width = 0
+        self._start = 0.0
+        self._counters = {}
+        self._io = threading.Lock()     # render thread and message() share the stream
+
+    def __enter__(self) :
+        self.start()
+        return self
+
+    def __exit__(self, *exc) :
+        self.stop()
+        return False
+
+    def start(self) :
+        global _active
+        self._start = time.monotonic()
+        self._counters = METRICS.snapshot()     # retries and skips of this download only
+        _active = self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # Called by the download loop for every page read
+    def update(self, page : int) :
+        self.page = page
+        self.done += 1
+
+    def stop(self) :
+        global _active
+        if self._thread is None :
+            return
+        if _active is self :
+            _active = None
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._write(self.render())
+        if self.inline :
+            self.stream.write('\n')
+            self.stream.flush()
+
+    def _run(self) :
+        while not self._stop.wait(self.refresh) :
+            self._write(self.render())
+
+    def _write(self, line : str) :
+        with self._io :
+            if self.inline :
+                self.stream.write('\r' + line.ljust(self._width))
+                self._width = len(line)
+            else :
+                self.stream.write(line + '\n')
+            self.stream.flush()
+
+    # Print a full line: the progress line is cleared and drawn again below it
+    def message(self, text : str) :
+        with self._io :
+            if self.inline :
+                self.stream.write('\r' + ' ' * self._width + '\r')
+                self._width = 0
+            self.stream.write(text + '\n')
+            self.stream.flush()
+        if self.inline :
+            self._write(self.render())
+
+    def _counter(self, name : str) -> int:
+        return METRICS.peek(name) - self._counters.get(name, 0)
+
+    def render(self) -> str:
+        elapsed = time.monotonic() - self._start
+        done = self.done
+        rate = done / elapsed if elapsed > 0 else 0.0
+        parts = [f'{self.label} {"-" if self.page is None else self.page}']
+        estimate = self.total if self.total and done <= self.total else None
+        if estimate :
+            parts.append(f'{done}/~{estimate} pages ({100 * done // estimate}%)')
+        else :
+            parts.append(f'{done} pages')
+        parts.append(f'{rate:.1f} pages/s')
+        if estimate and rate > 0 :
+            eta = int((estimate - done) / rate)
+            parts.append(f'ETA {eta // 60}:{eta % 60:02d}')
+        parts.append(f'retries {self._counter("page.retries")}')
+        parts.append(f'skipped {self._counter("page.skipped")}')
+        return ' | '.join(parts)
@@ -1,12 +1,13 @@
-
 import serial
 import threading
 import time
-import regex
+import re
+from contextlib import contextmanager
 from typing import List, Tuple
 import serial.tools.list_ports
+from libs.metrics import METRICS
 
-err_pattern = regex.compile(r'E(-1|[0-9]{3})')
+err_pattern = re.compile(r'E(-1|[0-9]{3})\s*$')   # whole line: a hex answer (e.g. a CRC) may start with E and digits
 BAUDRATE_SERIAL_DEF  = 115200   # Fixed baudrate constant - default
 BAUDRATE_SERIAL_FAST = 460800
 TIMEOUT_SERIAL = 3    # Fixed timeout constant
@@ -15,23 +16,38 @@ TERMINATION_SERIAL = '\r\n'
 """
     SerialController class takes control over the given COM and it's principle works around send message / wait message.
     The messages must implement the termination string to work
+
+    It is the only owner of the port, in one of two modes:
+        line   (default) the listener thread splits what arrives in messages (read_message)
+        binary a caller reads and writes raw bytes (pages, MIC dump) between enter_binary() and exit_binary(),
+               or in a 'with binary()' block: the listener doesn't touch the port meanwhile
+    Every access to ser goes through the I/O lock: the listener holds it only for a non-blocking read, a binary
+    session for its whole duration. Entering binary mode waits for the listener to be out of the port and drops the
+    partial line; leaving it drops the bytes left on the port, so no byte is read by the wrong side.
 """
 class SerialController:
     BAUDRATE = BAUDRATE_SERIAL_DEF   # Constant baudrate
     TIMEOUT  = TIMEOUT_SERIAL        # Constant timeout in seconds
     received_messages : List[str]
     
-    def __init__(self, port: str, termination_str: str = TERMINATION_SERIAL):
+    def __init__(self, port: str, termination_str: str = TERMINATION_SERIAL, serial_factory = None):
         self.port = port  # The COM port (e.g., 'COM7')
+        self.serial_factory = serial_factory if serial_factory is not None else serial.Serial  # e.g. FakeSensor.serial_factory
         self.ser = None  # The serial connection object
         self.received_messages = []  # List to store received messages
         self._listening_thread = None  # Thread for listening to the serial port
         self._listening = False  # Flag to control the listening loop
+        self._io_lock = threading.RLock()  # Held by the listener while it reads, by a binary session while it lasts
+        self._binary = 0  # Nesting level of the binary session of the thread holding _io_lock
+        self._owner = None  # Thread of the binary session
+        self._line = b''  # Bytes of a message not terminated yet
+        self._timeout = None  # Last timeout set on ser (changing it reconfigures the port)
         self.termination_str = termination_str.encode()  # Encode termination string for sending
 
     def open(self):
         """Opens the serial port and starts listening for messages."""
-        self.ser = serial.Serial(self.port, baudrate=self.BAUDRATE, timeout=self.TIMEOUT)
+        self.ser = self.serial_factory(self.port, baudrate=self.BAUDRATE, timeout=self.TIMEOUT)
+        self._timeout = self.TIMEOUT
         self._listening = True
         self._listening_thread = threading.Thread(target=self._listen)
         self._listening_thread.start()
@@ -44,11 +60,22 @@ class SerialController:
             self._listening_thread.join()
         if self.ser and self.ser.is_open:
             self.ser.close()
-    
+
     def flush(self) :
         if len(self.received_messages) > 0 :
             self.received_messages = []
 
+    @property
+    def baudrate(self) -> int :
+        return self.ser.baudrate
+
+    def set_baudrate(self, baudrate : int) :
+        """Change the baudrate of the port with nothing in flight; what was received at the old baudrate is dropped."""
+        with self._io_lock :
+            self.ser.baudrate = baudrate
+            self.ser.reset_input_buffer()
+            self._line = b''
+
     def send_message(self, message: str, response_timeout: float = 2.0) :
         """Sends a message through the serial port and waits for a response.
         
@@ -58,7 +85,8 @@ class SerialController:
             raise Exception('Serial port is not open')
         
         # Send the message
-        self.ser.write(f'{message}{self.termination_str.decode()}'.encode())
+        with self._io_lock :
+            self.ser.write(f'{message}{self.termination_str.decode()}'.encode())
 
     
     def read_message(self) -> str:
@@ -76,30 +104,98 @@ class SerialController:
             response = self.received_messages.pop(0)
         
         return response
-        
+
+    #==================================================================
+    # BINARY MODE
+
+    def enter_binary(self) :
+        """Take the port for raw reads and writes (waits for the end of a session of another thread). Can be nested."""
+        self._io_lock.acquire()
+        self._binary += 1
+        if self._binary == 1 :
+            self._owner = threading.get_ident()
+            self._line = b''
+
+    def exit_binary(self) :
+        """End the session: the bytes left on the port are dropped and the listener reads messages again."""
+        if self._binary == 0 :
+            raise RuntimeError('exit_binary() without enter_binary()')
+        self._binary -= 1
+        try :
+            if self._binary == 0 :
+                self._owner = None
+                self.ser.reset_input_buffer()
+        finally :
+            self._io_lock.release()
+
+    @contextmanager
+    def binary(self) :
+        self.enter_binary()
+        try :
+            yield self
+        finally :
+            self.exit_binary()
+
+    def _check_binary(self) :
+        if self._binary == 0 or self._owner != threading.get_ident() :
+            raise RuntimeError('Raw serial access outside a binary session')
+
+    def _set_timeout(self, timeout : float | None) :
+        if timeout != self._timeout :
+            self.ser.timeout = timeout
+            self._timeout = timeout
+
+    def write(self, data : bytes) -> int :
+        self._check_binary()
+        return self.ser.write(data)
+
+    def read(self, size : int, timeout : float | None) -> bytes :
+        """Up to size bytes, waiting at most timeout seconds."""
+        self._check_binary()
+        self._set_timeout(timeout)
+        return self.ser.read(size)
+
+    def read_until(self, expected : bytes, timeout : float | None) -> bytes :
+        self._check_binary()
+        self._set_timeout(timeout)
+        return self.ser.read_until(expected)
+
+    def reset_input(self) :
+        self._check_binary()
+        self.ser.reset_input_buffer()
+
+    #==================================================================
 
     def _listen(self):
         """Internal method to continuously listen for incoming messages."""
         while self._listening :
-            if self.ser.in_waiting > 0:
-                # Use read_until to read until the termination string is found
-                message = self.ser.read_until(self.termination_str).decode(errors='ignore').strip()
-                if message :  # Check if message is not just whitespace
-                        self.received_messages.append(message)
-            time.sleep(0.05)  # Small delay to prevent busy-waiting
+            # Only what has already arrived: the lock is never held while waiting for bytes
+            with self._io_lock :
+                waiting = self.ser.in_waiting
+                if waiting > 0 :
+                    self._line += self.ser.read(waiting)
+                    *lines, self._line = self._line.split(self.termination_str)
+                    for line in lines :
+                        message = line.decode(errors='ignore').strip()
+                        if message :  # Check if message is not just whitespace
+                            self.received_messages.append(message)
+            time.sleep(0.005)  # Small delay to prevent busy-waiting (it adds up to every AT answer)
 
 # Variables:
 # - port: str  # The COM port to use (e.g., 'COM7')
-# - ser: serial.Serial  # The serial connection object
+# - serial_factory: callable  # Builds the serial object (serial.Serial, or a simulated device)
+# - ser: serial.Serial  # The serial connection object, only used by this class
 # - received_messages: list[str]  # List to store received messages
 # - _listening_thread: threading.Thread  # Thread for listening to the serial port
 # - _listening: bool  # Flag to control the listening loop
+# - _io_lock: threading.RLock  # Owner of the port: the listener (one non-blocking read) or a binary session
 # - termination_str: bytes  # Termination string for messages encoded to bytes
 
 # Methods:
-# - __init__(port: str, termination_str: str) -> None
+# - __init__(port: str, termination_str: str, serial_factory: callable) -> None
 #   # Initializes the SerialController with a COM port and termination string.
 #   # Takes 'port' as a parameter (the COM port to use) and 'termination_str' as a parameter (the string to terminate messages).
+#   # 'serial_factory' is called as serial.Serial(port, baudrate=, timeout=): pass FakeSensor.serial_factory to run without hardware.
 #
 # - open() -> None
 #   # Opens the serial port and starts listening for messages.
@@ -114,6 +210,13 @@ class SerialController:
 #   # Takes 'message' as a parameter (the message to send) and 'response_timeout' (the time to wait for a response).
 #   # Returns the last response message as a string or None if no response is received within the timeout.
 #
+# - set_baudrate(baudrate: int) -> None / baudrate -> int
+#   # Switch the port to another baudrate between two transfers.
+#
+# - enter_binary() -> None / exit_binary() -> None / binary() -> context manager
+#   # Binary session: the caller owns the port and uses write(data), read(size, timeout), read_until(expected, timeout)
+#   # and reset_input(). These raise RuntimeError outside a session.
+#
 # - read_message() -> str
 #   # Read a message from the received messages list.
 #   # No parameters.
@@ -143,6 +246,7 @@ class ATShell :
         else :
             msg = cmd
         
+        name = 'at.' + msg[3:]
         if args != '' :
             msg += '=' + args
 
@@ -161,7 +265,8 @@ class ATShell :
             if tmp is not None :
                 # print(tmp)
                 self.test.append(tmp)
-                if regex.match(err_pattern, tmp) :
+                if err_pattern.match(tmp) :
+                    METRICS.count('at.errors')
                     raise Exception(f'wrong msg {msg} error: {tmp}')
                 elif tmp == 'O' :
                     ret.append(response)
@@ -171,10 +276,11 @@ class ATShell :
                     #response += tmp
                 tmp = None
             time.sleep(0.001)  # Small delay to prevent busy-waiting
-        if (time.monotonic() - start_time) < c_timeout :
+        elapsed = time.monotonic() - start_time
+        METRICS.observe(name, elapsed)
+        if elapsed < c_timeout :
             return ( (len(ret) > 0), ret )
         else :
+            METRICS.count('at.timeouts')
             return ( False, ret )
     
-
-
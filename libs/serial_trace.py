@@ -0,0 +1,120 @@
+import struct
+import threading
+import time
+
+import serial
+
+"""
+    Record and replay of a serial session, to reproduce download problems (timeouts, short reads) offline.
+
+    Trace format (little endian):
+        header  : b'EFTR' + version (u8) + baudrate (u32)
+        events  : kind (u8) + time since open [s] (f64) + length (u32) + data
+                  kind 'W' bytes written by the host
+                       'R' bytes returned by a read of the host
+                       'B' baudrate change (data = new baudrate as ascii)
+
+    Recording:  SerialController(port, serial_factory=recording_factory('session.eftr'))
+    Replay:     ReplayDevice('session.eftr').serial_factory (libs/sim_device.py), with the original timing or as fast as possible
+"""
+
+TRACE_MAGIC   = b'EFTR'
+TRACE_VERSION = 1
+HEADER_FMT    = '<4sBI'
+EVENT_FMT     = '<BdI'
+EVENT_SIZE    = struct.calcsize(EVENT_FMT)
+
+WRITE, READ, BAUD = ord('W'), ord('R'), ord('B')
+
+
+# Wrapper around a serial object that saves every write and read chunk in a trace file
+class RecordingSerial :
+    def __init__(self, inner, trace_file : str) :
+        self.inner = inner
+        self._lock = threading.Lock()
+        self._f = open(trace_file, 'wb')
+        self._f.write(struct.pack(HEADER_FMT, TRACE_MAGIC, TRACE_VERSION, inner.baudrate))
+        self._t0 = time.monotonic()
+
+    def _event(self, kind : int, data : bytes) :
+        if not data or self._f.closed:
+            return
+        with self._lock:
+            self._f.write(struct.pack(EVENT_FMT, kind, time.monotonic() - self._t0, len(data)))
+            self._f.write(data)
+
+    def write(self, data : bytes) -> int:
+        self._event(WRITE, bytes(data))
+        return self.inner.write(data)
+
+    def read(self, size : int = 1) -> bytes:
+        data = self.inner.read(size)
+        self._event(READ, data)
+        return data
+
+    def read_until(self, expected : bytes = b'\n', size : int | None = None) -> bytes:
+        data = self.inner.read_until(expected, size)
+        self._event(READ, data)
+        return data
+
+    @property
+    def in_waiting(self) -> int:
+        return self.inner.in_waiting
+
+    @property
+    def timeout(self) -> float | None:
+        return self.inner.timeout
+
+    @timeout.setter
+    def timeout(self, value : float | None) :
+        self.inner.timeout = value
+
+    @property
+    def baudrate(self) -> int:
+        return self.inner.baudrate
+
+    @baudrate.setter
+    def baudrate(self, value : int) :
+        self._event(BAUD, str(value).encode())
+        self.inner.baudrate = value
+
+    @property
+    def is_open(self) -> bool:
+        return self.inner.is_open
+
+    def flushInput(self) :
+        self.inner.flushInput()
+
+    def reset_input_buffer(self) :
+        self.inner.reset_input_buffer()
+
+    def flush(self) :
+        self.inner.flush()
+
+    def close(self) :
+        self.inner.close()
+        with self._lock:
+            self._f.close()
+
+
+# Factory for SerialController: records the session of the serial object built by inner_factory
+def recording_factory(trace_file : str, inner_factory = serial.Serial) :
+    def factory(port : str, baudrate : int, timeout : float | None = None) -> RecordingSerial:
+        return RecordingSerial(inner_factory(port, baudrate=baudrate, timeout=timeout), trace_file)
+    return factory
+
+
+def load_trace(trace_file : str) -> tuple[int, list[tuple[int, float, bytes]]]:
+    with open(trace_file, 'rb') as f:
+        raw = f.read()
+    magic, version, baudrate = struct.unpack_from(HEADER_FMT, raw)
+    if magic != TRACE_MAGIC or version != TRACE_VERSION:
+        raise RuntimeError(f'{trace_file} is not a serial trace')
+    events = []
+    pos = struct.calcsize(HEADER_FMT)
+    while pos + EVENT_SIZE <= len(raw):
+        kind, t, length = struct.unpack_from(EVENT_FMT, raw, pos)
+        pos += EVENT_SIZE
+        events.append((kind, t, raw[pos:pos + length]))
+        pos += length
+    return baudrate, events
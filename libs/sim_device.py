@@ -0,0 +1,473 @@
+import os
+import random
+import zlib
+import threading
+import time
+from collections import deque
+
+from module.read_page import RECORD_LENGTH_BYTE, RECORDS_PER_PAGE, SPARE_LENGTH_BYTE, TAIL_LENGTH_BYTE
+from module.page_check import PAYLOAD_LENGTH_BYTE
+from libs.serial_trace import load_trace, WRITE, READ, BAUD
+
+PAGE_LENGTH_BYTE = RECORDS_PER_PAGE * RECORD_LENGTH_BYTE + SPARE_LENGTH_BYTE  # 2112
+TOTAL_PAGES      = 32768
+BLANK_PAGE       = b'\xff' * PAGE_LENGTH_BYTE
+
+SIM_FW_VERSION = 't.4.11'
+SIM_FW_HASH    = '0' * 64
+SIM_SN         = 'SIM00001'
+SIM_BAUDRATE   = 115200
+
+MIC_DUMP_HEADER  = b'MIC-DUMP\r\n\r\n'    # 12 bytes
+MIC_DUMP_TRAILER = b'\r\nMICEND\r\nO\r\n'  # 13 bytes
+
+"""
+    Fake sensor that speaks the AT protocol used by ATShell/DUT, so the whole download pipeline can run
+    without SmartCable and sensor.
+
+    Supported commands: AT+TST, FWVER, FWHASH, SN, UID, ACTI, EFLASHRP, EFLASHCRC=<page>[;<count>] (optional), BUART
+    and the AT+TST:rd MIC dump.
+    Every command is echoed, answers are terminated by O\\r\\n, unknown or malformed commands get E###
+    (with silent_unknown, unknown commands get only the echo).
+
+    Timing model: every byte costs 10 bit times at the current baudrate, each command adds a fixed latency
+    (parse + flash read) and bytes of the answers can be dropped with a given probability.
+"""
+
+#==================================================================
+# FLASH IMAGE
+
+# Build one record (start byte + payload + tail) with the layout decoded by tilt_record
+def make_record(ts : int, ev_type : int = 0, temperature : float = 20.0, alpha : tuple = (0.0, 0.0, 0.0), peak : float = 0.0, rms : float = 0.0) -> bytes:
+    pl = bytearray(PAYLOAD_LENGTH_BYTE[ev_type])
+    pl[0:4] = ts.to_bytes(4, 'little')
+    t = int(round((temperature + 50.0) / 0.05)) & 0xFFF
+    pl[4] = t & 0xFF
+    pl[5] = (4 << 4) | (t >> 8)  # vertical axis +Z
+    for i, a in enumerate(alpha):
+        pl[6 + 4*i:10 + 4*i] = int(round(a / 1e-7)).to_bytes(4, 'little', signed=True)
+    pl[18:20] = int(round(peak / 0.125)).to_bytes(2, 'little', signed=True)
+    pl[20:22] = int(round(rms / 0.125)).to_bytes(2, 'little', signed=True)
+    if ev_type == 1:
+        pl[22] = (ev_type << 6) | (3 << 2) | 1                  # avg 1000, range 4g
+        pl[23:25] = (800).to_bytes(2, 'little')                 # threshold 100 mg
+    else:
+        pl[22] = (ev_type << 6) | (11 << 2)                     # cadence 1h
+        pl[23] = (3 << 2) | 1                                   # avg 1000, range 4g
+
+    rec = bytearray(b'\xff' * RECORD_LENGTH_BYTE)
+    rec[0] = 0x07
+    rec[1:1 + len(pl)] = pl
+    rec[-TAIL_LENGTH_BYTE] = len(pl) + 1
+    rec[-TAIL_LENGTH_BYTE + 1:-TAIL_LENGTH_BYTE + 5] = ts.to_bytes(4, 'big')
+    return bytes(rec)
+
+
+class FlashImage :
+    pages : dict[int, bytes]    # only the written pages are stored, everything else is blank
+
+    def __init__(self, pages : dict[int, bytes] | None = None) :
+        self.pages = pages if pages is not None else {}
+
+    def read(self, page : int, offset : int = 0, length : int = PAGE_LENGTH_BYTE) -> bytes:
+        return self.pages.get(page, BLANK_PAGE)[offset:offset + length]
+
+    def written_pages(self) -> int:
+        return len(self.pages)
+
+    # Synthetic image: n_pages full pages of scheduled records (with some events) starting from first_page
+    @classmethod
+    def synthetic(cls, n_pages : int, first_page : int = 64, start_ts : int = 1735689600, period : int = 3600, seed : int = 0) -> 'FlashImage':
+        rnd = random.Random(seed)
+        pages : dict[int, bytes] = {}
+        ts = start_ts
+        for p in range(first_page, first_page + n_pages):
+            recs = []
+            for _ in range(RECORDS_PER_PAGE):
+                ev_type = 0 if rnd.random() < 0.9 else rnd.randint(1, 3)
+                recs.append(make_record(ts, ev_type,
+                                        temperature = round(rnd.uniform(-10, 40), 2),
+                                        alpha = tuple(round(rnd.uniform(-5, 5), 4) for _ in range(3)),
+                                        peak = rnd.randint(0, 800) * 0.125,
+                                        rms = rnd.randint(0, 200) * 0.125))
+                ts += period
+            pages[p] = b''.join(recs) + b'\xff' * SPARE_LENGTH_BYTE
+        return cls(pages)
+
+    # Image from a recorded dump.bin (consecutive written pages starting from first_page)
+    @classmethod
+    def from_dump(cls, filename : str, first_page : int = 64) -> 'FlashImage':
+        pages : dict[int, bytes] = {}
+        with open(filename, 'rb') as f:
+            page = first_page
+            while True:
+                data = f.read(PAGE_LENGTH_BYTE)
+                if len(data) < PAGE_LENGTH_BYTE:
+                    break
+                pages[page] = data
+                page += 1
+        return cls(pages)
+
+
+#==================================================================
+# FAKE SENSOR
+
+class FakeSensor :
+    image : FlashImage
+    baudrate : int
+    latency : float
+    byte_loss : float
+    boot_time : float
+    crc_support : bool
+    crc_range_support : bool    # with crc_support: the <page>;<count> form as well
+    silent_unknown : bool   # unknown commands get only their echo instead of E001 (firmware that ignores them)
+    connected : bool        # False: sensor unplugged from the SmartCable, nothing answers
+
+    def __init__(self, image : FlashImage, baudrate : int = SIM_BAUDRATE, latency : float = 0.005, byte_loss : float = 0.0,
+                 boot_time : float = 0.0, crc_support : bool = False, seed : int = 0,
+                 fw_version : str = SIM_FW_VERSION, fw_hash : str = SIM_FW_HASH, sn : str = SIM_SN, crc_range_support : bool = True,
+                 silent_unknown : bool = False) :
+        self.image = image
+        self.default_baudrate = baudrate
+        self.baudrate = baudrate
+        self.latency = latency
+        self.byte_loss = byte_loss
+        self.boot_time = boot_time
+        self.crc_support = crc_support
+        self.crc_range_support = crc_range_support
+        self.silent_unknown = silent_unknown
+        self.fw_version = fw_version
+        self.fw_hash = fw_hash
+        self.sn = sn
+
+        self._rnd = random.Random(seed)
+        self._cond = threading.Condition()
+        self._rx = b''                      # bytes received from the host, not yet terminated by \r\n
+        self._tx = deque()                  # [start_time, byte_time, data, consumed] segments sent to the host
+        self._tx_free = 0.0                 # time when the device transmitter becomes free
+        self._ready_at = 0.0                # device ignores the input while booting
+        self._reader = None                 # thread blocked in a read, it gets the incoming bytes
+        self.commands = 0                   # number of commands served (statistics)
+        self.host_baudrate = baudrate
+        self.connected = True
+        self.mic_memory = bytes(random.Random(seed).randrange(256) for _ in range(0x10000))  # recordings, sent by AT+TST:rd
+        self.mic_dump_cut = None            # bytes of mic_memory sent before the transfer breaks off (no trailer), None: whole dump
+
+    # Emulate the reset line: the device is mute for boot_time seconds and returns to the default baudrate
+    def reset(self) :
+        with self._cond:
+            self._rx = b''
+            self._tx.clear()
+            self._tx_free = 0.0
+            self.baudrate = self.default_baudrate
+            self._ready_at = time.monotonic() + self.boot_time
+            self._cond.notify_all()
+
+    # Factory with the serial.Serial signature, to be passed to SerialController
+    def serial_factory(self, port : str, baudrate : int = SIM_BAUDRATE, timeout : float | None = None) -> 'SimSerial':
+        return SimSerial(self, port, baudrate, timeout)
+
+    #------------------------------------------------------------------
+    # host -> device
+
+    def _feed(self, data : bytes) :
+        now = time.monotonic()
+        if not self.connected or now < self._ready_at:
+            return  # unplugged or still booting: input lost
+        self._rx += data
+        if self._rx.startswith(b'AT+TST:rd'):  # the MIC dump request is sent without terminator
+            self._rx = self._rx[len(b'AT+TST:rd'):]
+            self.commands += 1
+            if self.mic_dump_cut is None:
+                self._send(b'AT+TST:rd\r\nO\r\n' + MIC_DUMP_HEADER + self.mic_memory + MIC_DUMP_TRAILER, now)
+            else:
+                self._send(b'AT+TST:rd\r\nO\r\n' + MIC_DUMP_HEADER + self.mic_memory[:self.mic_dump_cut], now)
+        while b'\r\n' in self._rx:
+            line, self._rx = self._rx.split(b'\r\n', 1)
+            line = line.strip()
+            if line:
+                self._execute(line.decode(errors='ignore'), now)
+        self._cond.notify_all()
+
+    def _execute(self, line : str, now : float) :
+        self.commands += 1
+        echo = (line + '\r\n').encode()
+        cmd, _, args = line.partition('=')
+
+        if not cmd.startswith('AT+'):
+            self._send(echo + b'E001\r\n', now)
+            return
+        cmd = cmd[3:]
+
+        try:
+            if cmd == 'TST':
+                self._send(echo + b'O\r\n', now)
+            elif cmd == 'FWVER':
+                self._answer(echo, self.fw_version, now)
+            elif cmd == 'FWHASH':
+                self._answer(echo, self.fw_hash, now)
+            elif cmd == 'SN':
+                self._answer(echo, self.sn, now)
+            elif cmd == 'UID':
+                self._answer(echo, self.sn.encode().hex().upper(), now)
+            elif cmd == 'ACTI':
+                self._answer(echo, '1', now)
+            elif cmd == 'EFLASHRP':
+                page, offset, length = (int(x, 16) for x in args.split(';'))
+                if page >= TOTAL_PAGES or offset + length > PAGE_LENGTH_BYTE:
+                    raise ValueError
+                self._send(echo + self.image.read(page, offset, length) + b'O\r\n', now)
+            elif cmd == 'EFLASHCRC' and self.crc_support and (';' not in args or self.crc_range_support):
+                page, _, count = args.partition(';')
+                page, count = int(page, 16), int(count or '1', 16)
+                crc = 0
+                for p in range(page, page + count):
+                    crc = zlib.crc32(self.image.read(p), crc)
+                self._answer(echo, f'{crc:08X}', now)
+            elif cmd == 'BUART':
+                baud = int(args)
+                end = self._send(echo + b'O\r\n', now)
+                self.baudrate = baud    # the new baudrate is used for everything sent after the O
+                self._tx_free = end
+            elif self.silent_unknown:
+                self._send(echo, now)
+            else:
+                self._send(echo + b'E001\r\n', now)
+        except ValueError:
+            self._send(echo + b'E002\r\n', now)
+
+    def _answer(self, echo : bytes, value : str, now : float) :
+        self._send(echo + value.encode() + b'\r\nO\r\n', now)
+
+    # Queue the answer on the transmitter, return the time of the last byte
+    def _send(self, data : bytes, now : float) -> float:
+        if self.byte_loss > 0:
+            data = bytes(b for b in data if self._rnd.random() >= self.byte_loss)
+        if self.host_baudrate != self.baudrate:
+            data = bytes(len(data))   # wrong baudrate on the host: garbage
+        byte_time = 10.0 / self.baudrate
+        start = max(now + self.latency, self._tx_free)
+        self._tx.append([start, byte_time, data, 0])
+        self._tx_free = start + len(data) * byte_time
+        return self._tx_free
+
+    #------------------------------------------------------------------
+    # device -> host
+
+    def _available(self, now : float) -> int:
+        n = 0
+        for start, byte_time, data, consumed in self._tx:
+            if now < start:
+                break
+            arrived = min(len(data), int((now - start) / byte_time))
+            n += arrived - consumed
+            if arrived < len(data):
+                break
+        return n
+
+    def _take(self, n : int) -> bytes:
+        out = []
+        while n > 0 and self._tx:
+            seg = self._tx[0]
+            chunk = seg[2][seg[3]:seg[3] + n]
+            seg[3] += len(chunk)
+            n -= len(chunk)
+            out.append(chunk)
+            if seg[3] >= len(seg[2]):
+                self._tx.popleft()
+        return b''.join(out)
+
+    def _peek(self, n : int) -> bytes:
+        out = []
+        for seg in self._tx:
+            chunk = seg[2][seg[3]:seg[3] + n]
+            out.append(chunk)
+            n -= len(chunk)
+            if n <= 0:
+                break
+        return b''.join(out)
+
+    # Time when <need> bytes (counted from the first one not yet read) will be available
+    def _next_arrival(self, now : float, need : int = 1) -> float | None:
+        for start, byte_time, data, consumed in self._tx:
+            if consumed + need <= len(data):
+                arrived = 0 if now < start else int((now - start) / byte_time)
+                return start + max(consumed + need, arrived + 1) * byte_time
+            need -= len(data) - consumed
+        return None
+
+    # Serve the fake sensor on a pseudo terminal (POSIX only): open the returned device with pyserial
+    def serve_pty(self) -> str:
+        import pty, select
+        master, slave = pty.openpty()
+        tty_name = os.ttyname(slave)
+        link = self.serial_factory(tty_name, self.baudrate, timeout=0)
+
+        def pump() :
+            while True:
+                r, _, _ = select.select([master], [], [], 0.001)
+                if r:
+                    try:
+                        link.write(os.read(master, 4096))
+                    except OSError:
+                        return
+                out = link.read(link.in_waiting)
+                if out:
+                    os.write(master, out)
+
+        threading.Thread(target=pump, daemon=True).start()
+        return tty_name
+
+
+# serial.Serial-like object connected to a FakeSensor (loop://-style transport)
+class SimSerial :
+    port : str
+    timeout : float | None
+    is_open : bool
+
+    def __init__(self, sensor : FakeSensor, port : str, baudrate : int, timeout : float | None) :
+        self.sensor = sensor
+        self.port = port
+        self.timeout = timeout
+        self.is_open = True
+        self.baudrate = baudrate
+
+    @property
+    def baudrate(self) -> int:
+        return self.sensor.host_baudrate
+
+    @baudrate.setter
+    def baudrate(self, value : int) :
+        self.sensor.host_baudrate = value
+
+    @property
+    def in_waiting(self) -> int:
+        with self.sensor._cond:
+            return self._available()
+
+    def write(self, data : bytes) -> int:
+        with self.sensor._cond:
+            self.sensor._feed(bytes(data))
+        return len(data)
+
+    # Like a real driver, the bytes arriving while a read is pending go to that read: other threads see nothing
+    def _available(self) -> int:
+        if self.sensor._reader not in (None, threading.get_ident()):
+            return 0
+        return self.sensor._available(time.monotonic())
+
+    def _claim(self) -> bool:
+        if self.sensor._reader is None:
+            self.sensor._reader = threading.get_ident()
+            return True
+        return False
+
+    def _release(self, claimed : bool) :
+        if claimed:
+            self.sensor._reader = None
+            self.sensor._cond.notify_all()
+
+    def _wait(self, deadline : float | None, need : int = 1) -> bool:
+        now = time.monotonic()
+        nxt = self.sensor._next_arrival(now, need)
+        if deadline is not None:
+            if now >= deadline:
+                return False
+            nxt = deadline if nxt is None else min(nxt, deadline)
+        self.sensor._cond.wait(None if nxt is None else max(0.0, nxt - now))
+        return True
+
+    def read(self, size : int = 1) -> bytes:
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self.sensor._cond:
+            claimed = self._claim()
+            try:
+                while self._available() < size:
+                    if not self._wait(deadline, size):
+                        break
+                return self.sensor._take(min(size, self._available()))
+            finally:
+                self._release(claimed)
+
+    def read_until(self, expected : bytes = b'\n', size : int | None = None) -> bytes:
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self.sensor._cond:
+            claimed = self._claim()
+            try:
+                while True:
+                    avail = self._available()
+                    idx = self.sensor._peek(avail).find(expected)
+                    if idx >= 0:
+                        return self.sensor._take(idx + len(expected))
+                    if size is not None and avail >= size:
+                        return self.sensor._take(size)
+                    if not self._wait(deadline):
+                        return self.sensor._take(avail)
+            finally:
+                self._release(claimed)
+
+    def flushInput(self) :
+        with self.sensor._cond:
+            self.sensor._take(self.sensor._available(time.monotonic()))
+
+    def reset_input_buffer(self) :
+        self.flushInput()
+
+    def flush(self) :
+        pass
+
+    def close(self) :
+        self.is_open = False
+
+
+#==================================================================
+# REPLAY OF A RECORDED SESSION (libs/serial_trace.py)
+
+"""
+    Device that plays back a recorded trace. Each host write releases the bytes that were read after the
+    matching recorded write, at the original delay from that write (realtime) or immediately (fast).
+    The host doesn't need to send exactly the same bytes: writes are matched by order, and divergences are counted.
+"""
+class ReplayDevice(FakeSensor) :
+    realtime : bool
+    divergences : int
+
+    def __init__(self, trace_file : str, realtime : bool = True) :
+        baudrate, events = load_trace(trace_file)
+        super().__init__(FlashImage(), baudrate=baudrate, latency=0.0)
+        self.realtime = realtime
+        self.divergences = 0
+        self._events = events
+        self._pos = 0
+        self._release(time.monotonic(), 0.0)  # bytes received before the first write
+
+    # Queue the read chunks up to the next recorded write
+    def _release(self, now : float, t_ref : float) :
+        while self._pos < len(self._events) and self._events[self._pos][0] != WRITE:
+            kind, t, data = self._events[self._pos]
+            self._pos += 1
+            if kind == READ:
+                start = now + (t - t_ref) if self.realtime else now
+                self._tx.append([start, 1e-9, data, 0])
+            elif kind == BAUD:
+                self.baudrate = int(data)
+
+    def _feed(self, data : bytes) :
+        now = time.monotonic()
+        if self._pos < len(self._events):
+            kind, t, expected = self._events[self._pos]
+            self._pos += 1
+            if expected != data:
+                self.divergences += 1
+            self._release(now, t)
+        self._cond.notify_all()
+
+    def _send(self, data : bytes, now : float) -> float:
+        return now
+
+    # The trace already contains what happened after the reset
+    def reset(self) :
+        pass
+
+    def finished(self) -> bool:
+        return self._pos >= len(self._events)
@@ -1,8 +1,9 @@
 
-import hid, re, inquirer, time, os, serial
+import hid, re, time, os, serial
 import serial.tools.list_ports
 from typing import List, Any
 from termcolor import colored
+from libs.storage import load_json, save_json
 
 
 try :
@@ -17,6 +18,7 @@ except ImportError as e :
 
 SMARTCABLE_VID = 0x0483
 SMARTCABLE_PID = 0x52A4
+PORT_CACHE_FILE = 'smartcable_ports.json'   # SmartCable serial number -> COM port, see libs/storage.py
 
 # definition of a smartcable 
 class SmartCableEntry :
@@ -81,6 +83,7 @@ class SmartCableManager :
         
         # If there are more than 1 smartcable, select the correct device
         if len(sm_list) > 1 :
+            import inquirer     # slow to import, needed only with more than one cable
             choicelist = [inquirer.List( 'smartcable', message='Select the program to RUN', choices=sm_names_list)]
             sm_selected = inquirer.prompt(choicelist)['smartcable']
         else :
@@ -100,39 +103,67 @@ class SmartCableManager :
     def is_SmartCable_Name(sm_name) -> bool:
         return bool(re.match(SmartCableManager.sm_name_pattern, sm_name))
 
+    # Serial number -> COM port of all the serial ports, with a single (slow) scan
+    def getCOMIndex() -> dict[str, str] :
+        return {port.serial_number : port.name for port in serial.tools.list_ports.comports() if port.serial_number}
+
+    # Serial number -> COM port of the given smartcables.
+    # The index is cached across runs and the ports are scanned again only when a smartcable never seen before
+    # is connected (hotplug). The cache keeps the entries of all the cables of the station, not only the ones asked
+    def getSmartcableCOMs( sns : list[str], refresh : bool = False ) -> dict[str, str] :
+        cache = load_json(PORT_CACHE_FILE, {})
+        known : dict[str, str] = cache.get('ports', {})
+        if not refresh and set(sns) <= set(cache.get('hid', [])) and all(sn in known for sn in sns) :
+            DEBUG('COM ports from cache')
+            return {sn : known[sn] for sn in sns}
+        index = SmartCableManager.getCOMIndex()
+        # the scan sees every cable: update the ports of the cached ones too
+        known.update({sn : port for sn, port in index.items() if sn in sns or sn in known})
+        save_json(PORT_CACHE_FILE, {'hid' : sorted(set(cache.get('hid', [])) | set(sns)), 'ports' : known})
+        return {sn : known[sn] for sn in sns if sn in index}
+
     # Get smartcable com port with the serial number
-    def getSmartcableCOM( sn : str ) -> str :
-        ports = serial.tools.list_ports.comports()
-        for port in ports:
-            if sn == port.serial_number :
-                return port.name
+    def getSmartcableCOM( sn : str, refresh : bool = False ) -> str :
+        ports = SmartCableManager.getSmartcableCOMs([sn], refresh)
+        if sn in ports :
+            return ports[sn]
         raise RuntimeError('NO SMARTCABLE COM FOUND')
 
-    def getSmartcableEntries(names : list[str] = []) -> List[SmartCableEntry]:
+    def getSmartcableEntries(names : list[str] = [], refresh : bool = False) -> List[SmartCableEntry]:
         # Get the list of all HID devices connected
         devices = hid.enumerate()
         ret : List[SmartCableEntry] = []
-        
-        # Loop through each device and extract only the smartcables
+
+        # Keep only the smartcables
+        devices = [device for device in devices if device['vendor_id'] == SMARTCABLE_VID and device['product_id'] == SMARTCABLE_PID
+                   and SmartCableManager.is_SmartCable_Name( device['product_string'] )]
+        ports = SmartCableManager.getSmartcableCOMs([device['serial_number'] for device in devices], refresh)
+
         for device in devices:
-            if device['vendor_id'] == SMARTCABLE_VID and device['product_id'] == SMARTCABLE_PID :
-                if SmartCableManager.is_SmartCable_Name( device['product_string'] ) :
-                    ret.append(SmartCableEntry(device['path'], device['serial_number'], device['product_string'], SmartCableManager.getSmartcableCOM(device['serial_number'])))
-                    names.append( device['product_string'] )
-                    # device['path'] = device['path'].decode('utf-8')
-                    DEBUG('Device found:')
-                    DEBUG(f"Manufacturer: {device['manufacturer_string']}")
-                    DEBUG(f"Product: {device['product_string']}")
-                    DEBUG(f"Serial Number: {device['serial_number']}")
-                    DEBUG(f"COM: {ret[len(ret)-1].COMpath}")
+            if device['serial_number'] not in ports :
+                raise RuntimeError('NO SMARTCABLE COM FOUND')
+            ret.append(SmartCableEntry(device['path'], device['serial_number'], device['product_string'], ports[device['serial_number']]))
+            names.append( device['product_string'] )
+            # device['path'] = device['path'].decode('utf-8')
+            DEBUG('Device found:')
+            DEBUG(f"Manufacturer: {device['manufacturer_string']}")
+            DEBUG(f"Product: {device['product_string']}")
+            DEBUG(f"Serial Number: {device['serial_number']}")
+            DEBUG(f"COM: {ret[len(ret)-1].COMpath}")
         return ret
             
     def _openHID(self) :
         self.sm.openHID()
-        self.getGPIOStatus()
-        self.getGPIOStatus()
-        self.getGPIOStatus()
+        # A single read is enough when the answer is valid, read again only if it isn't
+        for _ in range(3) :
+            if self.getGPIOStatus() :
+                break
         self.isOpen = True
+
+    # Scan the COM ports again (e.g. the cached port can't be opened anymore) and return the port of the selected smartcable
+    def refreshCOM(self) -> str :
+        self.sm.COMpath = SmartCableManager.getSmartcableCOM(self.sm.sn, refresh=True)
+        return self.sm.COMpath
     def __del__(self) :
         if(self.sm == None) :
             return
@@ -192,11 +223,22 @@ class SmartCableManager :
         self.enRESET(True)
         time.sleep(0.3)
     
-    def getGPIOStatus(self) :
+    # Short reset pulse without waiting for the boot: the caller polls the device until it's ready
+    def resetPulse(self, boot : bool = False, hold : float = 0.01) :
+        self.enBOOT(boot)
+        self.enRESET(False)
+        time.sleep(hold)
+        self.enRESET(True)
+
+    # Read the GPIO status. Return False if the answer is not a valid READ_ALL report (status not updated)
+    def getGPIOStatus(self) -> bool :
         report : bytearray = [0x00] * 0x10
         report[0] = SmartCableManager.MCP2200_COMMAND_READ_ALL
         report = self.sm.getReport(report, 0x10)
+        if len(report) < 0x10 or report[0] != SmartCableManager.MCP2200_COMMAND_READ_ALL :
+            return False
         self.gpios_status = report[10]
+        return True
 
     def printGPIO(self) :
         self.getGPIOStatus()
@@ -238,6 +280,7 @@ class SmartCableManager :
             actions.append('Exit')     # 7
 
             os.system('cls')
+            import inquirer
             choicelist = [inquirer.List( 'action', message='Select the program to RUN', choices=actions)]
             choice = inquirer.prompt(choicelist)['action']
             
@@ -0,0 +1,29 @@
+import json
+import os
+
+"""
+    Local folder where the tool keeps state between runs (caches, device profiles, ...).
+    Default: ~/.eflash_reader, can be moved with the EFLASH_READER_HOME environment variable.
+"""
+DATA_DIR = os.environ.get('EFLASH_READER_HOME', os.path.join(os.path.expanduser('~'), '.eflash_reader'))
+
+# Path inside the data folder, intermediate folders are created
+def data_path(*parts : str) -> str:
+    path = os.path.join(DATA_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+def load_json(name : str, default = None):
+    try:
+        with open(data_path(name), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+# Atomic write: a crash never leaves a truncated file
+def save_json(name : str, data) :
+    path = data_path(name)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp, path)
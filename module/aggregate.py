@@ -0,0 +1,121 @@
+from datetime import datetime, timezone
+
+from module.read_page import EVENT_TYPE
+from utils import HEADER_MAP
+
+"""
+    Windowed statistics of the decoded records, computed in the same pass as the export.
+    Scheduled records are reduced to min/max/mean per window (UTC aligned); threshold events are kept
+    at full resolution and written to the Events sheet as they arrive, so only the window statistics stay in
+    memory. The summary is a small XLSX that opens immediately even for a full memory.
+"""
+
+AGG_FIELDS = ['temperature', 'alpha1', 'alpha2', 'alpha3', 'axePeak', 'axeRms']
+WINDOWS    = {'hour': 3600, 'day': 86400}
+SCHEDULED  = EVENT_TYPE[0]
+
+LABELS = {key: label for label, key in HEADER_MAP.items()}
+
+class WindowStats :
+    count : int
+    events : int        # non scheduled records in the window
+    min : list[float]
+    max : list[float]
+    sum : list[float]
+
+    def __init__(self) :
+        self.count = 0
+        self.events = 0
+        self.min = [float('inf')] * len(AGG_FIELDS)
+        self.max = [float('-inf')] * len(AGG_FIELDS)
+        self.sum = [0.0] * len(AGG_FIELDS)
+
+    def add(self, data : dict) :
+        self.count += 1
+        for i, field in enumerate(AGG_FIELDS):
+            value = data[field]
+            if value < self.min[i] : self.min[i] = value
+            if value > self.max[i] : self.max[i] = value
+            self.sum[i] += value
+
+
+class Aggregator :
+    window : int                    # seconds
+    windows : dict[int, WindowStats]  # window start -> statistics
+    events : int                    # non scheduled records, passed to on_event at full resolution
+
+    def __init__(self, window : int, on_event = None) :
+        self.window = window
+        self.windows = {}
+        self.events = 0
+        self.on_event = on_event
+
+    def add(self, ts : int, data : dict) :
+        start = ts - ts % self.window
+        stats = self.windows.get(start)
+        if stats is None:
+            stats = self.windows[start] = WindowStats()
+        if data['evnt_type'] == SCHEDULED:
+            stats.add(data)
+        else:
+            stats.events += 1
+            self.events += 1
+            if self.on_event is not None:
+                self.on_event(data)
+
+    # One row per window, sorted by time: start, samples, events, then min/max/mean of every field
+    def rows(self) -> list[list]:
+        rows = []
+        for start in sorted(self.windows):
+            stats = self.windows[start]
+            row = [datetime.fromtimestamp(start, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S'), stats.count, stats.events]
+            for i in range(len(AGG_FIELDS)):
+                if stats.count:
+                    row += [stats.min[i], stats.max[i], round(stats.sum[i] / stats.count, 4)]
+                else:
+                    row += [None, None, None]
+            rows.append(row)
+        return rows
+
+    def header(self) -> list[str]:
+        header = ['Window start (UTC)', 'Samples', 'Events']
+        for field in AGG_FIELDS:
+            header += [f'{LABELS[field]} {stat}' for stat in ('min', 'max', 'mean')]
+        return header
+
+
+# Summary sheet (one row per window) and Events sheet (threshold events, all the columns of the export).
+# Events are written by addEvent while the records are decoded (Aggregator on_event), the windows by close
+class SummaryWorkbook :
+    filename : str
+    event_header : list[str]
+    rows : int          # events written
+
+    def __init__(self, filename : str, event_header : list[str], event_value) :
+        import xlsxwriter
+        self.filename = filename
+        self.event_header = event_header
+        self.event_value = event_value
+        self.rows = 0
+        self._workbook = xlsxwriter.Workbook(filename, {'constant_memory': True})   # every sheet is written row by row
+        self._header_format = self._workbook.add_format({"bold": True, "bg_color": "#E0AF76", "border": 1, "align": "center"})
+        self._summary = self._workbook.add_worksheet('Summary')
+        self._events = self._workbook.add_worksheet('Events')
+        for col, title in enumerate(event_header):
+            self._events.write(0, col, title, self._header_format)
+            self._events.set_column(col, col, max(len(title) + 2, 19))
+
+    def addEvent(self, data : dict) :
+        self.rows += 1
+        self._events.write_row(self.rows, 0, [self.event_value(data, title) for title in self.event_header])
+
+    # Write the windows of agg and save the file. Return the number of windows
+    def close(self, agg : Aggregator) -> int:
+        for col, title in enumerate(agg.header()):
+            self._summary.write(0, col, title, self._header_format)
+            self._summary.set_column(col, col, max(len(title) + 2, 12))
+        rows = agg.rows()
+        for r, row in enumerate(rows, start=1):
+            self._summary.write_row(r, 0, row)
+        self._workbook.close()
+        return len(rows)
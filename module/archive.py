@@ -0,0 +1,273 @@
+import argparse
+import json
+from bisect import bisect_right
+import lzma
+import os
+import struct
+import zlib
+
+from module.page_check import check_page
+
+"""
+    Archive of a flash dump (.efa): pages grouped in blocks of consecutive pages, every block compressed
+    on its own, so any page range can be read without decompressing the whole file.
+
+        header  : b'EFAR' + version (u8) + reserved (u8)
+        blocks  : compressed pages, one after the other
+        footer  : JSON {"meta": {...}, "blocks": [[first_page, pages, offset, length, codec, crc32, ts_min, ts_max], ...]}
+                  + footer length (u32) + b'EFAX'
+
+    meta holds the device information (SN, FW version/hash, download time, ...).
+    ts_min/ts_max are the record timestamps of the block (0 if it has no records), to find a time range quickly.
+    The footer is written on close: an archive can be reopened and extended, the new footer replaces the old one.
+"""
+
+ARCHIVE_EXT     = '.efa'
+ARCHIVE_MAGIC   = b'EFAR'
+ARCHIVE_VERSION = 1
+FOOTER_MAGIC    = b'EFAX'
+HEADER_FMT      = '<4sBB'
+FOOTER_FMT      = '<I4s'
+PAGE_SIZE       = 2112
+BLOCK_PAGES     = 64    # pages per compressed block, same as a flash block
+CODECS          = ('zlib', 'lzma', 'none')
+
+
+def _compress(data : bytes, codec : str) -> bytes:
+    if codec == 'zlib':
+        return zlib.compress(data, 9)
+    if codec == 'lzma':
+        return lzma.compress(data, preset=6)
+    return data
+
+def _decompress(data : bytes, codec : str) -> bytes:
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    if codec == 'lzma':
+        return lzma.decompress(data)
+    return data
+
+
+class ArchiveBlock :
+    first_page : int
+    pages : int
+    offset : int
+    length : int
+    codec : str
+    crc : int       # crc32 of the uncompressed pages
+    ts_min : int
+    ts_max : int
+
+    def __init__(self, first_page : int, pages : int, offset : int, length : int, codec : str, crc : int, ts_min : int, ts_max : int) :
+        self.first_page = first_page
+        self.pages = pages
+        self.offset = offset
+        self.length = length
+        self.codec = codec
+        self.crc = crc
+        self.ts_min = ts_min
+        self.ts_max = ts_max
+
+    def toList(self) -> list:
+        return [self.first_page, self.pages, self.offset, self.length, self.codec, self.crc, self.ts_min, self.ts_max]
+
+
+# Read header and footer. Return (meta, blocks, offset where the footer starts)
+def _read_footer(f) -> tuple[dict, list[ArchiveBlock], int]:
+    magic, version, _ = struct.unpack(HEADER_FMT, f.read(struct.calcsize(HEADER_FMT)))
+    if magic != ARCHIVE_MAGIC or version != ARCHIVE_VERSION:
+        raise RuntimeError(f'{f.name} is not a flash archive')
+    end = f.seek(-struct.calcsize(FOOTER_FMT), os.SEEK_END)
+    length, magic = struct.unpack(FOOTER_FMT, f.read(struct.calcsize(FOOTER_FMT)))
+    if magic != FOOTER_MAGIC:
+        raise RuntimeError(f'{f.name}: archive not closed (footer missing)')
+    f.seek(end - length)
+    footer = json.loads(f.read(length))
+    return footer['meta'], [ArchiveBlock(*b) for b in footer['blocks']], end - length
+
+
+class ArchiveWriter :
+    meta : dict
+    blocks : list[ArchiveBlock]
+    codec : str
+    block_pages : int
+
+    def __init__(self, filename : str, meta : dict | None = None, codec : str = 'zlib', block_pages : int = BLOCK_PAGES, append : bool = False) :
+        if codec not in CODECS:
+            raise ValueError(f'Unknown codec {codec}')
+        self.codec = codec
+        self.block_pages = block_pages
+        if append and os.path.exists(filename):
+            self._f = open(filename, 'r+b')
+            old_meta, self.blocks, end = _read_footer(self._f)
+            self.meta = {**old_meta, **(meta or {})}
+            self._f.seek(end)
+            self._f.truncate()
+        else:
+            self._f = open(filename, 'wb')
+            self._f.write(struct.pack(HEADER_FMT, ARCHIVE_MAGIC, ARCHIVE_VERSION, 0))
+            self.meta = dict(meta or {})
+            self.blocks = []
+        self._first = None
+        self._pages = []
+
+    def __enter__(self) :
+        return self
+
+    def __exit__(self, *exc) :
+        self.close()
+        return False
+
+    # Pages must be added in increasing order; a gap (skipped page) starts a new block
+    def addPage(self, page_num : int, data : bytes) :
+        if self._pages and (page_num != self._first + len(self._pages) or len(self._pages) >= self.block_pages):
+            self._flush()
+        if not self._pages:
+            self._first = page_num
+        self._pages.append(bytes(data))
+
+    def _flush(self) :
+        if not self._pages:
+            return
+        raw = b''.join(self._pages)
+        checks = [check_page(page) for page in self._pages]
+        ts = [t for c in checks for t in (c.first_ts, c.last_ts) if t is not None]
+        data = _compress(raw, self.codec)
+        offset = self._f.tell()
+        self._f.write(data)
+        self.blocks.append(ArchiveBlock(self._first, len(self._pages), offset, len(data), self.codec,
+                                        zlib.crc32(raw), min(ts, default=0), max(ts, default=0)))
+        self._pages = []
+
+    def close(self) :
+        if self._f.closed:
+            return
+        self._flush()
+        footer = json.dumps({'meta': self.meta, 'blocks': [b.toList() for b in self.blocks]}).encode()
+        self._f.write(footer)
+        self._f.write(struct.pack(FOOTER_FMT, len(footer), FOOTER_MAGIC))
+        self._f.close()
+
+
+class Archive :
+    filename : str
+    meta : dict
+    blocks : list[ArchiveBlock]
+
+    def __init__(self, filename : str) :
+        self.filename = filename
+        self._f = open(filename, 'rb')
+        self.meta, self.blocks, _ = _read_footer(self._f)
+        self._cached = (None, b'')   # last decompressed block
+        # footer index sorted on the first page of the blocks, for blockOf
+        self._order = sorted(range(len(self.blocks)), key=lambda i: self.blocks[i].first_page)
+        self._starts = [self.blocks[i].first_page for i in self._order]
+        self._max_pages = max((b.pages for b in self.blocks), default=0)
+
+    def __enter__(self) :
+        return self
+
+    def __exit__(self, *exc) :
+        self.close()
+        return False
+
+    def close(self) :
+        self._f.close()
+
+    def pageCount(self) -> int:
+        return sum(b.pages for b in self.blocks)
+
+    def pageNumbers(self) -> list[int]:
+        return [p for b in self.blocks for p in range(b.first_page, b.first_page + b.pages)]
+
+    def _blockData(self, block : ArchiveBlock) -> bytes:
+        if self._cached[0] is not block:
+            self._f.seek(block.offset)
+            raw = _decompress(self._f.read(block.length), block.codec)
+            if zlib.crc32(raw) != block.crc:
+                raise RuntimeError(f'{self.filename}: block of page {block.first_page} is corrupted')
+            self._cached = (block, raw)
+        return self._cached[1]
+
+    # (page number, page) of the pages in [first, last), only the blocks involved are decompressed
+    def readPages(self, first : int = 0, last : int | None = None):
+        for block in self.blocks:
+            end = block.first_page + block.pages
+            if end <= first or (last is not None and block.first_page >= last):
+                continue
+            raw = self._blockData(block)
+            for page in range(max(first, block.first_page), end if last is None else min(end, last)):
+                idx = page - block.first_page
+                yield page, raw[idx * PAGE_SIZE:(idx + 1) * PAGE_SIZE]
+
+    # Block of the page, found with a bisection of the footer index. A page archived twice (appended archive)
+    # is taken from the first block written, like readPages does. None if the page is not in the archive
+    def blockOf(self, page_num : int) -> ArchiveBlock | None:
+        pos = bisect_right(self._starts, page_num)
+        found = None
+        while pos > 0 and self._starts[pos - 1] + self._max_pages > page_num:
+            pos -= 1
+            i = self._order[pos]
+            if page_num < self.blocks[i].first_page + self.blocks[i].pages and (found is None or i < found):
+                found = i
+        return None if found is None else self.blocks[found]
+
+    def readPage(self, page_num : int) -> bytes | None:
+        block = self.blockOf(page_num)
+        if block is None:
+            return None
+        idx = page_num - block.first_page
+        return self._blockData(block)[idx * PAGE_SIZE:(idx + 1) * PAGE_SIZE]
+
+    # Pages of the blocks whose records may fall in [ts_from, ts_to]
+    def pagesBetween(self, ts_from : int, ts_to : int):
+        for block in self.blocks:
+            if block.ts_max >= ts_from and block.ts_min <= ts_to:
+                yield from self.readPages(block.first_page, block.first_page + block.pages)
+
+
+# Pack an existing dump.bin (consecutive pages starting from first_page) in an archive
+def archive_dump(dump_bin : str, filename : str, meta : dict | None = None, first_page : int = 64, codec : str = 'zlib') -> int:
+    pages = 0
+    with open(dump_bin, 'rb') as rawfile, ArchiveWriter(filename, meta, codec) as writer:
+        while True:
+            page = rawfile.read(PAGE_SIZE)
+            if len(page) < PAGE_SIZE:
+                break
+            writer.addPage(first_page + pages, page)
+            pages += 1
+    return pages
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Flash dump archives (.efa)')
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    pack = sub.add_parser('pack', help='pack a dump.bin')
+    pack.add_argument('dump_bin')
+    pack.add_argument('archive')
+    pack.add_argument('--first-page', type=int, default=64)
+    pack.add_argument('--codec', choices=CODECS, default='zlib')
+    pack.add_argument('--meta', nargs='*', default=[], metavar='KEY=VALUE', help='device information (sn=..., fw=...)')
+    info = sub.add_parser('info', help='print metadata and index')
+    info.add_argument('archive')
+    unpack = sub.add_parser('unpack', help='extract pages to a .bin file')
+    unpack.add_argument('archive')
+    unpack.add_argument('dump_bin')
+    unpack.add_argument('--first', type=int, default=0)
+    unpack.add_argument('--last', type=int)
+    args = parser.parse_args()
+
+    if args.cmd == 'pack':
+        meta = dict(item.split('=', 1) for item in args.meta)
+        pages = archive_dump(args.dump_bin, args.archive, meta, args.first_page, args.codec)
+        print(f'{pages} pages: {os.path.getsize(args.dump_bin)} -> {os.path.getsize(args.archive)} bytes')
+    elif args.cmd == 'info':
+        with Archive(args.archive) as archive:
+            print(json.dumps(archive.meta, indent=1))
+            print(f'{archive.pageCount()} pages in {len(archive.blocks)} blocks')
+            for b in archive.blocks:
+                print(f'  pages {b.first_page}-{b.first_page + b.pages - 1}  {b.codec} {b.length} bytes  ts {b.ts_min}-{b.ts_max}')
+    else:
+        with Archive(args.archive) as archive, open(args.dump_bin, 'wb') as rawfile:
+            for _, page in archive.readPages(args.first, args.last):
+                rawfile.write(page)
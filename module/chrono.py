@@ -0,0 +1,121 @@
+import argparse
+import csv
+import heapq
+import sys
+
+from module.page_check import check_record, is_blank_slot, tail_timestamp
+from module.read_page import RECORD_LENGTH_BYTE, RECORDS_PER_PAGE, TAIL_LENGTH_BYTE
+from module.records import open_pages, decode_record, check_columns, COLUMNS, FIRST_PAGE
+
+"""
+    Chronological order of the records of a dump. The flash is a ring over the log area: once it is full the
+    oldest block is erased and written again, so the physical order of the pages is
+        [newest records ... write position] [erased block] [oldest records ... end of the log area]
+    The dump is split in runs of pages whose timestamps never go back (the step back is the wrap point), every run
+    is already sorted and the runs are merged with a heap: only one page per run is in memory, whatever the size.
+    A record that appears twice (same timestamp and content, e.g. a block partially overwritten) is emitted once.
+"""
+
+FIRST_TAIL = RECORD_LENGTH_BYTE - TAIL_LENGTH_BYTE
+LAST_TAIL  = RECORDS_PER_PAGE * RECORD_LENGTH_BYTE - TAIL_LENGTH_BYTE
+
+class ChronoReader :
+    runs : list[range]          # pages of every run, in physical order (blank or missing pages inside are skipped)
+    bad_records : int           # records failing the tail check (their timestamp can't be trusted)
+    duplicates : int            # records dropped because already emitted
+
+    def __init__(self, source : str, first_page : int = FIRST_PAGE) :
+        self.pages = open_pages(source, first_page)
+        self.runs = []
+        self.bad_records = 0
+        self.duplicates = 0
+        self._findRuns()
+
+    def __enter__(self) :
+        return self
+
+    def __exit__(self, *exc) :
+        self.close()
+        return False
+
+    def close(self) :
+        self.pages.close()
+
+    # Only the tails of the first and last record of every page are needed
+    def _findRuns(self) :
+        prev_ts = None
+        for page_num in self.pages.pageNumbers():
+            first = self.pages.tail(page_num, FIRST_TAIL)
+            if is_blank_slot(first):
+                continue
+            ts = tail_timestamp(first)
+            if prev_ts is None or ts < prev_ts:
+                self.runs.append(range(page_num, page_num + 1))
+            else:
+                self.runs[-1] = range(self.runs[-1].start, page_num + 1)
+            last = self.pages.tail(page_num, LAST_TAIL)
+            prev_ts = ts if is_blank_slot(last) else tail_timestamp(last)
+
+    # First page of every run after the first one: where the older data starts again
+    def wrapPages(self) -> list[int]:
+        return [run[0] for run in self.runs[1:]]
+
+    def _runRecords(self, run : range) :
+        for page_num in run:
+            page = self.pages.read(page_num)
+            if not page:    # not in the archive
+                continue
+            for i in range(RECORDS_PER_PAGE):
+                rec = page[i * RECORD_LENGTH_BYTE:(i + 1) * RECORD_LENGTH_BYTE]
+                if is_blank_slot(rec):
+                    break
+                if check_record(rec) is not None:
+                    self.bad_records += 1
+                    continue
+                yield tail_timestamp(rec), page_num, i + 1, rec
+
+    # (ts, page number, record 1..8, record bytes) of the valid records, oldest first
+    def records(self) :
+        last_ts, seen = None, set()
+        for ts, page_num, index, rec in heapq.merge(*(self._runRecords(run) for run in self.runs), key=lambda r: r[0]):
+            if ts != last_ts:
+                last_ts, seen = ts, set()
+            if rec in seen:
+                self.duplicates += 1
+                continue
+            seen.add(rec)
+            yield ts, page_num, index, rec
+
+
+# Decoded records of a dump (bin, txt or efa) in chronological order, see module/records.py for columns
+def iter_chronological(source : str, columns : list[str] | None = None, first_page : int = FIRST_PAGE) :
+    check_columns(columns)
+    with ChronoReader(source, first_page) as reader:
+        for _, page_num, index, rec in reader.records():
+            yield decode_record(rec, page_num, index, columns)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Records of a dump (.bin, .txt or .efa) in chronological order')
+    parser.add_argument('dump')
+    parser.add_argument('--csv', metavar='FILE', help='write the records as CSV (- for stdout)')
+    parser.add_argument('--columns', nargs='*', choices=COLUMNS, help='fields to write')
+    parser.add_argument('--first-page', type=int, default=FIRST_PAGE)
+    args = parser.parse_args()
+
+    with ChronoReader(args.dump, args.first_page) as reader:
+        for run in reader.runs:
+            print(f'run: pages {run[0]}-{run[-1]} ({len(run)} pages)', file=sys.stderr)
+        if args.csv is None:
+            sys.exit(0)
+        out = None
+        f = sys.stdout if args.csv == '-' else open(args.csv, 'w', newline='')
+        for _, page_num, index, rec in reader.records():
+            data = decode_record(rec, page_num, index, args.columns)
+            if out is None:
+                out = csv.DictWriter(f, fieldnames=list(data), extrasaction='ignore', restval='')
+                out.writeheader()
+            out.writerow(data)
+        if f is not sys.stdout:
+            f.close()
+        print(f'{reader.bad_records} bad record(s), {reader.duplicates} duplicate(s) dropped', file=sys.stderr)
@@ -0,0 +1,98 @@
+import argparse
+import heapq
+import os
+import sys
+
+from module.archive import Archive, ARCHIVE_EXT
+from module.chrono import iter_chronological
+from module.records import check_columns, COLUMNS, FIRST_PAGE
+from module.record_sinks import open_sink
+
+"""
+    Records of many sensors installed on the same structure, merged on time into one table with the serial number
+    of the sensor in the 'sensor' column:
+
+        python -m module.fleet fleet.db station_output/*.efa 2506A0012=old/dump.bin
+
+    Every dump is read in chronological order (module/chrono.py) and the dumps are merged with a heap on
+    (ts, sensor): one page per dump in memory, so hundreds of sensors can be merged on a station PC.
+    The SQLite table has an index on (ts, sensor) for the time range queries across the fleet; the unique index
+    on (sensor, ts, page, record) makes a merge run again (or with more dumps) add only the missing records.
+
+    Serial number of a dump: SN=path on the command line, otherwise the one saved by getSN in the archive
+    (path.efa, or the archive next to a .bin/.txt), otherwise the <SN>_<date> name of station mode.
+"""
+
+FLEET_COLUMNS = ['ts', 'time', 'evnt_type', 'temperature', 'verticalAxis', 'alpha1', 'alpha2', 'alpha3', 'axePeak', 'axeRms', 'page', 'record']
+FLEET_INDEX   = ['ts', 'sensor']
+BATCH_RECORDS = 1000
+
+# Serial number of the sensor of a dump, None if unknown
+def dump_sn(filename : str) -> str | None:
+    archive = filename if filename.endswith(ARCHIVE_EXT) else os.path.splitext(filename)[0] + ARCHIVE_EXT
+    if os.path.exists(archive):
+        with Archive(archive) as a:
+            if a.meta.get('sn'):
+                return a.meta['sn']
+    parts = os.path.basename(os.path.splitext(filename)[0]).split('_')
+    if len(parts) == 3 and parts[1].isdigit() and parts[2].isdigit():     # <SN>_<date>_<time>
+        return parts[0]
+    return None
+
+# 'SN=path' or 'path' -> (SN, path)
+def parse_dump(arg : str) -> tuple[str, str]:
+    sn, sep, path = arg.partition('=')
+    if not sep:
+        sn, path = dump_sn(arg), arg
+    if not sn:
+        raise ValueError(f'{arg}: serial number unknown, use SN={arg}')
+    return sn, path
+
+def _sensor_records(sn : str, source : str, columns : list[str], first_page : int) :
+    for data in iter_chronological(source, columns, first_page):
+        data['sensor'] = sn
+        yield data
+
+# Records of every (SN, dump) as dicts with a 'sensor' column, ordered by (ts, sensor).
+# columns must contain 'ts'
+def iter_fleet(dumps : list[tuple[str, str]], columns : list[str] = FLEET_COLUMNS, first_page : int = FIRST_PAGE) :
+    check_columns(columns)
+    if 'ts' not in columns:
+        raise ValueError("The merge needs the 'ts' column")
+    yield from heapq.merge(*(_sensor_records(sn, source, columns, first_page) for sn, source in dumps),
+                           key=lambda r: (r['ts'], r['sensor']))
+
+# Merge the dumps into <output> (.db/.sqlite or .csv). Return the number of records merged (SQLite ignores the ones already there)
+def merge_fleet(output : str, dumps : list[tuple[str, str]], columns : list[str] = FLEET_COLUMNS, first_page : int = FIRST_PAGE) -> int:
+    sink = open_sink(output, ['sensor'] + columns, index=FLEET_INDEX)
+    count = 0
+    batch = []
+    try:
+        for data in iter_fleet(dumps, columns, first_page):
+            batch.append(data)
+            if len(batch) >= BATCH_RECORDS:
+                sink.add(batch)
+                count += len(batch)
+                batch = []
+        sink.add(batch)
+        count += len(batch)
+    finally:
+        sink.close()
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Merge the dumps (.bin, .txt or .efa) of many sensors on time')
+    parser.add_argument('output', help='.db/.sqlite (table records) or .csv')
+    parser.add_argument('dumps', nargs='+', metavar='[SN=]DUMP')
+    parser.add_argument('--columns', nargs='*', choices=COLUMNS, default=FLEET_COLUMNS, help="fields to write ('ts' is always written)")
+    parser.add_argument('--first-page', type=int, default=FIRST_PAGE)
+    args = parser.parse_args()
+
+    try:
+        dumps = [parse_dump(arg) for arg in args.dumps]
+    except ValueError as e:
+        sys.exit(str(e))
+    columns = args.columns if 'ts' in args.columns else ['ts'] + args.columns
+    count = merge_fleet(args.output, dumps, columns, args.first_page)
+    print(f'{count} record(s) of {len(dumps)} sensor(s) merged into {args.output}', file=sys.stderr)
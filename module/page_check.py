@@ -0,0 +1,125 @@
+import zlib
+
+from module.read_page import RECORD_LENGTH_BYTE, TAIL_LENGTH_BYTE, RECORDS_PER_PAGE, START_BYTE
+
+START_BYTE_VAL    = int(START_BYTE, 16)
+BLANK_BYTE        = 0xFF
+EVENT_TYPE_OFFSET = 23  # byte holding the event type (start byte included), see tilt_record pl[44:46]
+
+# Payload length of each EVENT_TYPE (without start byte), from the commented checks of tilt_record.
+# Not confirmed on the firmware: a mismatch only marks the record as suspect (check_payload_length)
+PAYLOAD_LENGTH_BYTE = [24, 25, 37, 27]
+
+"""
+    Integrity checks performed on every page as soon as it is received from the device.
+    A record is made by:
+        [0]        start byte (0x07)
+        [1:-9]     payload (timestamp little endian in the first 4 bytes)
+        [-9:]      tail -> [0] payload length, [1:5] timestamp big endian
+    Blank slots are filled with 0xFF.
+"""
+class PageCheck :
+    ok : bool
+    records : int
+    blank_slots : int
+    first_ts : int | None
+    last_ts : int | None
+    wrapped : bool
+    issues : list[str]
+
+    def __init__(self) :
+        self.ok = True
+        self.records = 0
+        self.blank_slots = 0
+        self.first_ts = None
+        self.last_ts = None
+        self.wrapped = False
+        self.issues = []
+
+    def fail(self, issue : str) :
+        self.ok = False
+        self.issues.append(issue)
+
+
+def is_blank_slot(rec : bytes) -> bool:
+    return rec.count(BLANK_BYTE) == len(rec)
+
+# Return the record timestamp stored in the tail
+def tail_timestamp(rec : bytes) -> int:
+    return int.from_bytes(rec[-TAIL_LENGTH_BYTE + 1:-TAIL_LENGTH_BYTE + 5], 'big')
+
+def check_record(rec : bytes) -> str | None:
+    """
+    Cross-check the tail of one record (start byte included) against its payload: start byte and the two
+    copies of the timestamp.
+
+    Return:
+        str:  description of the problem
+        None: record is consistent
+    """
+    if len(rec) != RECORD_LENGTH_BYTE:
+        return f"wrong record length {len(rec)}"
+    if rec[0] != START_BYTE_VAL:
+        return f"wrong start byte 0x{rec[0]:02x}"
+
+    ts_pl   = int.from_bytes(rec[1:5], 'little')
+    ts_tail = tail_timestamp(rec)
+    if ts_pl != ts_tail:
+        return f"tail timestamp {ts_tail} != payload timestamp {ts_pl}"
+    return None
+
+def check_payload_length(rec : bytes) -> str | None:
+    """
+    Compare the payload length in the tail with PAYLOAD_LENGTH_BYTE of the event type.
+    The table is not confirmed on the firmware: the record is kept and only reported.
+
+    Return:
+        str:  description of the mismatch
+        None: length as expected
+    """
+    len_pl  = rec[-TAIL_LENGTH_BYTE]
+    ev_type = (rec[EVENT_TYPE_OFFSET] >> 6) & 0b11
+    expected = PAYLOAD_LENGTH_BYTE[ev_type]
+    if len_pl not in (expected, expected + 1): # tail length may count also the start byte
+        return f"tail length {len_pl} doesn't match event type {ev_type} ({expected} bytes)"
+    return None
+
+def check_page(page : bytes, prev_ts : int | None = None) -> PageCheck:
+    """
+    Validate all the records of a page.
+    Timestamps must be monotonic inside the page. A step back from the previous page (prev_ts)
+    is not an error because the flash is used as a ring: it is reported with the wrapped flag.
+    Blank slots are accepted only after the last written record.
+    """
+    res = PageCheck()
+    for i in range(RECORDS_PER_PAGE):
+        rec = page[i*RECORD_LENGTH_BYTE:(i + 1)*RECORD_LENGTH_BYTE]
+
+        if is_blank_slot(rec):
+            res.blank_slots += 1
+            continue
+        if res.blank_slots > 0:
+            res.fail(f"record {i + 1}: written after a blank slot")
+            continue
+
+        issue = check_record(rec)
+        if issue is not None:
+            res.fail(f"record {i + 1}: {issue}")
+            continue
+
+        ts = tail_timestamp(rec)
+        if res.last_ts is not None and ts < res.last_ts:
+            res.fail(f"record {i + 1}: timestamp {ts} goes back in time ({res.last_ts})")
+            continue
+        if res.first_ts is None:
+            res.first_ts = ts
+        res.last_ts = ts
+        res.records += 1
+
+    if prev_ts is not None and res.first_ts is not None and res.first_ts < prev_ts:
+        res.wrapped = True
+    return res
+
+# Checksum of a page compared with the one returned by the firmware (when available)
+def page_crc(page : bytes) -> int:
+    return zlib.crc32(page) & 0xFFFFFFFF
@@ -1,6 +1,4 @@
 from datetime import datetime, timezone
-from termcolor import colored
-import json
 
 RECORD_LENGTH_BYTE = 256
 TAIL_LENGTH_BYTE   = 9
@@ -200,6 +198,7 @@ def tilt_record(pl: str):
 
 # ________________________________________
 if __name__ == "__main__":
+    from termcolor import colored
 
     # <!> cd .\module -> py .\read_page.py
     
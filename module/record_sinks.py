@@ -0,0 +1,98 @@
+import csv
+import os
+import sqlite3
+
+"""
+    Append-only outputs for decoded records (dicts from module/records.py), kept open while records arrive.
+    Both can be reopened: the CSV keeps its header, the SQLite table its schema and the unique index on
+    (sensor, ts, page, record) drops the records that are already there.
+
+        CsvSink(filename, columns)
+        SqliteSink(filename, columns, table='records', index=None)     index: columns of an extra index for the queries
+
+    add() takes a list of records, flush() makes them visible to the readers of the file.
+"""
+
+SQL_TYPES = {int: 'INTEGER', float: 'REAL', str: 'TEXT'}
+SQL_COLUMN_TYPES = {'sensor': 'TEXT', 'page': 'INTEGER', 'record': 'INTEGER', 'ts': 'INTEGER'}
+
+class CsvSink :
+    filename : str
+    columns : list[str]
+
+    def __init__(self, filename : str, columns : list[str]) :
+        self.filename = filename
+        new = not os.path.exists(filename) or os.path.getsize(filename) == 0
+        self._f = open(filename, 'a', newline='')
+        if not new:
+            with open(filename, 'r', newline='') as f:
+                columns = next(csv.reader(f))     # keep the columns of the existing file
+        self.columns = columns
+        self._out = csv.DictWriter(self._f, fieldnames=columns, extrasaction='ignore', restval='')
+        if new:
+            self._out.writeheader()
+
+    def add(self, records : list[dict]) :
+        self._out.writerows(records)
+
+    def flush(self) :
+        self._f.flush()
+
+    def close(self) :
+        self._f.close()
+
+
+class SqliteSink :
+    filename : str
+    table : str
+    columns : list[str]
+
+    def __init__(self, filename : str, columns : list[str], table : str = 'records', index : list[str] | None = None) :
+        self.filename = filename
+        self.table = table
+        self.columns = columns
+        self.index = index
+        self._db = sqlite3.connect(filename)
+        self._db.execute('PRAGMA journal_mode=WAL')     # readers see the data while records are added
+        existing = [row[1] for row in self._db.execute(f'PRAGMA table_info({table})')]
+        if existing:
+            self.columns = [c for c in existing if c in columns] or existing
+        self._created = bool(existing)
+        self._insert = None
+
+    # The types come from the first records (SQLite accepts anything anyway)
+    def _create(self, record : dict) :
+        cols = ', '.join(f'{c} {SQL_COLUMN_TYPES.get(c) or SQL_TYPES.get(type(record.get(c)), "")}'.strip() for c in self.columns)
+        self._db.execute(f'CREATE TABLE IF NOT EXISTS {self.table} ({cols})')
+        key = [c for c in ('sensor', 'ts', 'page', 'record') if c in self.columns]
+        if key:
+            self._db.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS {self.table}_key ON {self.table} ({", ".join(key)})')
+        if self.index:
+            self._db.execute(f'CREATE INDEX IF NOT EXISTS {self.table}_{"_".join(self.index)} ON {self.table} ({", ".join(self.index)})')
+        self._created = True
+
+    def add(self, records : list[dict]) :
+        if not records:
+            return
+        if not self._created:
+            self._create(records[0])
+        if self._insert is None:
+            self._insert = f'INSERT OR IGNORE INTO {self.table} ({", ".join(self.columns)}) VALUES ({", ".join("?" * len(self.columns))})'
+        self._db.executemany(self._insert, [tuple(r.get(c) for c in self.columns) for r in records])
+
+    def flush(self) :
+        self._db.commit()
+
+    def close(self) :
+        self._db.commit()
+        self._db.close()
+
+
+# Sink by file extension: .csv, .db/.sqlite/.sqlite3 (index: SQLite only)
+def open_sink(filename : str, columns : list[str], index : list[str] | None = None) :
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.csv':
+        return CsvSink(filename, columns)
+    if ext in ('.db', '.sqlite', '.sqlite3'):
+        return SqliteSink(filename, columns, index=index)
+    raise ValueError(f'{filename}: use .csv or .db/.sqlite')
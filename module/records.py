@@ -0,0 +1,297 @@
+import argparse
+import csv
+import os
+import sys
+from datetime import datetime, timezone
+
+from module.read_page import tilt_record, RECORD_LENGTH_BYTE, RECORDS_PER_PAGE, TAIL_LENGTH_BYTE, HEX_IN_PAGE, EVENT_TYPE, VERTICAL, \
+    TEMPERATURE_RESOLUTION, TEMPERATURE_OFFSET, TEMPERATURE_DECIMAL_FIGURES, ANGLE32_RESOLUTION, ANGLE32_DECIMAL_FIGURES, \
+    ACCELERATION_RESOLUTION, ACCELERATION_DECIMAL_FIGURES
+from module.page_check import check_record, is_blank_slot, tail_timestamp, EVENT_TYPE_OFFSET
+from module.archive import Archive, ARCHIVE_EXT
+
+"""
+    Streaming access to the decoded records of a sensor, without the interactive session and without XLSX:
+
+        for rec in iter_records('dump.efa', start=1735689600, event_types=['Scheduled'], columns=['time', 'temperature']) :
+            ...
+
+    source: dump.bin (written pages from first_page), dump.txt (same as hex), archive (.efa) or a connected DUT.
+    Records are yielded one at a time as dicts (iter_batches: lists of dicts), nothing else is kept in memory.
+    Records that fail the tail check are skipped: their timestamp can't be trusted for the filters (the XLSX export
+    keeps them, flagged in its Check column).
+
+    Filters are applied as early as possible:
+        start/end   unix time (UTC) or datetime, inclusive. Archive blocks outside the range are not decompressed.
+                    Records are in time order inside a page, so the tails of the first and last record decide
+                    if a page can be skipped: for a DUT or a dump.bin only those 2 x 9 bytes are read.
+        event_types names of EVENT_TYPE or their index: checked on the event type byte, before decoding.
+        columns     only these fields are decoded. 'page', 'record' and 'ts' (unix time) are always available;
+                    the common fields have their own decoder, the event specific ones need the full tilt_record.
+"""
+
+PAGE_SIZE     = 2112
+FIRST_PAGE    = 64
+LAST_PAGE     = 491 * 64    # first page after the log area
+LAST_SLOT_TAIL = (RECORDS_PER_PAGE - 1) * RECORD_LENGTH_BYTE + RECORD_LENGTH_BYTE - TAIL_LENGTH_BYTE
+
+def _int(rec : bytes, first : int, last : int) -> int:
+    return int.from_bytes(rec[first:last], 'little', signed=True)
+
+# Decoders of the fields common to every event type, on the raw record (start byte included), see tilt_record
+FIELD_DECODERS = {
+    'ts':           lambda rec: int.from_bytes(rec[1:5], 'little'),
+    'time':         lambda rec: datetime.fromtimestamp(int.from_bytes(rec[1:5], 'little'), timezone.utc).strftime('%Y-%m-%dT%H:%M:%S'),
+    'evnt_type':    lambda rec: EVENT_TYPE[rec[EVENT_TYPE_OFFSET] >> 6],
+    'temperature':  lambda rec: round(float(rec[5] | (rec[6] & 0x0F) << 8) * TEMPERATURE_RESOLUTION - TEMPERATURE_OFFSET, TEMPERATURE_DECIMAL_FIGURES),
+    'verticalAxis': lambda rec: VERTICAL[(rec[6] >> 4) & 0b0111],
+    'alpha1':       lambda rec: round(float(_int(rec, 7, 11)) * ANGLE32_RESOLUTION, ANGLE32_DECIMAL_FIGURES),
+    'alpha2':       lambda rec: round(float(_int(rec, 11, 15)) * ANGLE32_RESOLUTION, ANGLE32_DECIMAL_FIGURES),
+    'alpha3':       lambda rec: round(float(_int(rec, 15, 19)) * ANGLE32_RESOLUTION, ANGLE32_DECIMAL_FIGURES),
+    'axePeak':      lambda rec: round(float(_int(rec, 19, 21)) * ACCELERATION_RESOLUTION, ACCELERATION_DECIMAL_FIGURES),
+    'axeRms':       lambda rec: round(float(_int(rec, 21, 23)) * ACCELERATION_RESOLUTION, ACCELERATION_DECIMAL_FIGURES),
+}
+
+# Fields only some event types have (None for the others)
+EVENT_FIELDS = ['stdCad', 'fstCad', 'avgSamp', 'range', 'axeTh', 'trigAngle', 'alpha1En', 'alpha2En', 'alpha3En',
+                'alpha1LowTh', 'alpha1HighTh', 'alpha2LowTh', 'alpha2HighTh', 'alpha3LowTh', 'alpha3HighTh', 'angVelTh']
+
+COLUMNS = ['page', 'record'] + list(FIELD_DECODERS) + EVENT_FIELDS
+
+
+#==================================================================
+# PAGE SOURCES
+# pageNumbers(): pages to look at, tail(page, offset): the 9 bytes of a record tail, read(page): the whole page.
+# A source stops at the first blank page when blank_stops is True (live device: nothing is written after it).
+
+class _BinPages :
+    blank_stops = False
+
+    def __init__(self, filename : str, first_page : int) :
+        self._f = open(filename, 'rb')
+        self.first_page = first_page
+        self.pages = os.path.getsize(filename) // PAGE_SIZE
+
+    def pageNumbers(self) :
+        return range(self.first_page, self.first_page + self.pages)
+
+    def tail(self, page : int, offset : int) -> bytes:
+        self._f.seek((page - self.first_page) * PAGE_SIZE + offset)
+        return self._f.read(TAIL_LENGTH_BYTE)
+
+    def read(self, page : int) -> bytes:
+        self._f.seek((page - self.first_page) * PAGE_SIZE)
+        return self._f.read(PAGE_SIZE)
+
+    def close(self) :
+        self._f.close()
+
+
+# Binary mode: text files can only seek to positions returned by tell()
+class _HexPages(_BinPages) :
+    def __init__(self, filename : str, first_page : int) :
+        self._f = open(filename, 'rb')
+        self.first_page = first_page
+        self.pages = os.path.getsize(filename) // HEX_IN_PAGE
+
+    def tail(self, page : int, offset : int) -> bytes:
+        self._f.seek((page - self.first_page) * HEX_IN_PAGE + 2 * offset)
+        return bytes.fromhex(self._f.read(2 * TAIL_LENGTH_BYTE).decode())
+
+    def read(self, page : int) -> bytes:
+        self._f.seek((page - self.first_page) * HEX_IN_PAGE)
+        return bytes.fromhex(self._f.read(HEX_IN_PAGE).decode())
+
+
+class _ArchivePages :
+    blank_stops = False
+
+    def __init__(self, filename : str, start : int | None, end : int | None) :
+        self.archive = Archive(filename)
+        self.start = start
+        self.end = end
+        self._page = (None, b'')
+
+    # Only the blocks whose time range overlaps [start, end]: the others are never decompressed
+    def pageNumbers(self) :
+        for block in self.archive.blocks:
+            if block.ts_max and self.start is not None and block.ts_max < self.start:
+                continue
+            if block.ts_min and self.end is not None and block.ts_min > self.end:
+                continue
+            yield from range(block.first_page, block.first_page + block.pages)
+
+    def read(self, page : int) -> bytes:
+        if self._page[0] != page:
+            self._page = (page, self.archive.readPage(page))
+        return self._page[1]
+
+    def tail(self, page : int, offset : int) -> bytes:
+        return self.read(page)[offset:offset + TAIL_LENGTH_BYTE]
+
+    def close(self) :
+        self.archive.close()
+
+
+class _DevicePages :
+    blank_stops = True
+
+    def __init__(self, dut, first_page : int, last_page : int) :
+        self.dut = dut
+        self.first_page = first_page
+        self.last_page = last_page
+
+    def pageNumbers(self) :
+        return range(self.first_page, self.last_page)
+
+    # Same retries as DUT.dumpPage
+    def _retry(self, page : int, read, attempts : int = 3) -> bytes:
+        for _ in range(attempts):
+            data, _, _ = read()
+            if data is not None:
+                return data
+        raise RuntimeError(f'page {page}: no answer from the device')
+
+    def tail(self, page : int, offset : int) -> bytes:
+        return self._retry(page, lambda: self.dut.readEflash(hex(page)[2:], offset, TAIL_LENGTH_BYTE))
+
+    def read(self, page : int) -> bytes:
+        return self._retry(page, lambda: self.dut.readPageData(hex(page)[2:], self.dut.page_timeout))
+
+    def close(self) :
+        pass
+
+
+# Page source of a dump path or a DUT (see PAGE SOURCES)
+def open_pages(source, first_page : int = FIRST_PAGE, last_page : int = LAST_PAGE, start : int | None = None, end : int | None = None) :
+    if not isinstance(source, str):
+        return _DevicePages(source, first_page, last_page)     # DUT connected and in AT mode
+    if source.endswith(ARCHIVE_EXT):
+        return _ArchivePages(source, start, end)
+    if source.endswith('.txt'):
+        return _HexPages(source, first_page)
+    return _BinPages(source, first_page)
+
+def _unix(t) -> int | None:
+    if t is None or isinstance(t, int):
+        return t
+    if isinstance(t, datetime):
+        return int((t if t.tzinfo else t.replace(tzinfo=timezone.utc)).timestamp())
+    return int(t)
+
+
+#==================================================================
+# RECORDS
+
+def check_columns(columns : list[str] | None) :
+    if columns is not None:
+        unknown = [c for c in columns if c not in COLUMNS]
+        if unknown:
+            raise ValueError(f'Unknown columns {unknown}, available: {COLUMNS}')
+
+# Decode one record (start byte included, already checked with check_record): page, record (1..8), ts and
+# the requested columns. columns=None: page, record, ts and everything tilt_record decodes
+def decode_record(rec : bytes, page_num : int, record : int, columns : list[str] | None = None) -> dict:
+    ts = tail_timestamp(rec)
+    if columns is None:
+        data = {'page': page_num, 'record': record, 'ts': ts}
+        data.update(tilt_record(rec[1:].hex()))
+        return data
+    full = tilt_record(rec[1:].hex()) if any(c in EVENT_FIELDS for c in columns) else None
+    data = {}
+    for col in columns:
+        if col == 'page':
+            data[col] = page_num
+        elif col == 'record':
+            data[col] = record
+        elif col == 'ts' or full is None:
+            data[col] = ts if col == 'ts' else FIELD_DECODERS[col](rec)
+        else:
+            data[col] = full.get(col)
+    return data
+
+def iter_records(source, start = None, end = None, event_types : list | None = None, columns : list[str] | None = None,
+                 first_page : int = FIRST_PAGE, last_page : int = LAST_PAGE) :
+    """
+    Yield the decoded records of <source> that match the filters, as dicts.
+
+    source:      path of a dump.bin / dump.txt / .efa archive, or a DUT in AT mode
+    start, end:  time range (unix time UTC or datetime), inclusive
+    event_types: event types to keep (names of EVENT_TYPE or indexes), None for all
+    columns:     fields to decode (see COLUMNS), None for page, record, ts and everything tilt_record decodes
+    first_page:  page number of the first page of a dump.bin/.txt, first page to read from a DUT
+    last_page:   DUT only: first page not to read (the iteration also stops at the first blank page)
+    """
+    start, end = _unix(start), _unix(end)
+    types = None
+    if event_types is not None:
+        types = {t if isinstance(t, int) else EVENT_TYPE.index(t) for t in event_types}
+    check_columns(columns)
+
+    pages = open_pages(source, first_page, last_page, start, end)
+    try:
+        for page_num in pages.pageNumbers():
+            if start is not None or end is not None:
+                first_tail = pages.tail(page_num, RECORD_LENGTH_BYTE - TAIL_LENGTH_BYTE)
+                if is_blank_slot(first_tail):
+                    if pages.blank_stops:
+                        return
+                    continue
+                if end is not None and tail_timestamp(first_tail) > end:
+                    continue
+                if start is not None:
+                    last_tail = pages.tail(page_num, LAST_SLOT_TAIL)
+                    if not is_blank_slot(last_tail) and tail_timestamp(last_tail) < start:
+                        continue
+
+            page = pages.read(page_num)
+            if pages.blank_stops and is_blank_slot(page[:RECORD_LENGTH_BYTE]):
+                return
+            for i in range(RECORDS_PER_PAGE):
+                rec = page[i * RECORD_LENGTH_BYTE:(i + 1) * RECORD_LENGTH_BYTE]
+                if is_blank_slot(rec):
+                    break   # records are written in order: the rest of the page is blank
+                if types is not None and rec[EVENT_TYPE_OFFSET] >> 6 not in types:
+                    continue
+                if check_record(rec) is not None:
+                    continue
+                ts = tail_timestamp(rec)
+                if (start is not None and ts < start) or (end is not None and ts > end):
+                    continue
+                yield decode_record(rec, page_num, i + 1, columns)
+    finally:
+        pages.close()
+
+# Same as iter_records, in lists of up to batch_size records
+def iter_batches(source, batch_size : int = 1000, **filters) :
+    batch = []
+    for data in iter_records(source, **filters):
+        batch.append(data)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Print the records of a dump (.bin, .txt or .efa) as CSV')
+    parser.add_argument('dump')
+    parser.add_argument('--start', help='ISO time (UTC) or unix time')
+    parser.add_argument('--end', help='ISO time (UTC) or unix time')
+    parser.add_argument('--events', nargs='*', choices=EVENT_TYPE, help='event types to keep')
+    parser.add_argument('--columns', nargs='*', choices=COLUMNS, help='fields to print')
+    parser.add_argument('--first-page', type=int, default=FIRST_PAGE)
+    args = parser.parse_args()
+
+    def parse_time(value : str | None):
+        if value is None or value.isdigit():
+            return None if value is None else int(value)
+        return datetime.fromisoformat(value)
+
+    out = None
+    for data in iter_records(args.dump, parse_time(args.start), parse_time(args.end), args.events, args.columns, args.first_page):
+        if out is None:
+            out = csv.DictWriter(sys.stdout, fieldnames=list(data), extrasaction='ignore', restval='')
+            out.writeheader()
+        out.writerow(data)
@@ -0,0 +1,58 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# State of the tool (flash maps, page caches, link profiles) out of the home folder: set before libs.storage is imported
+os.environ['EFLASH_READER_HOME'] = tempfile.mkdtemp(prefix='eflash_reader_tests_')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eflash_reader import Eflash_reader_App
+from libs.metrics import METRICS
+from libs.sim_device import FakeSensor, FlashImage
+
+SIM_LATENCY = 0.0005
+
+
+@pytest.fixture(autouse=True)
+def metrics():
+    METRICS.reset()
+    yield METRICS
+
+
+# Application connected to a fake sensor, already in AT mode. Usage: app = connect(sensor)
+@pytest.fixture
+def connect():
+    apps = []
+
+    def _connect(sensor, **kw) -> Eflash_reader_App:
+        app = Eflash_reader_App(sensor, **kw)
+        app.dutDev = app.openDUT()
+        app.dutDev.ATmode()
+        apps.append(app)
+        return app
+
+    yield _connect
+    for app in apps:
+        app.dutDev.serialP.close()
+
+
+def fake_sensor(image : FlashImage, **kw) -> FakeSensor:
+    kw.setdefault('latency', SIM_LATENCY)
+    return FakeSensor(image, **kw)
+
+
+# Pages of a synthetic image as written in a dump.bin
+def image_bytes(image : FlashImage, pages) -> bytes:
+    return b''.join(image.read(p) for p in pages)
+
+
+# dump.bin/dump.txt of a synthetic image, pages from 64. Return the file name without extension
+def write_dump(folder, image : FlashImage, name : str = 'dump') -> str:
+    filename = os.path.join(str(folder), name)
+    with open(filename + '.bin', 'wb') as rawfile, open(filename + '.txt', 'w') as hexfile:
+        for page in range(64, max(image.pages) + 1):
+            rawfile.write(image.read(page))
+            hexfile.write(image.read(page).hex())
+    return filename
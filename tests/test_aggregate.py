@@ -0,0 +1,63 @@
+import zipfile
+
+from conftest import write_dump
+from eflash_reader import Eflash_reader_App, XLSX_HEADER
+from libs.sim_device import FlashImage
+from module.aggregate import Aggregator, SummaryWorkbook, SCHEDULED
+from module.read_page import EVENT_TYPE
+from utils import search_in
+
+T0 = 1735689600
+
+
+def _data(temperature : float, evnt_type : str = SCHEDULED) -> dict:
+    return {'evnt_type': evnt_type, 'temperature': temperature, 'alpha1': 1.0, 'alpha2': 2.0, 'alpha3': 3.0,
+            'axePeak': 0.5, 'axeRms': 0.25}
+
+
+def test_window_statistics():
+    agg = Aggregator(3600)
+    agg.add(T0, _data(10.0))
+    agg.add(T0 + 1800, _data(20.0))
+    agg.add(T0 + 3600, _data(30.0))
+
+    rows = agg.rows()
+    assert [r[:3] for r in rows] == [['2025-01-01T00:00:00', 2, 0], ['2025-01-01T01:00:00', 1, 0]]
+    assert rows[0][3:6] == [10.0, 20.0, 15.0]     # temperature min, max, mean
+    assert len(agg.header()) == len(rows[0])
+
+
+# Events are passed on as they arrive, only their number is kept
+def test_events_streamed():
+    seen = []
+    agg = Aggregator(3600, seen.append)
+    agg.add(T0, _data(10.0))
+    agg.add(T0 + 60, _data(11.0, EVENT_TYPE[1]))
+
+    assert agg.events == 1
+    assert [d['evnt_type'] for d in seen] == [EVENT_TYPE[1]]
+    assert agg.rows()[0][1:3] == [1, 1]
+
+
+def test_summary_workbook(tmp_path):
+    filename = str(tmp_path / 'summary.xlsx')
+    summary = SummaryWorkbook(filename, XLSX_HEADER, search_in)
+    agg = Aggregator(3600, summary.addEvent)
+    for i in range(5):
+        agg.add(T0 + i * 900, _data(10.0 + i, SCHEDULED if i % 2 else EVENT_TYPE[1]))
+
+    assert summary.close(agg) == 2
+    with zipfile.ZipFile(filename) as z:
+        sheets = [z.read(f'xl/worksheets/sheet{i}.xml') for i in (1, 2)]
+    assert sheets[0].count(b'<row ') == 1 + 2     # header + windows
+    assert sheets[1].count(b'<row ') == 1 + 3     # header + events
+
+
+def test_export_with_summary(tmp_path):
+    filename = write_dump(tmp_path, FlashImage.synthetic(4, start_ts=T0))
+
+    rows, _ = Eflash_reader_App().exportXLSX(4, filename + '.txt', filename + '.xlsx', aggregate=86400, raw=False)
+
+    assert rows == 32
+    with zipfile.ZipFile(filename + '_summary.xlsx') as z:
+        assert z.read('xl/worksheets/sheet1.xml').count(b'<row ') == 1 + 2     # 32 hourly records: 2 days
@@ -0,0 +1,113 @@
+import os
+
+import pytest
+
+from conftest import fake_sensor, image_bytes, write_dump
+from libs.sim_device import FlashImage
+from module.archive import Archive, ArchiveWriter, archive_dump, ARCHIVE_EXT, CODECS
+
+
+@pytest.mark.parametrize('codec', CODECS)
+def test_pack_and_read(tmp_path, codec):
+    image = FlashImage.synthetic(70)
+    dump = write_dump(tmp_path, image)
+    filename = str(tmp_path / 'dump.efa')
+
+    assert archive_dump(dump + '.bin', filename, {'sn': 'ABC123'}, codec=codec) == 70
+
+    with Archive(filename) as archive:
+        assert archive.meta == {'sn': 'ABC123'}
+        assert archive.pageCount() == 70
+        assert [b.pages for b in archive.blocks] == [64, 6]
+        assert archive.pageNumbers() == list(range(64, 134))
+        assert archive.readPage(100) == image.read(100)
+        assert archive.readPage(500) is None
+        assert b''.join(p for _, p in archive.readPages(120, 125)) == image_bytes(image, range(120, 125))
+
+
+# A skipped page starts a new block: page numbers are kept
+def test_gap_starts_a_block(tmp_path):
+    image = FlashImage.synthetic(6)
+    filename = str(tmp_path / 'gap.efa')
+    with ArchiveWriter(filename) as writer:
+        for page in (64, 65, 67, 68):
+            writer.addPage(page, image.read(page))
+
+    with Archive(filename) as archive:
+        assert [(b.first_page, b.pages) for b in archive.blocks] == [(64, 2), (67, 2)]
+        assert archive.readPage(66) is None
+        assert archive.readPage(67) == image.read(67)
+
+
+
+# Blocks out of page order and a page archived twice (appended archive): the first block written wins
+def test_page_lookup(tmp_path):
+    image = FlashImage.synthetic(8)
+    newer = FlashImage.synthetic(1, start_ts=1800000000)
+    filename = str(tmp_path / 'lookup.efa')
+    with ArchiveWriter(filename, block_pages=3) as writer:
+        for page in (68, 69, 70, 71, 64, 65, 66):
+            writer.addPage(page, image.read(page))
+    with ArchiveWriter(filename, append=True) as writer:
+        writer.addPage(64, newer.read(64))
+
+    with Archive(filename) as archive:
+        assert [(b.first_page, b.pages) for b in archive.blocks] == [(68, 3), (71, 1), (64, 3), (64, 1)]
+        assert [archive.readPage(p) for p in range(64, 72)] == [image.read(p) if p != 67 else None for p in range(64, 72)]
+        assert archive.blockOf(64) is archive.blocks[2]
+        assert archive.blockOf(63) is None and archive.blockOf(72) is None
+
+def test_time_index_and_append(tmp_path):
+    period = 3600
+    image = FlashImage.synthetic(4, period=period)
+    filename = str(tmp_path / 'dump.efa')
+    with ArchiveWriter(filename, block_pages=2) as writer:
+        for page in (64, 65):
+            writer.addPage(page, image.read(page))
+    with ArchiveWriter(filename, append=True) as writer:
+        for page in (66, 67):
+            writer.addPage(page, image.read(page))
+
+    with Archive(filename) as archive:
+        assert archive.pageNumbers() == [64, 65, 66, 67]
+        last_block = archive.blocks[-1]
+        assert [p for p, _ in archive.pagesBetween(last_block.ts_min, last_block.ts_max)] == [66, 67]
+
+
+def test_corrupted_block(tmp_path):
+    image = FlashImage.synthetic(2)
+    filename = str(tmp_path / 'dump.efa')
+    with ArchiveWriter(filename, codec='none') as writer:
+        writer.addPage(64, image.read(64))
+        writer.addPage(65, image.read(65))
+    with open(filename, 'r+b') as f:
+        f.seek(100)
+        f.write(b'\x00')
+
+    with Archive(filename) as archive, pytest.raises(RuntimeError):
+        archive.readPage(64)
+
+
+# The archive is the output of a download: the export reads it, no .bin/.txt unless requested
+def test_download_to_archive(tmp_path, connect):
+    image = FlashImage.synthetic(5)
+    app = connect(fake_sensor(image))
+
+    sn, pages, rows = app.downloadSensor(str(tmp_path))
+
+    assert (pages, rows) == (5, 40)
+    names = os.listdir(tmp_path)
+    assert sorted(os.path.splitext(n)[1] for n in names) == [ARCHIVE_EXT, '.xlsx']
+    with Archive(str(tmp_path / [n for n in names if n.endswith(ARCHIVE_EXT)][0])) as archive:
+        assert archive.meta['sn'] == sn
+        assert archive.meta['corrupt_pages'] == [] and archive.meta['suspect_pages'] == []
+        assert b''.join(p for _, p in archive.readPages()) == image_bytes(image, range(64, 69))
+
+
+def test_download_raw_dump_on_request(tmp_path, connect):
+    app = connect(fake_sensor(FlashImage.synthetic(2)))
+    app.raw_dump = True
+
+    app.downloadSensor(str(tmp_path))
+
+    assert sorted(os.path.splitext(n)[1] for n in os.listdir(tmp_path)) == ['.bin', ARCHIVE_EXT, '.txt', '.xlsx']
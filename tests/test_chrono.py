@@ -0,0 +1,62 @@
+from conftest import write_dump
+from libs.sim_device import FlashImage
+from module.archive import ArchiveWriter
+from module.chrono import ChronoReader, iter_chronological
+
+T0 = 1735689600
+PERIOD = 3600
+
+
+# Ring restarted: newest records on pages 64-66, a blank page, then the oldest ones on pages 68-71
+def _wrapped_image() -> FlashImage:
+    newest = FlashImage.synthetic(3, first_page=64, start_ts=T0 + 100 * PERIOD, period=PERIOD)
+    oldest = FlashImage.synthetic(4, first_page=68, start_ts=T0, period=PERIOD)
+    return FlashImage({**newest.pages, **oldest.pages})
+
+
+def test_runs_and_wrap_point(tmp_path):
+    filename = write_dump(tmp_path, _wrapped_image())
+    with ChronoReader(filename + '.bin') as reader:
+        assert reader.runs == [range(64, 67), range(68, 72)]
+        assert reader.wrapPages() == [68]
+
+
+def test_records_in_time_order(tmp_path):
+    filename = write_dump(tmp_path, _wrapped_image())
+    for ext in ('.bin', '.txt'):
+        ts = [r['ts'] for r in iter_chronological(filename + ext, ['ts'])]
+        assert ts == list(range(T0, T0 + 32 * PERIOD, PERIOD)) + list(range(T0 + 100 * PERIOD, T0 + 124 * PERIOD, PERIOD))
+
+
+def test_not_wrapped(tmp_path):
+    filename = write_dump(tmp_path, FlashImage.synthetic(3, start_ts=T0))
+    with ChronoReader(filename + '.bin') as reader:
+        assert reader.wrapPages() == []
+        assert [p for _, p, _, _ in reader.records()][::8] == [64, 65, 66]
+
+
+# The same page twice (block partially overwritten): its records are emitted once
+def test_duplicates_dropped(tmp_path):
+    image = FlashImage.synthetic(2, start_ts=T0)
+    filename = str(tmp_path / 'dup.efa')
+    with ArchiveWriter(filename) as writer:
+        writer.addPage(64, image.read(64))
+        writer.addPage(65, image.read(65))
+        writer.addPage(70, image.read(64))
+
+    with ChronoReader(filename) as reader:
+        records = list(reader.records())
+        assert len(records) == 16
+        assert reader.duplicates == 8
+
+
+def test_bad_records_counted(tmp_path):
+    image = FlashImage.synthetic(1, start_ts=T0)
+    page = bytearray(image.pages[64])
+    page[1] ^= 0x01
+    image.pages[64] = bytes(page)
+    filename = write_dump(tmp_path, image)
+
+    with ChronoReader(filename + '.bin') as reader:
+        assert len(list(reader.records())) == 7
+        assert reader.bad_records == 1
@@ -0,0 +1,150 @@
+from conftest import fake_sensor, image_bytes
+from eflash_reader import Eflash_reader_App, PAGE_PER_BLOCK
+from libs.dut import CRC_MAX_SILENT
+from libs.metrics import METRICS
+from libs.sim_device import FlashImage, ReplayDevice, BLANK_PAGE
+
+"""
+    Whole download against the simulated sensor: FakeSensor.serial_factory -> SerialController -> DUT -> App.
+"""
+
+
+def _read(filename : str) -> bytes:
+    with open(filename, 'rb') as f:
+        return f.read()
+
+
+def test_download_stops_at_blank_page(tmp_path, connect):
+    image = FlashImage.synthetic(6)
+    app = connect(fake_sensor(image))
+    filename = str(tmp_path / 'dump')
+
+    first_page, page_num = app.downloadPages(filename)
+
+    assert (first_page, page_num) == (64, 70)
+    assert _read(filename + '.bin') == image_bytes(image, range(64, 70))
+    with open(filename + '.txt') as f:
+        assert f.read() == image_bytes(image, range(64, 70)).hex()
+    assert app.skip_counter == 0
+    assert app.dutDev.corrupt_pages == [] and app.dutDev.suspect_pages == []
+
+
+def test_download_first_data_block(tmp_path, connect):
+    image = FlashImage.synthetic(3, first_page=3 * PAGE_PER_BLOCK)
+    app = connect(fake_sensor(image))
+
+    first_page, page_num = app.downloadPages(str(tmp_path / 'dump'))
+
+    assert (first_page, page_num) == (3 * PAGE_PER_BLOCK, 3 * PAGE_PER_BLOCK + 3)
+
+
+# Newest records in block 1, blank block 2, oldest records from block 3
+def test_download_wrapped_memory(tmp_path, connect):
+    newest = FlashImage.synthetic(5, first_page=64, start_ts=1800000000)
+    oldest = FlashImage.synthetic(4, first_page=3 * PAGE_PER_BLOCK, start_ts=1700000000)
+    image = FlashImage({**newest.pages, **oldest.pages})
+    app = connect(fake_sensor(image))
+    filename = str(tmp_path / 'dump')
+
+    first_page, page_num = app.downloadPages(filename)
+
+    assert (first_page, page_num) == (64, 3 * PAGE_PER_BLOCK + 4)
+    # positional dump: the blank pages in between are kept
+    assert _read(filename + '.bin') == image_bytes(image, range(64, page_num))
+
+    rows, flagged = Eflash_reader_App().exportXLSX(page_num - first_page, filename + '.txt', str(tmp_path / 'out.xlsx'),
+                                                   raw=False, chronological=True)
+    assert (rows, flagged) == (9 * 8, 0)
+
+
+
+# Firmware that ignores AT+EFLASHCRC instead of answering E###: stop-and-wait asks it only until CRC_MAX_SILENT timeouts
+def test_download_firmware_silent_on_crc(tmp_path, connect):
+    image = FlashImage.synthetic(6)
+    app = connect(fake_sensor(image, crc_support=False, silent_unknown=True))
+    app.pipeline_depth = 1
+    filename = str(tmp_path / 'dump')
+
+    first_page, page_num = app.downloadPages(filename)
+
+    assert (first_page, page_num) == (64, 70)
+    assert _read(filename + '.bin') == image_bytes(image, range(64, 70))
+    assert app.dutDev.crc_supported is False
+    assert METRICS.counter('crc.timeouts') == CRC_MAX_SILENT
+
+
+# The blank pages between the newest and the oldest records are not counted as read
+def test_wrapped_pages_read(tmp_path, connect):
+    newest = FlashImage.synthetic(5, first_page=64, start_ts=1800000000)
+    oldest = FlashImage.synthetic(4, first_page=3 * PAGE_PER_BLOCK, start_ts=1700000000)
+    app = connect(fake_sensor(FlashImage({**newest.pages, **oldest.pages})))
+
+    _, tot_page, rows = app.downloadSensor(str(tmp_path))
+
+    assert app.gap_pages == 3 * PAGE_PER_BLOCK - 69
+    assert (tot_page, rows) == (9, 9 * 8)
+
+def test_download_retries_lost_bytes(tmp_path, connect):
+    image = FlashImage.synthetic(12)
+    app = connect(fake_sensor(image, byte_loss=0.0002, seed=3))
+    filename = str(tmp_path / 'dump')
+
+    first_page, page_num = app.downloadPages(filename)
+
+    assert METRICS.counter('page.retries') > 0
+    # a page is saved only when it has been received intact
+    data = _read(filename + '.bin')
+    saved = [data[i:i + len(BLANK_PAGE)] for i in range(0, len(data), len(BLANK_PAGE))]
+    assert len(saved) == page_num - first_page - app.skip_counter
+    assert all(page in image.pages.values() for page in saved)
+
+
+def test_dump_page_skipped_after_max_attempts(tmp_path, connect):
+    image = FlashImage.synthetic(2)
+    sensor = fake_sensor(image)
+    app = connect(sensor)
+    filename = str(tmp_path / 'dump')
+
+    sensor.byte_loss = 1.0
+    is_blank, skipped = app.dutDev.dumpPage('40', filename, 0, c_timeout=0.2, max_attempts=2)
+    assert (is_blank, skipped) == (False, 1)
+    assert app.dutDev.last_page is None
+    assert METRICS.counter('page.skipped') == 1
+
+    sensor.byte_loss = 0.0
+    is_blank, skipped = app.dutDev.dumpPage('41', filename, skipped)
+    assert (is_blank, skipped) == (False, 1)
+    assert _read(filename + '.bin') == image.read(65)
+
+
+def test_content_issue_is_not_read_again(tmp_path, connect):
+    image = FlashImage.synthetic(3)
+    page = bytearray(image.pages[65])
+    page[2] ^= 0xff     # payload timestamp no longer matches the tail
+    image.pages[65] = bytes(page)
+    sensor = fake_sensor(image)
+    app = connect(sensor)
+
+    app.downloadPages(str(tmp_path / 'dump'))
+
+    assert app.dutDev.suspect_pages == [65]
+    assert app.dutDev.corrupt_pages == []
+    assert METRICS.counter('page.retries') == 0
+
+
+def test_record_and_replay_give_the_same_dump(tmp_path, connect):
+    image = FlashImage.synthetic(5)
+    trace = str(tmp_path / 'session.trace')
+    recorded = str(tmp_path / 'recorded')
+    replayed = str(tmp_path / 'replayed')
+
+    app = connect(fake_sensor(image), record_file=trace)
+    app.downloadPages(recorded)
+    app.dutDev.serialP.close()
+
+    replay = ReplayDevice(trace, realtime=False)
+    app = connect(replay)
+    app.downloadPages(replayed)
+
+    assert replay.divergences == 0
+    assert _read(replayed + '.bin') == _read(recorded + '.bin') == image_bytes(image, range(64, 69))
@@ -0,0 +1,73 @@
+import pytest
+
+from conftest import fake_sensor
+from eflash_reader import PAGE_PER_BLOCK
+from libs.flash_map import FlashMap, PAGE_DATA, PAGE_BLANK, PAGE_FAILED, PAGE_DIAGNOSTIC, PAGE_UNKNOWN
+from libs.sim_device import FlashImage
+
+T0 = 1735689600
+
+
+def test_saved_per_serial_number():
+    flash_map = FlashMap('MAP1', 1, 6, 4, 8)
+    for page in range(12, 15):
+        flash_map.mark(page, PAGE_DATA)
+    flash_map.mark(15, PAGE_FAILED)
+    flash_map.mark(16, PAGE_BLANK)
+    flash_map.mark(0, PAGE_DATA)        # diagnostic pages keep their state
+    flash_map.save()
+
+    loaded = FlashMap('MAP1', 1, 6, 4, 8)
+    assert loaded.pages == flash_map.pages
+    assert loaded.pages[0] == PAGE_DIAGNOSTIC
+    assert [loaded.blockState(b) for b in range(8)] == [PAGE_DIAGNOSTIC, PAGE_UNKNOWN, PAGE_UNKNOWN, PAGE_FAILED,
+                                                         PAGE_BLANK, PAGE_UNKNOWN, PAGE_UNKNOWN, PAGE_DIAGNOSTIC]
+    assert loaded.firstDataBlockPage() == 12
+    assert loaded.firstDataBlockPage(16) is None
+    assert loaded.dataPages() == 4
+    assert FlashMap('MAP2', 1, 6, 4, 8).firstDataBlockPage() is None
+
+
+# Previous download: data from block 5. Return the app with the flash map of that download
+def _mapped(connect, sn : str, image : FlashImage):
+    sensor = fake_sensor(FlashImage.synthetic(2, first_page=5 * PAGE_PER_BLOCK, start_ts=T0))
+    app = connect(sensor)
+    app.openFlashMap(sn)
+    app.dutDev.resetInfo()
+    app.flash_map.mark(5 * PAGE_PER_BLOCK, PAGE_DATA)
+    for block in range(1, 5):
+        app.flash_map.mark(block * PAGE_PER_BLOCK, PAGE_BLANK)
+    sensor.image = image
+    return app
+
+
+def test_hint_skips_known_blank_blocks(tmp_path, connect):
+    image = FlashImage.synthetic(2, first_page=5 * PAGE_PER_BLOCK, start_ts=T0 + 100 * 3600)
+    app = _mapped(connect, 'HINT', image)
+
+    first_page, page_num = app.downloadPages(str(tmp_path / 'dump'))
+
+    assert (first_page, page_num) == (5 * PAGE_PER_BLOCK, 5 * PAGE_PER_BLOCK + 2)
+    assert app.sim.commands < 12    # blocks 2-4 not read
+
+
+# The map is stale: the hinted block has been erased, the data now start before it
+@pytest.mark.parametrize('first_block', [3, 6])
+def test_stale_hint_block_erased(tmp_path, connect, first_block):
+    image = FlashImage.synthetic(2, first_page=first_block * PAGE_PER_BLOCK, start_ts=T0 + 100 * 3600)
+    app = _mapped(connect, f'ERASED{first_block}', image)
+
+    first_page, page_num = app.downloadPages(str(tmp_path / 'dump'))
+
+    assert (first_page, page_num) == (first_block * PAGE_PER_BLOCK, first_block * PAGE_PER_BLOCK + 2)
+
+
+# The map is stale: the hinted block still holds data, but newer records were written in the blocks before it
+def test_stale_hint_data_before(tmp_path, connect):
+    newest = FlashImage.synthetic(PAGE_PER_BLOCK + 2, first_page=3 * PAGE_PER_BLOCK, start_ts=T0 + 100 * 3600)
+    image = FlashImage({**FlashImage.synthetic(2, first_page=5 * PAGE_PER_BLOCK, start_ts=T0).pages, **newest.pages})
+    app = _mapped(connect, 'WRAPPED', image)
+
+    first_page, _ = app.downloadPages(str(tmp_path / 'dump'), page_to_read=4)
+
+    assert first_page == 3 * PAGE_PER_BLOCK
@@ -0,0 +1,56 @@
+import sqlite3
+
+import pytest
+
+from conftest import write_dump
+from libs.sim_device import FlashImage
+from module.archive import archive_dump
+from module.fleet import dump_sn, parse_dump, iter_fleet, merge_fleet
+
+T0 = 1735689600
+PERIOD = 3600
+
+
+# Two sensors recording at the same period, shifted by half of it
+@pytest.fixture
+def dumps(tmp_path):
+    a = write_dump(tmp_path, FlashImage.synthetic(2, start_ts=T0, period=PERIOD), 'A001_20250101_120000')
+    b = write_dump(tmp_path, FlashImage.synthetic(3, start_ts=T0 + PERIOD // 2, period=PERIOD), 'b')
+    archive_dump(b + '.bin', b + '.efa', {'sn': 'B002'})
+    return [a + '.bin', b + '.efa']
+
+
+def test_serial_number_of_a_dump(dumps, tmp_path):
+    assert dump_sn(dumps[0]) == 'A001'                  # station mode name
+    assert dump_sn(dumps[1]) == 'B002'                  # archive meta
+    assert dump_sn(dumps[1][:-4] + '.bin') == 'B002'    # archive next to the dump
+    assert parse_dump('C003=' + dumps[0]) == ('C003', dumps[0])
+    with pytest.raises(ValueError):
+        parse_dump(str(tmp_path / 'unknown.bin'))
+
+
+def test_records_merged_on_time(dumps):
+    records = list(iter_fleet([parse_dump(d) for d in dumps], ['ts']))
+    assert len(records) == 16 + 24
+    keys = [(r['ts'], r['sensor']) for r in records]
+    assert keys == sorted(keys)
+    assert [r['sensor'] for r in records[:4]] == ['A001', 'B002', 'A001', 'B002']
+
+
+def test_merge_is_idempotent(dumps, tmp_path):
+    output = str(tmp_path / 'fleet.db')
+    pairs = [parse_dump(d) for d in dumps]
+
+    merge_fleet(output, pairs[:1])
+    merge_fleet(output, pairs)      # the records of A001 are already there
+
+    with sqlite3.connect(output) as db:
+        counts = dict(db.execute('SELECT sensor, COUNT(*) FROM records GROUP BY sensor'))
+        indexes = {r[1] for r in db.execute('PRAGMA index_list(records)')}
+    assert counts == {'A001': 16, 'B002': 24}
+    assert 'records_ts_sensor' in indexes
+
+
+def test_merge_needs_ts(dumps):
+    with pytest.raises(ValueError):
+        list(iter_fleet([parse_dump(d) for d in dumps], ['temperature']))
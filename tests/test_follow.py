@@ -0,0 +1,90 @@
+import pytest
+
+from conftest import fake_sensor
+from libs.follow import SensorFollower
+from libs.sim_device import FlashImage, make_record, BLANK_PAGE
+from module.read_page import RECORD_LENGTH_BYTE
+
+T0 = 1735689600
+PERIOD = 3600
+PAGES_PER_BLOCK = 4
+END_PAGE = 64 + 3 * PAGES_PER_BLOCK
+
+
+# Ring of 3 blocks of 4 pages, wrapped: block 0 (pages 64-67) full of the newest records, blocks 1-2 still hold the oldest ones
+def _wrapped_image() -> FlashImage:
+    oldest = FlashImage.synthetic(8, first_page=68, start_ts=T0, period=PERIOD)
+    newest = FlashImage.synthetic(4, first_page=64, start_ts=T0 + 100 * PERIOD, period=PERIOD)
+    return FlashImage({**oldest.pages, **newest.pages})
+
+
+# Records written by the firmware at the start of a page (the rest of the page blank)
+def _write(image : FlashImage, page : int, first_ts : int, n : int):
+    data = b''.join(make_record(first_ts + i * PERIOD) for i in range(n))
+    image.pages[page] = data + BLANK_PAGE[len(data):]
+
+
+def _follower(app, sn : str) -> SensorFollower:
+    return SensorFollower(app.dutDev, sn, ['ts'], 64, END_PAGE, PAGES_PER_BLOCK)
+
+
+@pytest.fixture
+def wrapped(connect):
+    image = _wrapped_image()
+    return image, connect(fake_sensor(image))
+
+
+def test_locate_newest_record(wrapped):
+    _, app = wrapped
+    follower = _follower(app, 'LOCATE')
+    follower.start()
+    assert (follower.page, follower.slot, follower.last_ts) == (67, 8, T0 + 131 * PERIOD)
+
+
+# The next block is not erased yet: its old records are not taken as new ones
+def test_block_boundary_of_a_wrapped_ring(wrapped):
+    image, app = wrapped
+    follower = _follower(app, 'BOUNDARY')
+    follower.start()
+
+    assert follower.poll() == []
+    assert (follower.page, follower.slot) == (67, 8)
+
+    # the firmware erases block 1 and writes two records on its first page
+    for page in range(68, 68 + PAGES_PER_BLOCK):
+        del image.pages[page]
+    _write(image, 68, T0 + 132 * PERIOD, 2)
+
+    assert [r['ts'] for r in follower.poll()] == [T0 + 132 * PERIOD, T0 + 133 * PERIOD]
+    assert (follower.page, follower.slot) == (68, 2)
+
+
+def test_resume_from_saved_state(wrapped):
+    image, app = wrapped
+    for page in range(68, 68 + PAGES_PER_BLOCK):
+        del image.pages[page]
+    _write(image, 68, T0 + 132 * PERIOD, 3)
+    follower = _follower(app, 'RESUME')
+    follower.start()
+    assert follower.poll() == []
+    follower.save()
+
+    # written while the tool was stopped
+    _write(image, 68, T0 + 132 * PERIOD, 5)
+    follower = _follower(app, 'RESUME')
+    follower.start()
+    assert (follower.page, follower.slot) == (68, 3)
+    assert [r['ts'] for r in follower.poll()] == [T0 + 135 * PERIOD, T0 + 136 * PERIOD]
+
+
+# The saved record is not on the device anymore: the position is located again
+def test_saved_state_not_valid(wrapped):
+    image, app = wrapped
+    follower = _follower(app, 'ERASED')
+    follower.start()
+    follower.save()
+
+    _write(image, 67, T0 + 200 * PERIOD, 2)
+    follower = _follower(app, 'ERASED')
+    follower.start()
+    assert (follower.page, follower.slot, follower.last_ts) == (67, 2, T0 + 201 * PERIOD)
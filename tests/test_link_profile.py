@@ -0,0 +1,52 @@
+from conftest import fake_sensor
+from eflash_reader import Eflash_reader_App, PAGE_LENGTH
+from libs.link_profile import LinkProfile, best_profile, load_profile, save_profile
+from libs.serial_handler import BAUDRATE_SERIAL_FAST
+from libs.sim_device import FlashImage
+
+
+def _result(baudrate : int, depth : int, throughput : int, error_rate : float = 0.0, read_length : int = PAGE_LENGTH) -> dict:
+    return {'baudrate': baudrate, 'read_length': read_length, 'pipeline_depth': depth, 'throughput': throughput,
+            'error_rate': error_rate, 'page_time': PAGE_LENGTH / throughput}
+
+
+def test_best_profile():
+    results = [_result(115200, 1, 10000), _result(460800, 1, 30000), _result(460800, 2, 40000),
+               _result(460800, 4, 40500), _result(460800, 8, 60000, error_rate=0.1)]
+
+    profile = best_profile(results)
+
+    # the fast but unreliable one is left out, depth 4 is within 2% of depth 2
+    assert (profile.baudrate, profile.read_length, profile.pipeline_depth) == (460800, PAGE_LENGTH, 2)
+    assert 0.5 <= profile.c_timeout <= 2.0
+    assert profile.results == results
+
+
+def test_saved_per_firmware():
+    profile = LinkProfile(460800, 1056, 1, 0.5, [_result(460800, 1, 30000)])
+    save_profile('t.1.0', 'abc', profile)
+    save_profile('t.1.0', 'def', LinkProfile())
+
+    assert load_profile('t.1.0', 'abc').toDict() == profile.toDict()
+    assert load_profile('t.1.0', 'def').toDict() == LinkProfile().toDict()
+    assert load_profile('t.2.0', 'abc') is None
+
+
+# Command latency of the fake sensor: whole pages with requests in flight at the fast UART win
+def test_calibrate_against_the_simulator(connect):
+    sensor = fake_sensor(FlashImage.synthetic(4), latency=0.02, fw_version='t.4.11-cal', fw_hash='c' * 64)
+
+    profile = Eflash_reader_App(sensor).calibrateLink(pages=4)
+
+    assert (profile.baudrate, profile.read_length) == (BAUDRATE_SERIAL_FAST, PAGE_LENGTH)
+    assert profile.pipeline_depth > 1
+    assert len(profile.results) == 10
+    assert load_profile('t.4.11-cal', 'c' * 64).toDict() == profile.toDict()
+
+    # next download of a sensor with the same firmware
+    app = connect(sensor)
+    app.applyLinkProfile('t.4.11-cal', 'c' * 64)
+    assert app.pipelineDepth() == profile.pipeline_depth
+    assert app.dutDev.page_timeout == profile.c_timeout
+    assert app.dutDev.serialP.baudrate == BAUDRATE_SERIAL_FAST
+    assert app.dutDev.readPageData('40', 1)[0] == sensor.image.read(64)
@@ -0,0 +1,51 @@
+import csv
+import json
+
+from libs.metrics import Metrics
+
+
+def _metrics() -> Metrics:
+    metrics = Metrics()
+    metrics.reset(trace=True)
+    metrics.count('page.retries')
+    metrics.count('page.retries', 2)
+    metrics.observe('page.transfer', 0.01)
+    metrics.observe('page.transfer', 0.03)
+    return metrics
+
+
+def test_summary():
+    s = _metrics().summary()
+    assert s['counters'] == {'page.retries': 3}
+    assert s['timings']['page.transfer']['count'] == 2
+    assert s['timings']['page.transfer']['mean'] == 0.02
+    assert s['timings']['page.transfer']['max'] == 0.03
+
+
+def test_peek_without_the_lock():
+    metrics = _metrics()
+    with metrics._lock:     # a thread counting: peek doesn't wait for it
+        assert metrics.peek('page.retries') == 3
+        assert metrics.peek('page.skipped') == 0
+
+
+def test_save_json(tmp_path):
+    filename = str(tmp_path / 'run.json')
+    _metrics().save(filename)
+    with open(filename) as f:
+        data = json.load(f)
+    assert data['counters'] == {'page.retries': 3}
+    assert [e['kind'] for e in data['trace']] == ['count', 'count', 'time', 'time']
+
+
+# Summary rows first, then the event trace
+def test_save_csv(tmp_path):
+    filename = str(tmp_path / 'run.csv')
+    _metrics().save(filename)
+    with open(filename, newline='') as f:
+        rows = list(csv.DictReader(f))
+    summary = {(r['kind'], r['name']): r['value'] for r in rows if r['kind'] not in ('count', 'time')}
+    assert summary[('counter', 'page.retries')] == '3'
+    assert summary[('timing.count', 'page.transfer')] == '2'
+    assert ('timing.p95', 'page.transfer') in summary
+    assert [r['kind'] for r in rows[-4:]] == ['count', 'count', 'time', 'time']
@@ -0,0 +1,61 @@
+import time
+
+from conftest import fake_sensor
+from libs.sim_device import FlashImage, MIC_DUMP_TRAILER
+
+MIC_BYTES = 4096
+
+
+def _read(filename : str) -> bytes:
+    with open(filename, 'rb') as f:
+        return f.read()
+
+
+def _dump(app, filename : str, **kw) -> tuple[int, float]:
+    start = time.monotonic()
+    written = app.dutDev.dumpMicMemory(filename, **kw)
+    return written, time.monotonic() - start
+
+
+# The trailer followed by silence ends the transfer, long before the idle timeout
+def test_complete_dump(tmp_path, connect):
+    sensor = fake_sensor(FlashImage())
+    sensor.mic_memory = bytes(range(256)) * (MIC_BYTES // 256)
+    app = connect(sensor)
+    filename = str(tmp_path / 'mic.bin')
+
+    written, elapsed = _dump(app, filename, idle_timeout=5)
+
+    assert written == MIC_BYTES
+    assert _read(filename) == sensor.mic_memory
+    assert elapsed < 3
+    assert app.dutDev.AT.sendCommand('TST')[0]     # nothing of the dump left for the AT shell
+
+
+# No trailer: the end is the idle timeout and the bytes held back as a possible trailer are saved too
+def test_dump_cut_off(tmp_path, connect):
+    sensor = fake_sensor(FlashImage())
+    sensor.mic_memory = bytes(range(256)) * (MIC_BYTES // 256)
+    sensor.mic_dump_cut = 1000
+    app = connect(sensor)
+    filename = str(tmp_path / 'mic.bin')
+
+    written, elapsed = _dump(app, filename, idle_timeout=0.3)
+
+    assert written == 1000
+    assert _read(filename) == sensor.mic_memory[:1000]
+    assert elapsed >= 0.3
+
+
+# Recordings that contain the trailer bytes (or end with O\r\n) are data as long as more bytes follow
+def test_data_looking_like_the_trailer(tmp_path, connect):
+    sensor = fake_sensor(FlashImage())
+    data = bytes(range(256)) * 4
+    sensor.mic_memory = data + MIC_DUMP_TRAILER + data + b'O\r\n'
+    app = connect(sensor)
+    filename = str(tmp_path / 'mic.bin')
+
+    written, _ = _dump(app, filename, idle_timeout=5)
+
+    assert written == len(sensor.mic_memory)
+    assert _read(filename) == sensor.mic_memory
@@ -0,0 +1,103 @@
+import zipfile
+import zlib
+
+from conftest import write_dump
+from eflash_reader import Eflash_reader_App
+from libs.sim_device import make_record, FlashImage, BLANK_PAGE
+from module.page_check import check_page, check_record, check_payload_length, is_blank_slot, page_crc, tail_timestamp
+from module.read_page import RECORD_LENGTH_BYTE, TAIL_LENGTH_BYTE
+
+T0 = 1735689600
+
+
+def _page(records : list[bytes]) -> bytes:
+    data = b''.join(records)
+    return data + BLANK_PAGE[len(data):]
+
+
+def test_valid_record():
+    rec = make_record(T0)
+    assert check_record(rec) is None
+    assert check_payload_length(rec) is None
+    assert tail_timestamp(rec) == T0
+
+
+def test_record_timestamps_must_match():
+    rec = bytearray(make_record(T0))
+    rec[1] ^= 0x01
+    assert 'timestamp' in check_record(bytes(rec))
+
+
+def test_record_start_byte():
+    rec = bytearray(make_record(T0))
+    rec[0] = 0x00
+    assert 'start byte' in check_record(bytes(rec))
+    assert 'length' in check_record(bytes(rec[:-1]))
+
+
+# The length table is not confirmed on the firmware: reported, not a failure of the record
+def test_payload_length_only_reported():
+    rec = bytearray(make_record(T0))
+    rec[-TAIL_LENGTH_BYTE] = 99
+    assert check_record(bytes(rec)) is None
+    assert 'tail length' in check_payload_length(bytes(rec))
+
+
+def test_payload_length_may_count_the_start_byte():
+    rec = bytearray(make_record(T0, ev_type=1))
+    assert check_payload_length(bytes(rec)) is None
+    rec[-TAIL_LENGTH_BYTE] -= 1
+    assert check_payload_length(bytes(rec)) is None
+
+
+def test_page_monotonic():
+    res = check_page(_page([make_record(T0 + i * 3600) for i in range(8)]))
+    assert res.ok and res.records == 8 and res.blank_slots == 0
+    assert (res.first_ts, res.last_ts) == (T0, T0 + 7 * 3600)
+
+
+def test_page_partially_written():
+    res = check_page(_page([make_record(T0), make_record(T0 + 1)]))
+    assert res.ok and res.records == 2 and res.blank_slots == 6
+
+
+def test_page_time_going_back():
+    res = check_page(_page([make_record(T0 + 10), make_record(T0)]))
+    assert not res.ok
+    assert 'goes back in time' in res.issues[0]
+
+
+def test_page_record_after_blank_slot():
+    blank = b'\xff' * RECORD_LENGTH_BYTE
+    res = check_page(_page([make_record(T0), blank, make_record(T0 + 1)]))
+    assert not res.ok
+    assert 'after a blank slot' in res.issues[0]
+
+
+# A step back from the previous page is the ring restarting, not an error
+def test_page_wrapped():
+    res = check_page(_page([make_record(T0)]), prev_ts=T0 + 100)
+    assert res.ok and res.wrapped
+
+
+def test_blank_and_crc():
+    assert is_blank_slot(b'\xff' * RECORD_LENGTH_BYTE)
+    assert not is_blank_slot(make_record(T0))
+    assert page_crc(BLANK_PAGE) == zlib.crc32(BLANK_PAGE)
+    assert page_crc(BLANK_PAGE) != page_crc(_page([make_record(T0)]))
+
+
+# Records failing the checks are exported with the issue in the Check column, not dropped
+def test_export_flags_suspect_records(tmp_path):
+    image = FlashImage.synthetic(2)
+    page = bytearray(image.pages[64])
+    page[1] ^= 0x01
+    image.pages[64] = bytes(page)
+    filename = write_dump(tmp_path, image)
+
+    rows, flagged = Eflash_reader_App().exportXLSX(2, filename + '.txt', filename + '.xlsx', chronological=False)
+
+    assert (rows, flagged) == (16, 1)
+    with zipfile.ZipFile(filename + '.xlsx') as z:
+        sheet = z.read('xl/worksheets/sheet1.xml').decode()
+    assert 'Check' in sheet and 'tail timestamp' in sheet
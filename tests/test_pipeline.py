@@ -0,0 +1,101 @@
+from conftest import fake_sensor, image_bytes
+from libs.dut import PagePipeline
+from libs.sim_device import FlashImage
+from module.page_check import page_crc
+
+PAGES = list(range(64, 72))
+
+
+def _read_all(pipe : PagePipeline, pages : list[int], depth : int) -> dict[int, tuple]:
+    replies = {}
+    requested = 0
+    for page in pages:
+        while requested < len(pages) and pipe.pagesInFlight() < depth:
+            pipe.request(pages[requested])
+            requested += 1
+        replies[page] = pipe.get(page)
+    return replies
+
+
+def test_pages_in_order(connect):
+    image = FlashImage.synthetic(len(PAGES))
+    app = connect(fake_sensor(image))
+    pipe = PagePipeline(app.dutDev, depth=4)
+    try:
+        replies = _read_all(pipe, PAGES, 4)
+    finally:
+        pipe.close()
+
+    assert all(replies[p] == (image.read(p), None) for p in PAGES)
+    # back in line mode: AT commands work again
+    assert app.dutDev.AT.sendCommand('TST')[0]
+
+
+def test_pages_with_crc(connect):
+    image = FlashImage.synthetic(4)
+    app = connect(fake_sensor(image, crc_support=True))
+    pipe = PagePipeline(app.dutDev, depth=2, with_crc=True)
+    try:
+        replies = _read_all(pipe, PAGES[:4], 2)
+    finally:
+        pipe.close()
+
+    assert all(replies[p] == (image.read(p), page_crc(image.read(p))) for p in PAGES[:4])
+
+
+def test_firmware_without_crc(connect):
+    image = FlashImage.synthetic(2)
+    app = connect(fake_sensor(image))
+    pipe = PagePipeline(app.dutDev, depth=2, with_crc=True)
+    try:
+        replies = _read_all(pipe, PAGES[:2], 2)
+    finally:
+        pipe.close()
+
+    assert all(replies[p] == (image.read(p), None) for p in PAGES[:2])
+    assert app.dutDev.crc_supported is False
+
+
+# A lost answer gives None for its page, never the bytes of another page
+def test_lost_bytes(connect):
+    image = FlashImage.synthetic(len(PAGES))
+    app = connect(fake_sensor(image, byte_loss=0.0003, seed=1))
+    pipe = PagePipeline(app.dutDev, depth=4, c_timeout=0.5)
+    try:
+        replies = _read_all(pipe, PAGES, 4)
+    finally:
+        pipe.close()
+
+    received = [p for p in PAGES if replies[p][0] is not None]
+    assert len(received) < len(PAGES)
+    assert all(replies[p][0] == image.read(p) for p in received)
+
+
+# pause() leaves the link idle for a command, the next request starts a new binary session
+def test_pause(connect):
+    image = FlashImage.synthetic(4)
+    app = connect(fake_sensor(image))
+    pipe = PagePipeline(app.dutDev, depth=2)
+    try:
+        pipe.request(64)
+        pipe.request(65)
+        pipe.pause()
+        assert app.dutDev.AT.sendCommand('TST')[0]
+        assert pipe.get(64)[0] == image.read(64)
+        pipe.request(66)
+        assert pipe.get(66)[0] == image.read(66)
+    finally:
+        pipe.close()
+
+
+def test_pipelined_download_same_dump(tmp_path, connect):
+    image = FlashImage.synthetic(10)
+    app = connect(fake_sensor(image))
+    app.pipeline_depth = 4
+    filename = str(tmp_path / 'dump')
+
+    first_page, page_num = app.downloadPages(filename)
+
+    assert (first_page, page_num) == (64, 74)
+    with open(filename + '.bin', 'rb') as f:
+        assert f.read() == image_bytes(image, range(64, 74))
@@ -0,0 +1,65 @@
+import csv
+import sqlite3
+
+import pytest
+
+from module.record_sinks import CsvSink, SqliteSink, open_sink
+
+COLUMNS = ['ts', 'page', 'record', 'temperature']
+
+
+def _records(first_ts : int, n : int) -> list[dict]:
+    return [{'ts': first_ts + i, 'page': 64, 'record': first_ts + i + 1, 'temperature': 20.5, 'alpha1': 0.1} for i in range(n)]
+
+
+def test_csv_append_keeps_header(tmp_path):
+    filename = str(tmp_path / 'out.csv')
+    sink = CsvSink(filename, COLUMNS)
+    sink.add(_records(0, 3))
+    sink.close()
+    sink = CsvSink(filename, ['ts'])     # reopened: the columns of the file are kept
+    assert sink.columns == COLUMNS
+    sink.add(_records(3, 2))
+    sink.close()
+
+    with open(filename, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [int(r['ts']) for r in rows] == [0, 1, 2, 3, 4]
+    assert list(rows[0]) == COLUMNS
+
+
+def test_sqlite_ignores_records_already_there(tmp_path):
+    filename = str(tmp_path / 'out.db')
+    sink = SqliteSink(filename, COLUMNS, index=['ts'])
+    sink.add(_records(0, 5))
+    sink.close()
+    sink = SqliteSink(filename, COLUMNS)
+    sink.add(_records(3, 5))
+    sink.close()
+
+    with sqlite3.connect(filename) as db:
+        assert [r[0] for r in db.execute('SELECT ts FROM records ORDER BY ts')] == list(range(8))
+        types = {r[1]: r[2] for r in db.execute('PRAGMA table_info(records)')}
+        indexes = {r[1] for r in db.execute('PRAGMA index_list(records)')}
+    assert types == {'ts': 'INTEGER', 'page': 'INTEGER', 'record': 'INTEGER', 'temperature': 'REAL'}
+    assert indexes == {'records_key', 'records_ts'}
+
+
+# Records are visible to readers after flush, while the sink is still open
+def test_sqlite_flush(tmp_path):
+    filename = str(tmp_path / 'out.db')
+    sink = SqliteSink(filename, COLUMNS)
+    sink.add(_records(0, 2))
+    sink.flush()
+    with sqlite3.connect(filename) as db:
+        assert db.execute('SELECT COUNT(*) FROM records').fetchone()[0] == 2
+    sink.close()
+
+
+def test_open_sink_by_extension(tmp_path):
+    assert isinstance(open_sink(str(tmp_path / 'a.csv'), COLUMNS), CsvSink)
+    sink = open_sink(str(tmp_path / 'a.sqlite'), COLUMNS)
+    assert isinstance(sink, SqliteSink)
+    sink.close()
+    with pytest.raises(ValueError):
+        open_sink(str(tmp_path / 'a.xlsx'), COLUMNS)
@@ -0,0 +1,75 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from conftest import fake_sensor, write_dump
+from libs.sim_device import FlashImage
+from module.archive import archive_dump
+from module.read_page import EVENT_TYPE
+from module.records import iter_records, iter_batches, decode_record, FIELD_DECODERS
+
+T0 = 1735689600
+PERIOD = 3600
+
+
+@pytest.fixture
+def dump(tmp_path):
+    image = FlashImage.synthetic(6, start_ts=T0, period=PERIOD)
+    filename = write_dump(tmp_path, image)
+    archive_dump(filename + '.bin', filename + '.efa')
+    return filename
+
+
+def test_same_records_from_every_dump_format(dump):
+    records = [list(iter_records(dump + ext)) for ext in ('.bin', '.txt', '.efa')]
+    assert len(records[0]) == 48
+    assert records[0] == records[1] == records[2]
+    assert [(r['page'], r['record']) for r in records[0][:9]] == [(64, i) for i in range(1, 9)] + [(65, 1)]
+
+
+# The fast decoders of the common fields give what tilt_record gives
+def test_field_decoders_match_tilt_record(dump):
+    for full, fast in zip(iter_records(dump + '.bin'), iter_records(dump + '.bin', columns=list(FIELD_DECODERS))):
+        assert fast == {col: full[col] for col in FIELD_DECODERS}
+
+
+def test_time_range(dump):
+    start = T0 + 10 * PERIOD
+    end = datetime.fromtimestamp(T0 + 20 * PERIOD, timezone.utc)
+    for ext in ('.bin', '.txt', '.efa'):
+        ts = [r['ts'] for r in iter_records(dump + ext, start=start, end=end, columns=['ts'])]
+        assert ts == list(range(start, T0 + 21 * PERIOD, PERIOD))
+
+
+def test_event_types(dump):
+    events = list(iter_records(dump + '.bin', event_types=[1, 2, 3], columns=['evnt_type']))
+    scheduled = list(iter_records(dump + '.bin', event_types=[EVENT_TYPE[0]], columns=['evnt_type']))
+    assert events and all(r['evnt_type'] != EVENT_TYPE[0] for r in events)
+    assert len(events) + len(scheduled) == 48
+
+
+def test_unknown_column(dump):
+    with pytest.raises(ValueError):
+        list(iter_records(dump + '.bin', columns=['nope']))
+
+
+def test_batches(dump):
+    batches = list(iter_batches(dump + '.bin', batch_size=20, columns=['ts']))
+    assert [len(b) for b in batches] == [20, 20, 8]
+
+
+def test_decode_record_columns():
+    image = FlashImage.synthetic(1, start_ts=T0)
+    rec = image.read(64)[:256]
+    assert decode_record(rec, 64, 1, ['page', 'record', 'ts', 'time']) == \
+        {'page': 64, 'record': 1, 'ts': T0, 'time': '2025-01-01T00:00:00'}
+
+
+# Live source: the pages are read from the DUT up to the first blank page
+def test_records_from_device(connect):
+    image = FlashImage.synthetic(3, start_ts=T0, period=PERIOD)
+    app = connect(fake_sensor(image))
+
+    ts = [r['ts'] for r in iter_records(app.dutDev, columns=['ts'])]
+
+    assert ts == list(range(T0, T0 + 24 * PERIOD, PERIOD))
@@ -0,0 +1,134 @@
+import threading
+import time
+
+import pytest
+
+from libs.serial_handler import SerialController
+
+
+# Loopback stand-in for serial.Serial: the test puts the bytes the device would send with feed()
+class LoopPort:
+    def __init__(self, port : str, baudrate : int = 115200, timeout : float | None = None):
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.is_open = True
+        self.rx = b''
+        self.written = b''
+        self._lock = threading.Lock()
+
+    def feed(self, data : bytes):
+        with self._lock:
+            self.rx += data
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self.rx)
+
+    def read(self, size : int = 1) -> bytes:
+        with self._lock:
+            data, self.rx = self.rx[:size], self.rx[size:]
+        return data
+
+    def read_until(self, expected : bytes = b'\n') -> bytes:
+        with self._lock:
+            end = self.rx.find(expected)
+            end = len(self.rx) if end < 0 else end + len(expected)
+            data, self.rx = self.rx[:end], self.rx[end:]
+        return data
+
+    def write(self, data : bytes) -> int:
+        self.written += data
+        return len(data)
+
+    def reset_input_buffer(self):
+        with self._lock:
+            self.rx = b''
+
+    def close(self):
+        self.is_open = False
+
+
+@pytest.fixture
+def controller():
+    ctrl = SerialController('LOOP', serial_factory=LoopPort)
+    ctrl.open()
+    yield ctrl
+    ctrl.close()
+
+
+# Until the listener has taken everything that arrived
+def _drain(ctrl : SerialController):
+    deadline = time.monotonic() + 1
+    while ctrl.ser.in_waiting and time.monotonic() < deadline:
+        time.sleep(0.005)
+    time.sleep(0.02)
+
+
+def test_raw_access_outside_a_session(controller):
+    with pytest.raises(RuntimeError):
+        controller.write(b'x')
+    with pytest.raises(RuntimeError):
+        controller.read(1, 0.1)
+    with pytest.raises(RuntimeError):
+        controller.read_until(b'\n', 0.1)
+    with pytest.raises(RuntimeError):
+        controller.reset_input()
+
+
+def test_raw_access_from_another_thread(controller):
+    errors = []
+
+    def other():
+        try:
+            controller.write(b'x')
+        except RuntimeError as e:
+            errors.append(e)
+
+    with controller.binary():
+        t = threading.Thread(target=other)
+        t.start()
+        t.join()
+        controller.write(b'y')
+    assert len(errors) == 1
+    assert controller.ser.written == b'y'
+
+
+def test_nested_sessions(controller):
+    controller.enter_binary()
+    with controller.binary():
+        controller.write(b'a')
+    controller.write(b'b')     # still in the outer session
+    controller.exit_binary()
+    with pytest.raises(RuntimeError):
+        controller.write(b'c')
+    assert controller.ser.written == b'ab'
+
+
+def test_exit_without_enter(controller):
+    with pytest.raises(RuntimeError):
+        controller.exit_binary()
+    # the port is still usable
+    with controller.binary():
+        controller.write(b'a')
+
+
+def test_listener_out_of_the_session(controller):
+    with controller.binary() as port:
+        controller.ser.feed(b'DATA\r\nO\r\n')
+        time.sleep(0.05)
+        assert controller.received_messages == []
+        assert port.read_until(b'O\r\n', 0.1) == b'DATA\r\nO\r\n'
+    controller.ser.feed(b'LINE\r\n')
+    _drain(controller)
+    assert controller.received_messages == ['LINE']
+
+
+# A message cut by a session is dropped, not glued to the next one; so are the bytes left at the end of the session
+def test_partial_line_dropped(controller):
+    controller.ser.feed(b'HALF')
+    _drain(controller)
+    with controller.binary():
+        controller.ser.feed(b'LEFT')
+    controller.ser.feed(b'NEXT\r\n')
+    _drain(controller)
+    assert controller.received_messages == ['NEXT']
@@ -0,0 +1,99 @@
+import os
+
+from conftest import fake_sensor, image_bytes
+from libs.page_cache import PageCache, PAGE_SIZE
+from libs.metrics import METRICS
+from libs.sim_device import FlashImage, make_record, BLANK_PAGE
+
+T0 = 1735689600
+
+
+def _read(filename : str) -> bytes:
+    with open(filename, 'rb') as f:
+        return f.read()
+
+
+# Page erased and written again with newer records
+def _rewrite(image : FlashImage, page : int, first_ts : int):
+    data = b''.join(make_record(first_ts + i * 3600) for i in range(8))
+    image.pages[page] = data + BLANK_PAGE[len(data):]
+
+
+# Two downloads of the same sensor: the second one reads only the pages changed in between
+def _sync_twice(tmp_path, app, sn : str, image : FlashImage, change) -> str:
+    app.cache = PageCache(sn)
+    app.downloadPages(str(tmp_path / 'first'))
+    change(image)
+    app.dutDev.resetInfo()
+    METRICS.reset()
+    filename = str(tmp_path / 'second')
+    app.downloadPages(filename)
+    app.closeCache()
+    return filename
+
+
+# A changed page is appended to the data file, which is compacted once less than half of it is referenced
+def test_cache_compaction(tmp_path):
+    image = FlashImage.synthetic(3, start_ts=T0)
+    cache = PageCache('COMPACT')
+    cache.put(64, image.read(64))
+    cache.put(64, image.read(64))   # same content: not appended again
+    cache.put(64, image.read(65))
+    cache.put(64, image.read(66))
+    cache._f.flush()
+    assert os.path.getsize(cache._bin) == 3 * PAGE_SIZE
+    cache.close()
+
+    assert os.path.getsize(cache._bin) == PAGE_SIZE
+    cache = PageCache('COMPACT')
+    assert cache.get(64) == image.read(66)
+    assert cache.crc(64) is not None and 65 not in cache
+    cache.close()
+
+
+def test_sync_with_digests(tmp_path, connect):
+    image = FlashImage.synthetic(6, start_ts=T0)
+    app = connect(fake_sensor(image, crc_support=True))
+
+    def change(image):
+        _rewrite(image, 66, T0 + 1000 * 3600)
+        image.pages.update(FlashImage.synthetic(1, first_page=70, start_ts=T0 + 48 * 3600).pages)
+
+    filename = _sync_twice(tmp_path, app, 'DIGESTS', image, change)
+
+    assert _read(filename + '.bin') == image_bytes(image, range(64, 71))
+    assert METRICS.counter('sync.cached') == 5      # 64, 65, 67, 68, 69
+    assert METRICS.counter('sync.tails') == 0
+
+
+# Without AT+EFLASHCRC the tail of the first record tells if a page has been erased and written again
+def test_sync_without_digest(tmp_path, connect):
+    image = FlashImage.synthetic(4, start_ts=T0)
+    app = connect(fake_sensor(image))
+
+    filename = _sync_twice(tmp_path, app, 'TAILS', image, lambda image: _rewrite(image, 65, T0 + 1000 * 3600))
+
+    assert _read(filename + '.bin') == image_bytes(image, range(64, 68))
+    assert METRICS.counter('sync.cached') == 3
+    assert METRICS.counter('sync.digests') == 0
+    assert app.dutDev.crc_supported is False
+
+
+# A whole block without digest: only the first and the last page are compared
+def test_block_without_digest(connect):
+    image = FlashImage.synthetic(64, start_ts=T0)
+    app = connect(fake_sensor(image))
+    cache = PageCache('BLOCK')
+    for page in range(64, 128):
+        cache.put(page, image.read(page))
+
+    assert app.dutDev.pageUnchanged(64, cache, 64)
+    assert METRICS.counter('sync.tails') == 2
+
+    _rewrite(image, 127, T0 + 1000 * 3600)
+    assert not app.dutDev.pageUnchanged(64, cache, 64)
+    # a page in the middle is not compared: the tail check assumes records are only appended
+    _rewrite(image, 127, T0 + 63 * 8 * 3600)
+    _rewrite(image, 100, T0 + 1000 * 3600)
+    assert app.dutDev.pageUnchanged(64, cache, 64)
+    cache.close()
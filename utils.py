@@ -10,6 +10,7 @@ HEADER_MAP = {
     "Acc. RMS [mg]":       "axeRms",
     "Avg. Samples":        "avgSamp",
     "Full scale":          "range",
+    "Check":               "check",
 
 }
 